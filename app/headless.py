@@ -0,0 +1,127 @@
+"""
+Моделирование N тел без интерфейса: параметры тел и запуска из файла, траектории - в .npz
+(times, coordinate, speed, masses, radius; см. utils.simulation.write_trajectory) или, для пути с расширением
+.nbt, в файл траектории, дописываемый во время расчета (см. utils.trajectory_file).
+Аргументы командной строки заменяют параметры запуска из файла.
+С --checkpoint состояние периодически сохраняется (и при Ctrl+C), --resume продолжает запуск с контрольной точки.
+С --cache результаты хранятся в каталоге кэша: повторный запуск загружается, более длинный - продолжается
+
+Запуск из корня репозитория:
+    python -m app.headless data_n_body.txt -o trajectory.npz --num-iter 100000 --method leapfrog
+    python -m app.headless data_n_body.txt -o run.nbt --num-iter 10000000 --checkpoint run.npz
+    python -m app.headless --resume run.npz -o run.nbt
+    python -m app.headless data_n_body.txt -o run.nbt --num-iter 200000 --cache ~/.nbody/cache
+"""
+import argparse
+import signal
+import time
+
+import numpy as np
+
+from utils import simulation, result_cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('parameters', nargs='?', help='файл параметров тел и запуска в формате data_n_body.txt')
+    parser.add_argument('-o', '--output', default='trajectory.npz')
+    parser.add_argument('--time-step', type=float)
+    parser.add_argument('--num-iter', type=int)
+    parser.add_argument('--method', choices=simulation.METHODS)
+    parser.add_argument('--solver', choices=simulation.SOLVERS)
+    parser.add_argument('--collision', choices=list(simulation.COLLISION_RESPONSES))
+    parser.add_argument('--restitution', type=float)
+    parser.add_argument('--theta', type=float)
+    parser.add_argument('--grid-size', type=int)
+    parser.add_argument('--rtol', type=float)
+    parser.add_argument('--atol', type=float)
+    parser.add_argument('--eta', type=float)
+    parser.add_argument('--max-level', type=int)
+    parser.add_argument('--num-frames', type=int)
+    parser.add_argument('--store-every', type=int, help='сохранять каждый k-й шаг вместо --num-frames фреймов')
+    parser.add_argument('--positions-only', action='store_true', help='не сохранять скорости')
+    parser.add_argument('--float32', action='store_true', help='хранить фреймы в float32')
+    parser.add_argument('--checkpoint', help='файл контрольной точки (.npz)')
+    parser.add_argument('--checkpoint-interval', type=float, default=simulation.CHECKPOINT_INTERVAL,
+                        help='период записи контрольной точки, с')
+    parser.add_argument('--resume', help='продолжить с контрольной точки (параметры запуска - из нее)')
+    parser.add_argument('--cache', help='каталог кэша результатов')
+    parser.add_argument('--cache-size', type=float, default=result_cache.MAX_BYTES / 2 ** 20,
+                        help='наибольший объем кэша, МБ')
+    args = parser.parse_args()
+
+    interrupted = []
+
+    def report(frames, available, fraction):
+        print(f'\rмоделирование завершено на: {fraction * 100:6.2f}%', end='', flush=True)
+        return bool(interrupted)
+
+    if args.checkpoint or args.resume:
+        # Ctrl+C прерывает моделирование между чанками с записью контрольной точки
+        signal.signal(signal.SIGINT, lambda *_: interrupted.append(True))
+
+    trajectory = args.output if args.output.endswith('.nbt') else None
+    start = time.perf_counter()
+    if args.resume:
+        try:
+            result = simulation.resume(args.resume, trajectory=trajectory, checkpoint=args.checkpoint,
+                                       checkpoint_interval=args.checkpoint_interval, on_chunk=report)
+        except (OSError, KeyError, ValueError) as error:
+            parser.error(f'{args.resume}: не контрольная точка ({error})')
+        write_result(args, result, start)
+        return
+    if args.parameters is None:
+        parser.error('задайте файл параметров или --resume')
+
+    parameters = simulation.read_parameters(args.parameters)
+    settings = {key: parameters[key] for key in simulation.DEFAULT_SETTINGS}
+    settings.update({key: value for key, value in vars(args).items() if key in settings and value is not None})
+    if settings['time_step'] is None:
+        parser.error('в файле параметров нет timestep, задайте --time-step')
+    if settings['num_frames'] < 2:
+        parser.error('фреймов должно быть не меньше 2')
+    if args.store_every is not None and args.store_every < 1:
+        parser.error('--store-every должен быть не меньше 1')
+    if args.store_every is not None and args.store_every > settings['num_iter']:
+        parser.error('--store-every не должен превышать число шагов: иначе сохраняется только начальный фрейм')
+
+    if args.cache and args.store_every is not None:
+        parser.error('--store-every несовместим с --cache')
+
+    storage = dict(store_speed=not args.positions_only, dtype=np.float32 if args.float32 else np.float64)
+    try:
+        if args.cache:
+            cache = result_cache.ResultCache(args.cache, int(args.cache_size * 2 ** 20))
+            result = cache.simulate(parameters['coordinate'], parameters['speed'], parameters['masses'],
+                                    parameters['radius'], trajectory=trajectory, checkpoint=args.checkpoint,
+                                    checkpoint_interval=args.checkpoint_interval, on_chunk=report,
+                                    **storage, **settings)
+        else:
+            result = simulation.simulate(parameters['coordinate'], parameters['speed'], parameters['masses'],
+                                         parameters['radius'], store_every=args.store_every,
+                                         trajectory=trajectory, checkpoint=args.checkpoint,
+                                         checkpoint_interval=args.checkpoint_interval, on_chunk=report,
+                                         **storage, **settings)
+    except ValueError as error:
+        parser.error(str(error))
+    write_result(args, result, start)
+
+
+def write_result(args, result, start):
+    print()
+    if not args.output.endswith('.nbt'):
+        simulation.write_trajectory(args.output, result)
+    text = f"шагов: {result['steps']}, время: {result['time']:g} с, осталось тел: {result['contact'][0].shape[0]}"
+    if result['collided']:
+        text += ', остановлено столкновением'
+    if result['cancelled']:
+        text += f', прервано (контрольная точка: {args.checkpoint or args.resume})'
+    if result.get('cached') == 'hit':
+        text += ', загружено из кэша'
+    elif result.get('cached') == 'extended':
+        text += ', продолжен запуск из кэша'
+    print(f'{text} ({time.perf_counter() - start:.2f} с) -> {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Перебор шага по времени, масштаба масс и скоростей по сетке без интерфейса.
+Итоги каждого запуска (время столкновения, ошибка энергии, число уходящих тел) дописываются в CSV по мере
+завершения; повторный запуск с тем же файлом итогов продолжает прерванный перебор
+
+Запуск из корня репозитория:
+    python -m app.sweep data_n_body.txt --time-step 1e4 1e5 --velocity-scale 0.9 1 1.1 --num-iter 10000
+"""
+import argparse
+
+from utils import simulation, sweep
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('bodies', help='файл параметров тел в формате data_n_body.txt')
+    parser.add_argument('--time-step', nargs='+', type=float,
+                        help='значения шага по времени (по умолчанию - timestep из файла тел)')
+    parser.add_argument('--mass-scale', nargs='+', type=float, default=[1.])
+    parser.add_argument('--velocity-scale', nargs='+', type=float, default=[1.])
+    parser.add_argument('--num-iter', type=int, default=10000)
+    parser.add_argument('--method', choices=list(simulation.FIXED_METHODS), default='rk4')
+    parser.add_argument('--solver', choices=simulation.SOLVERS, default='direct')
+    parser.add_argument('--workers', type=int, default=None, help='число процессов (по умолчанию - число ядер)')
+    parser.add_argument('--output', default='sweep_results.csv')
+    args = parser.parse_args()
+
+    # Недопустимое сочетание метода и способа расчета сил - до запуска пула, а не в инициализаторе процессов
+    try:
+        simulation.create_solver(args.solver, args.method)
+    except ValueError as error:
+        parser.error(str(error))
+
+    bodies = simulation.read_parameters(args.bodies)
+    time_steps = args.time_step or [bodies['time_step']]
+    if time_steps[0] is None:
+        parser.error('в файле тел нет timestep, задайте --time-step')
+
+    grid = sweep.sweep_grid(time_steps, args.mass_scale, args.velocity_scale)
+    done = sweep.completed_runs(args.output)
+    print(f'запусков: {len(grid)}, уже выполнено: {sum(sweep.point_key(point) in done for point in grid)}')
+
+    def report(row):
+        print(f"run {row['run']:>5}: dt={row['time_step']:g} m×{row['mass_scale']:g} v×{row['velocity_scale']:g} "
+              f"шагов={row['steps']} столкновение={row['collided']} ошибка энергии={row['energy_error']:.2e} "
+              f"уходящих={row['escaped']} ({row['wall_time']:.2f} с)", flush=True)
+
+    sweep.run_sweep(bodies, grid, args.num_iter, args.output, args.method, args.solver, args.workers, report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Сравнение Barnes–Hut с прямым суммированием по точности и скорости
+
+Запуск из корня репозитория:
+    python benchmarks/bench_barnes_hut.py [N ...] [--theta 0.3 0.5 0.8]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import solvers
+
+
+def plummer_cluster(num_body: int, rng: np.random.Generator):
+    """Координаты (3, N) по профилю Плюммера с масштабом 1 пк и массы порядка солнечной"""
+    radius = 3.086e16 / np.sqrt(rng.uniform(1e-3, 1, num_body) ** (-2 / 3) - 1)
+    direction = rng.normal(size=(3, num_body))
+    direction /= np.linalg.norm(direction, axis=0)
+    masses = rng.uniform(0.5, 2, num_body) * 2e30
+    return radius * direction, masses
+
+
+def timed(solve, coordinate, workspace, repeat):
+    solve(coordinate, coordinate, 0., workspace)  # компиляция / прогрев
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = solve(coordinate, coordinate, 0., workspace).copy()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('num_body', nargs='*', type=int, default=[1000, 10000, 100000])
+    parser.add_argument('--theta', nargs='+', type=float, default=[0.3, 0.5, 0.8])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'N':>8} {'метод':>14} {'время, с':>10} {'ускорение':>10} {'отн. ошибка (rms)':>18}")
+    for num_body in args.num_body:
+        coordinate, masses = plummer_cluster(num_body, rng)
+        repeat = 1 if num_body > 20000 else args.repeat
+
+        direct_time, reference = timed(solvers.direct_solve, coordinate, solvers.direct_workspace(masses), repeat)
+        reference_norm = np.sum(reference ** 2, axis=0)
+        print(f"{num_body:>8} {'прямое':>14} {direct_time:>10.4f} {1:>10.1f} {0:>18.2e}")
+
+        for theta in args.theta:
+            tree_time, result = timed(solvers.barnes_hut_solve, coordinate,
+                                      solvers.barnes_hut_workspace(masses, theta), repeat)
+            error = np.sqrt(np.mean(np.sum((result - reference) ** 2, axis=0) / reference_norm))
+            print(f"{num_body:>8} {f'BH θ={theta}':>14} {tree_time:>10.4f} {direct_time / tree_time:>10.1f} "
+                  f"{error:>18.2e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+График N тел с трассами по телам (generate_markers_nbody, generate_lines_nbody: 2N трасс) против облака точек
+(generate_markers_cloud, generate_lines_cloud: 2 трассы): время построения графика с начальными следами
+и объем его JSON, отправляемого странице при создании графика
+
+Запуск из корня репозитория:
+    python benchmarks/bench_cloud_traces.py [N ...] [--frames 100]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import plotly
+from plotly.subplots import make_subplots
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import plot_generators
+
+
+def build(traces):
+    """График как в NBody.init_fig и его JSON"""
+    fig = make_subplots(rows=1, cols=1, specs=[[{'type': 'scene'}, ], ])
+    for trace in traces:
+        fig.add_trace(trace, 1, 1)
+    return json.dumps({'data': fig.data, 'layout': fig.layout}, cls=plotly.utils.PlotlyJSONEncoder)
+
+
+def per_body(frames, colors, radius):
+    return build(plot_generators.generate_markers_nbody(frames[-1], colors) +
+                 plot_generators.generate_lines_nbody(frames, colors))
+
+
+def cloud(frames, colors, radius):
+    return build(plot_generators.generate_markers_cloud(frames[-1], colors, radius) +
+                 plot_generators.generate_lines_cloud(frames, colors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('num_bodies', nargs='*', type=int, default=[10, 100, 1000])
+    parser.add_argument('--frames', type=int, default=100)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'N':>6} {'трасс':>6} {'по телам, с':>12} {'по телам, МБ':>13} {'облако, с':>10} {'облако, МБ':>11}")
+    for num_bodies in args.num_bodies:
+        colors = ['#%06X' % rng.integers(0, 0xFFFFFF) for _ in range(num_bodies)]
+        radius = rng.uniform(1, 5, num_bodies)
+        frames = np.cumsum(rng.normal(size=(args.frames, 3, num_bodies)), axis=0).astype(np.float32)
+        row = f'{num_bodies:>6} {2 * num_bodies:>6}'
+        for figure, width in ((per_body, 12), (cloud, 10)):
+            start = time.perf_counter()
+            size = len(figure(frames, colors, radius))
+            row += f' {time.perf_counter() - start:>{width}.3f} {size / 1e6:>{width + 1}.3f}'
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Объем и время сериализации фреймов, отправляемых в график за запуск:
+фреймы с полными следами (go.Frame, объем растет квадратично по числу фреймов), только новые положения тел
+списками чисел JSON и они же двоичным массивом float32 в base64 (plot_generators.frames_payload).
+Разбор Py - время разбора сообщений в Python (json.loads, для двоичного сообщения - с декодированием base64
+в массив NumPy). Это оценка сравнительной стоимости форматов, а не время разбора на странице (atob, Float32Array)
+
+Запуск из корня репозитория:
+    python benchmarks/bench_frame_payload.py [F ...] [--bodies 10]
+"""
+import argparse
+import base64
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import plotly
+import plotly.graph_objects as go
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import plot_generators, trajectory_pyramid
+
+
+def full_trails(frames, colors):
+    """Прежняя отправка: фрейм анимации с маркерами и следами от начала запуска"""
+    total = 0
+    for index in range(1, frames.shape[0]):
+        figure_list = (plot_generators.generate_markers_nbody(frames[index, 0], colors) +
+                       plot_generators.generate_lines_nbody(frames[:index + 1, 0], colors))
+        frame = go.Frame(name=str(index), data=figure_list, traces=list(range(len(figure_list))))
+        total += len(json.dumps(frame, cls=plotly.utils.PlotlyJSONEncoder))
+    return total
+
+
+def json_points(frames, colors):
+    """Отправка только новых положений тел списками чисел JSON (NaN - null)"""
+    messages = []
+    for index in range(1, frames.shape[0]):
+        messages.append(json.dumps({'iterations': [index], 'points': frames[index:index + 1, 0]},
+                                   cls=plotly.utils.PlotlyJSONEncoder))
+    return messages
+
+
+def binary_points(frames, colors):
+    """Отправка только новых положений тел двоичным массивом (plot_generators.frames_payload)"""
+    pyramid = trajectory_pyramid.TrajectoryPyramid(frames[0, 0])
+    return [plot_generators.frames_payload(frames[index:index + 1, 0], [index],
+                                           pyramid.append(frames[index:index + 1, 0]))
+            for index in range(1, frames.shape[0])]
+
+
+def parse_json(messages):
+    """Разбор сообщений JSON в Python"""
+    for message in messages:
+        np.array(json.loads(message)['points'], dtype=np.float32)
+
+
+def parse_binary(messages):
+    """Разбор двоичных сообщений в Python: base64 декодирует b64decode, а не atob страницы"""
+    for message in messages:
+        np.frombuffer(base64.b64decode(json.loads(message)['points']), dtype='<f4')
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('num_frames', nargs='*', type=int, default=[100, 200, 500])
+    parser.add_argument('--bodies', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    colors = ['#%06X' % rng.integers(0, 0xFFFFFF) for _ in range(args.bodies)]
+    print(f"{'F':>6} {'следы, МБ':>10} {'следы, с':>9} {'JSON, Б/ф':>10} {'JSON, мс':>9} {'разбор Py, мс':>14} "
+          f"{'двоич., Б/ф':>12} {'двоич., мс':>11} {'разбор Py, мс':>14}")
+    for num_frames in args.num_frames:
+        # Фреймы графика: только координаты в float32, как в NBody.run_model
+        frames = np.cumsum(rng.normal(size=(num_frames, 1, 3, args.bodies)), axis=0).astype(np.float32) * 1e9
+        # Загрузка скомпилированного ядра пирамиды не входит в замер
+        trajectory_pyramid.TrajectoryPyramid(frames[0, 0]).append(frames[1:2, 0])
+        old_size, old_time = timed(full_trails, frames, colors)
+        json_messages, json_time = timed(json_points, frames, colors)
+        binary_messages, binary_time = timed(binary_points, frames, colors)
+        _, json_parse = timed(parse_json, json_messages)
+        _, binary_parse = timed(parse_binary, binary_messages)
+        count = num_frames - 1
+        print(f"{num_frames:>6} {old_size / 1e6:>10.2f} {old_time:>9.3f} "
+              f"{sum(map(len, json_messages)) / count:>10.0f} {json_time * 1e3:>9.1f} {json_parse * 1e3:>14.1f} "
+              f"{sum(map(len, binary_messages)) / count:>12.0f} {binary_time * 1e3:>11.1f} "
+              f"{binary_parse * 1e3:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Пропускная способность интегрирования: цикл по шагам в Python против скомпилированного цикла чанками
+
+Запуск из корня репозитория:
+    python benchmarks/bench_fused_loop.py [--num-iter 200000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import collisions, math_helpers, methods, solvers
+
+
+def default_system():
+    """Система трех тел по умолчанию из таблицы NBody"""
+    state = np.array([
+        [[100., 0., 0.], [0., 100., 0.], [0., 0., 100.]],
+        [[0., 0., 2.], [2., 0., 0.], [0., 2., 0.]],
+    ])
+    return state, np.full(3, 1e13), np.ones(3)
+
+
+def python_loop(state, workspace, radius, num_iter, time_step, frame_stride):
+    frames_array = np.arange(num_iter + 1)[::frame_stride]
+    ct = 0.
+    for i in range(1, num_iter + 1):
+        if math_helpers.collision_check(3, radius, state[0]):
+            break
+        ct += time_step
+        state = methods.rk4(ct, time_step, state, solve=methods.SOLVE_DIRECT, func=workspace)
+        if i in frames_array:
+            pass
+    return state
+
+
+def fused_loop(state, workspace, radius, num_iter, time_step, frame_stride, chunk):
+    frames = np.empty((num_iter // frame_stride + 1, 2, 3, 3))
+    contact = collisions.contact_workspace(np.ones(3), radius, collisions.COLLISION_STOP, 1.)
+    ct = 0.
+    step = 1
+    gap = 0.
+    while step <= num_iter:
+        state, ct, done, collided, gap = methods.integrate_chunk(methods.RK4, ct, time_step, state,
+                                                                 methods.SOLVE_DIRECT, workspace, contact,
+                                                                 step, min(chunk, num_iter - step + 1),
+                                                                 frame_stride, frames, gap)
+        step += done
+        if collided:
+            break
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--num-iter', type=int, default=200000)
+    parser.add_argument('--time-step', type=float, default=0.05)
+    parser.add_argument('--chunk', type=int, default=10000)
+    args = parser.parse_args()
+
+    state, masses, radius = default_system()
+    workspace = solvers.direct_workspace(masses)
+    frame_stride = max(args.num_iter // 499, 1)
+
+    # Прогрев (компиляция)
+    python_loop(state, workspace, radius, 10, args.time_step, 1)
+    fused_loop(state, workspace, radius, 10, args.time_step, 1, 10)
+
+    start = time.perf_counter()
+    reference = python_loop(state, workspace, radius, args.num_iter, args.time_step, frame_stride)
+    python_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = fused_loop(state, workspace, radius, args.num_iter, args.time_step, frame_stride, args.chunk)
+    fused_time = time.perf_counter() - start
+
+    print(f"шагов: {args.num_iter}")
+    print(f"Python-цикл:          {python_time:8.3f} с ({args.num_iter / python_time:12.0f} шаг/с)")
+    print(f"скомпилированный:     {fused_time:8.3f} с ({args.num_iter / fused_time:12.0f} шаг/с)")
+    print(f"ускорение:            {python_time / fused_time:8.1f}x")
+    print(f"совпадение состояний: {np.array_equal(reference, result)}")
+
+
+if __name__ == '__main__':
+    main()
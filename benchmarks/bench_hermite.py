@@ -0,0 +1,77 @@
+"""
+Метод Эрмита против Рунге–Кутты 4 при равной точности на эксцентричной орбите (e = 0.5)
+
+Запуск из корня репозитория:
+    python benchmarks/bench_hermite.py [--orbits 10]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from constants import physics_constants
+from utils import collisions, methods, solvers
+
+
+def eccentric_binary(eccentricity):
+    """Звезда и планета в апоцентре орбиты с большой полуосью 1 а.е."""
+    masses = np.array([2e30, 6e24])
+    semi_major = 1.496e11
+    total = physics_constants.GRAVITATION_CONSTANT * masses.sum()
+    apocenter = semi_major * (1 + eccentricity)
+    speed = np.sqrt(total / semi_major * (1 - eccentricity) / (1 + eccentricity))
+    state = np.zeros((2, 3, 2))
+    state[0, 0, 1] = apocenter
+    state[1, 1, 1] = speed
+    period = 2 * np.pi * np.sqrt(semi_major ** 3 / total)
+    return state, masses, period
+
+
+def run(method, state, solve, workspace, time_step, num_steps):
+    frames = np.empty((2, 2, 3, state.shape[2]))
+    contact = collisions.contact_workspace(np.zeros(state.shape[2]), np.zeros(state.shape[2]),
+                                           collisions.COLLISION_STOP, 1.)
+    start = time.perf_counter()
+    result = methods.integrate_chunk(method, 0., time_step, state, solve, workspace, contact,
+                                     1, num_steps, num_steps, frames)[0]
+    return result[:2], time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orbits', type=int, default=10)
+    parser.add_argument('--eccentricity', type=float, default=0.5)
+    args = parser.parse_args()
+
+    initial, masses, period = eccentric_binary(args.eccentricity)
+    direct = solvers.direct_workspace(masses)
+    hermite = solvers.hermite_workspace(masses)
+
+    # Эталон - Рунге–Кутта 4 с очень малым шагом
+    reference_steps = 20000 * args.orbits
+    reference, _ = run(methods.RK4, initial, methods.SOLVE_DIRECT, direct, args.orbits * period / reference_steps,
+                       reference_steps)
+    scale = np.abs(reference[0]).max()
+
+    print(f"{'метод':>10} {'шагов/орбиту':>13} {'вычисл. сил':>12} {'время, с':>9} {'ошибка координат':>17}")
+    for steps_per_orbit in (250, 500, 1000, 2000, 4000):
+        num_steps = steps_per_orbit * args.orbits
+        time_step = args.orbits * period / num_steps
+        for name, method, solve, workspace, evaluations in (
+                ('RK4', methods.RK4, methods.SOLVE_DIRECT, direct, 4),
+                ('Эрмит', methods.HERMITE, methods.SOLVE_HERMITE, hermite, 1)):
+            state = initial
+            if method == methods.HERMITE:
+                state = methods.hermite_state(0., initial, solve, workspace)
+            run(method, state, solve, workspace, time_step, 10)  # компиляция
+            result, elapsed = run(method, state, solve, workspace, time_step, num_steps)
+            error = np.abs(result[0] - reference[0]).max() / scale
+            print(f"{name:>10} {steps_per_orbit:>13} {evaluations * num_steps:>12} {elapsed:>9.4f} {error:>17.2e}")
+
+
+if __name__ == '__main__':
+    main()
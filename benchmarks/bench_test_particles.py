@@ -0,0 +1,64 @@
+"""
+Стоимость расчета сил для нескольких массивных тел и диска пробных частиц:
+все тела массивные (O(N^2)) против пробных частиц (O(N_массивных * N))
+
+Запуск из корня репозитория:
+    python benchmarks/bench_test_particles.py [K ...] [--massive 5]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import solvers
+
+
+def star_disk(num_massive: int, num_test: int, rng: np.random.Generator):
+    """Звезды в центре и тонкий диск частиц радиусом порядка 10 а.е., координаты (3, N)"""
+    stars = rng.normal(size=(3, num_massive)) * 1.5e11
+    radius = rng.uniform(1.5e11, 1.5e12, num_test)
+    angle = rng.uniform(0, 2 * np.pi, num_test)
+    disk = np.array([radius * np.cos(angle), radius * np.sin(angle), rng.normal(size=num_test) * 1e9])
+    return np.concatenate((stars, disk), axis=1)
+
+
+def timed(coordinate, masses, repeat):
+    workspace = solvers.direct_workspace(masses)
+    solvers.direct_solve(coordinate, coordinate, 0., workspace)  # компиляция / прогрев
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = solvers.direct_solve(coordinate, coordinate, 0., workspace).copy()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('num_test', nargs='*', type=int, default=[1000, 10000, 50000])
+    parser.add_argument('--massive', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'K':>8} {'все массивные, с':>17} {'пробные, с':>12} {'ускорение':>10} {'отн. ошибка':>12}")
+    for num_test in args.num_test:
+        coordinate = star_disk(args.massive, num_test, rng)
+        masses = np.zeros(coordinate.shape[1])
+        masses[:args.massive] = 2e30
+
+        # Ничтожные, но ненулевые массы частиц: все тела остаются источниками
+        all_masses = masses.copy()
+        all_masses[args.massive:] = 1e-30
+        repeat = 1 if num_test > 20000 else args.repeat
+        full_time, reference = timed(coordinate, all_masses, repeat)
+        test_time, result = timed(coordinate, masses, args.repeat)
+
+        error = np.abs(result - reference).max() / np.abs(reference).max()
+        print(f"{num_test:>8} {full_time:>17.4f} {test_time:>12.4f} {full_time / test_time:>10.1f} {error:>12.2e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Пирамида детализации следов (utils.trajectory_pyramid) на кеплеровых орбитах с равным шагом по времени:
+время вычисления рангов на фрейм, число точек следа на уровнях и наибольшее отклонение прореженного следа
+от полного в долях большой полуоси. Тела с большим эксцентриситетом быстро поворачивают в перицентре:
+там уровни сохраняют больше точек
+
+Запуск из корня репозитория:
+    python benchmarks/bench_trail_levels.py [F ...] [--bodies 10] [--orbits 20]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import trajectory_pyramid
+
+
+def kepler_orbits(num_frames, num_bodies, orbits, rng):
+    """Положения (F, 3, N) тел на эллиптических орбитах с большой полуосью 1 и разными эксцентриситетами"""
+    eccentricity = np.linspace(0., 0.95, num_bodies)
+    mean_anomaly = np.linspace(0., 2 * np.pi * orbits, num_frames)[:, None] + rng.uniform(0, 2 * np.pi, num_bodies)
+    anomaly = mean_anomaly.copy()
+    for _ in range(50):
+        anomaly -= (anomaly - eccentricity * np.sin(anomaly) - mean_anomaly) / (1 - eccentricity * np.cos(anomaly))
+    points = np.zeros((num_frames, 3, num_bodies), dtype=np.float32)
+    points[:, 0] = np.cos(anomaly) - eccentricity
+    points[:, 1] = np.sqrt(1 - eccentricity ** 2) * np.sin(anomaly)
+    return points
+
+
+def deviation(path, kept):
+    """Наибольшее расстояние точек пути (F, 3) до ломаной по точкам kept"""
+    result = 0.
+    for first, last in zip(kept[:-1], kept[1:]):
+        segment = path[first:last + 1] - path[first]
+        chord = path[last] - path[first]
+        length = chord @ chord
+        fraction = np.clip(segment @ chord / length, 0, 1) if length else np.zeros(segment.shape[0])
+        result = max(result, np.max(np.linalg.norm(segment - fraction[:, None] * chord, axis=1)))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('num_frames', nargs='*', type=int, default=[10000, 100000])
+    parser.add_argument('--bodies', type=int, default=10)
+    parser.add_argument('--orbits', type=float, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for num_frames in args.num_frames:
+        points = kepler_orbits(num_frames, args.bodies, args.orbits, rng)
+        # Загрузка скомпилированного ядра не входит в замер
+        trajectory_pyramid.TrajectoryPyramid(points[0]).append(points[1:2])
+
+        pyramid = trajectory_pyramid.TrajectoryPyramid(points[0])
+        start = time.perf_counter()
+        ranks = np.concatenate([pyramid.append(points[index:index + 64]) for index in range(1, num_frames, 64)])
+        elapsed = time.perf_counter() - start
+
+        print(f'F = {num_frames}, N = {args.bodies}: ранги {elapsed / (num_frames - 1) * 1e6:.2f} мкс/фрейм')
+        print(f"{'уровень':>8} {'точек e=0':>10} {'точек e=0.95':>13} {'откл. e=0':>10} {'откл. e=0.95':>13}")
+        for level in range(trajectory_pyramid.LEVELS):
+            row = f'{level:>8}'
+            for body in (0, args.bodies - 1):
+                kept = np.append(np.flatnonzero(ranks[:, body] >= level), num_frames - 1)
+                row += f' {kept.shape[0]:>{10 if body == 0 else 13}}'
+            for body in (0, args.bodies - 1):
+                kept = np.append(np.flatnonzero(ranks[:, body] >= level), num_frames - 1)
+                error = deviation(points[:, :, body].astype(np.float64), kept)
+                row += f' {error:>{10 if body == 0 else 13}.2e}'
+            print(row)
+
+
+if __name__ == '__main__':
+    main()
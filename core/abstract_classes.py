@@ -1,10 +1,13 @@
 import os.path
 import string
 import sys
+import threading
+import time
 from datetime import datetime
 
 import numpy as np
-from PySide6.QtCore import QUrl, QSize, Qt, QAbstractTableModel, QModelIndex, QTimer, QPoint
+from PySide6.QtCore import QUrl, QSize, Qt, QAbstractTableModel, QModelIndex, QTimer, QPoint, QObject, QThread, \
+    Signal, Slot
 from PySide6.QtGui import QColor, QTextCursor, QIcon, QFont, QPainter, QPainterPath, QPen, QAction
 from PySide6.QtWebChannel import QWebChannel
 from PySide6.QtWebEngineCore import QWebEngineSettings
@@ -506,6 +509,70 @@ class HelpDialog(QDialog):
         layout.addWidget(button_box)
 
 
+class SimulationWorker(QObject):
+    """
+    Выполнение моделирования в фоновом потоке.
+    task вызывается с on_chunk (см. utils.simulation.simulate), сигналы кадров и прогресса отправляются
+    не чаще SIGNAL_INTERVAL: промежуточные чанки сливаются в один сигнал с последним числом готовых фреймов.
+    Сигнал передает ссылку на буфер, который task продолжает заполнять; snapshot(frames, available) выполняется
+    в фоновом потоке перед сигналом, когда буфер перезаписывается и нужна его копия
+    """
+    SIGNAL_INTERVAL = 1 / 30
+
+    progress = Signal(float)
+    frames_ready = Signal(object, int)
+    finished = Signal(object)
+    failed = Signal(str)
+
+    def __init__(self, task, snapshot=None):
+        super().__init__()
+        self.task = task
+        self.snapshot = snapshot
+        self._resumed = threading.Event()
+        self._resumed.set()
+        self._cancelled = False
+        self._last_signal = 0.
+        self._pending = None
+
+    @Slot()
+    def run(self):
+        try:
+            result = self.task(on_chunk=self._on_chunk)
+        except Exception as error:
+            self.failed.emit(str(error) if isinstance(error, ValueError) else f'{type(error).__name__}: {error}')
+            return
+        if self._pending is not None:
+            self._signal(*self._pending)
+        self.finished.emit(result)
+
+    def _on_chunk(self, frames, available, fraction):
+        if time.perf_counter() - self._last_signal >= self.SIGNAL_INTERVAL:
+            self._signal(frames, available, fraction)
+        else:
+            self._pending = (frames, available, fraction)
+        # На паузе поток ждет между чанками
+        self._resumed.wait()
+        return self._cancelled
+
+    def _signal(self, frames, available, fraction):
+        self._last_signal = time.perf_counter()
+        self._pending = None
+        if self.snapshot is not None:
+            frames = self.snapshot(frames, available)
+        self.frames_ready.emit(frames, available)
+        self.progress.emit(fraction)
+
+    def pause(self):
+        self._resumed.clear()
+
+    def resume(self):
+        self._resumed.set()
+
+    def cancel(self):
+        self._cancelled = True
+        self._resumed.set()
+
+
 class MainWidget(QWidget):
     """ Основной класс для визуализации любой модели"""
 
@@ -547,12 +614,27 @@ class MainWidget(QWidget):
         self.runner = QPushButton('Запуск модели')
         self.runner.clicked.connect(self.run_model)
 
+        self.pauser = QPushButton('Пауза')
+        self.pauser.setEnabled(False)
+        self.pauser.clicked.connect(self.pause_model)
+
+        self.stopper = QPushButton('Остановить')
+        self.stopper.setEnabled(False)
+        self.stopper.clicked.connect(self.stop_model)
+
+        self.worker = None
+        self.worker_thread = None
+
         self.progressBar = QProgressBar()
         self.progressBar.setRange(0, 1000)
 
         self.logger = ExpandableLogger(min_height=100, max_height=200)
 
-        bottom_layout.addWidget(self.runner, alignment=Qt.AlignmentFlag.AlignHCenter)
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addWidget(self.runner)
+        buttons_layout.addWidget(self.pauser)
+        buttons_layout.addWidget(self.stopper)
+        bottom_layout.addLayout(buttons_layout)
         bottom_layout.addWidget(self.progressBar)
         bottom_layout.addWidget(self.logger)
 
@@ -626,6 +708,13 @@ class MainWidget(QWidget):
         export_action = QAction(QIcon("icons/export.png"), "Экспорт результатов...", self)
         export_action.triggered.connect(self.export_results)
 
+        open_action = QAction(QIcon(""), "Открыть сохраненный запуск...", self)
+        open_action.setShortcut("Ctrl+O")
+        open_action.triggered.connect(self.open_results)
+
+        resume_action = QAction(QIcon(""), "Продолжить с контрольной точки...", self)
+        resume_action.triggered.connect(self.resume_results)
+
         exit_action = QAction(QIcon("icons/exit.png"), "Выход", self)
         exit_action.setShortcut("Alt+F4")
         exit_action.triggered.connect(self.close)
@@ -634,6 +723,8 @@ class MainWidget(QWidget):
         model_menu.addAction(model_reference)
         model_menu.addSeparator()
         model_menu.addAction(export_action)
+        model_menu.addAction(open_action)
+        model_menu.addAction(resume_action)
         model_menu.addSeparator()
         model_menu.addAction(exit_action)
 
@@ -693,10 +784,79 @@ class MainWidget(QWidget):
     def export_results(self):
         pass
 
+    def open_results(self):
+        pass
+
+    def resume_results(self):
+        pass
+
     def reference_model(self):
         pass
 
+    def start_worker(self, task, on_frames, on_progress, on_finished, snapshot=None):
+        """
+        Запуск task в фоновом потоке (см. SimulationWorker).
+        Обработчики - методы виджета: тогда сигналы доставляются в поток интерфейса
+
+        Args:
+            task (Callable): моделирование, принимает on_chunk и возвращает результат
+            on_frames (Callable): (frames, число готовых фреймов)
+            on_progress (Callable): (доля выполнения) или None
+            on_finished (Callable): (результат task)
+            snapshot (Callable): копия фреймов в фоновом потоке перед сигналом (см. SimulationWorker)
+        """
+        self.worker = SimulationWorker(task, snapshot)
+        self.worker_thread = QThread()
+        self.worker.moveToThread(self.worker_thread)
+
+        self.worker_thread.started.connect(self.worker.run)
+        self.worker.frames_ready.connect(on_frames)
+        if on_progress is not None:
+            self.worker.progress.connect(on_progress)
+        self.worker.finished.connect(on_finished)
+        self.worker.failed.connect(self.worker_failed)
+        self.worker.finished.connect(self.worker_thread.quit)
+        self.worker.failed.connect(self.worker_thread.quit)
+        self.worker_thread.finished.connect(self.worker_stopped)
+
+        self.runner.setEnabled(False)
+        self.pauser.setText('Пауза')
+        self.pauser.setEnabled(True)
+        self.stopper.setEnabled(True)
+        self.worker_thread.start()
+
+    def worker_failed(self, message):
+        self.logger.log(message, LogLevel.ERROR)
+
+    def worker_stopped(self):
+        self.worker_thread.wait()
+        self.worker = None
+        self.worker_thread = None
+        self.runner.setEnabled(True)
+        self.pauser.setEnabled(False)
+        self.stopper.setEnabled(False)
+
+    def pause_model(self):
+        if self.worker is None:
+            return
+        if self.pauser.text() == 'Пауза':
+            self.worker.pause()
+            self.pauser.setText('Продолжить')
+            self.logger.log('Моделирование приостановлено', LogLevel.INFO)
+        else:
+            self.worker.resume()
+            self.pauser.setText('Пауза')
+            self.logger.log('Моделирование продолжено', LogLevel.INFO)
+
+    def stop_model(self):
+        if self.worker is not None:
+            self.worker.cancel()
+
     def closeEvent(self, event):
+        if self.worker_thread is not None:
+            self.worker.cancel()
+            self.worker_thread.quit()
+            self.worker_thread.wait()
         self.logger.export_logs()
         file_operations.remove_dir(path=self.temppath[0])
 
@@ -1,11 +1,50 @@
+import functools
+import os
+import shutil
+
 import numpy as np
-import plotly.graph_objects as go
-from PySide6.QtCore import Qt
-from PySide6.QtWidgets import QLabel
+from PySide6.QtCore import Qt, QTimer
+from PySide6.QtWidgets import QLabel, QFileDialog
 from plotly.subplots import make_subplots
 
 import core.abstract_classes as abstract_classes
-from utils import math_helpers, qt_helpers, methods, solvers, plot_generators
+from utils import math_helpers, qt_helpers, plot_generators, collisions, simulation, trajectory_file, result_cache, \
+    trajectory_pyramid
+
+# Названия в интерфейсе и ключи utils.simulation
+SOLVERS = {
+    'Прямое суммирование': 'direct',
+    'Barnes–Hut': 'barnes-hut',
+    'Particle-Mesh (FFT)': 'particle-mesh',
+}
+
+METHODS = {
+    'Рунге–Кутта 4': 'rk4',
+    'Leapfrog (KDK)': 'leapfrog',
+    'Йошида 4': 'yoshida4',
+    'Эрмит 4': 'hermite',
+    'Дорманд–Принс 5(4)': 'dopri5',
+    'Блочные шаги': 'block',
+}
+
+COLLISION_RESPONSES = {
+    'Остановить моделирование': 'stop',
+    'Слияние тел': 'merge',
+    'Отскок': 'bounce',
+}
+
+# Наибольшее число фреймов при просмотре сохраненного запуска
+REPLAY_FRAMES = 500
+
+# Период вывода фреймов в живом режиме, мс: нагрузка на браузер не зависит от скорости моделирования
+LIVE_FRAME_INTERVAL = 100
+
+# Контрольная точка последнего запуска: пишется периодически и при остановке, из нее запуск можно продолжить
+CHECKPOINT_PATH = os.path.join(os.path.expanduser('~'), '.nbody', 'checkpoint.npz')
+
+# Кэш результатов запусков (см. utils.result_cache) и его наибольший объем, байт
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.nbody', 'cache')
+CACHE_BYTES = 2 << 30
 
 
 class NBody(abstract_classes.MainWidget):
@@ -14,6 +53,7 @@ class NBody(abstract_classes.MainWidget):
         super().__init__(name)
 
         self.colors_body = ['#%06X' % np.random.randint(0, 0xFFFFFF) for _ in range(100)]
+        self.cache = result_cache.ResultCache(CACHE_PATH, CACHE_BYTES)
         simSubheader = QLabel("Параметры симуляции")
         simSubheader.setAlignment(Qt.AlignmentFlag.AlignHCenter)
 
@@ -38,6 +78,111 @@ class NBody(abstract_classes.MainWidget):
         self.num_view_input.setRange(2, 500)
         self.num_view_input.setValue(200)
 
+        self.solver_input = abstract_classes.HelpComboBox(help_text='Выберите способ расчета гравитационных сил:\n'
+                                                                    'прямое суммирование - точно, O(N²)\n'
+                                                                    'Barnes–Hut - приближенно, O(N log N)\n'
+                                                                    'Particle-Mesh - сглаженно на сетке, O(N + G³ log G)')
+        self.solver_input.addItems(['Прямое суммирование', 'Barnes–Hut', 'Particle-Mesh (FFT)'])
+        self.solver_input.currentTextChanged.connect(self.changed_solver)
+
+        self.theta_input = abstract_classes.HelpLineEdit(help_text='Угол раскрытия θ для Barnes–Hut\n'
+                                                                   '(0 - точное суммирование, обычно 0.3 - 0.8)')
+        self.theta_input.setText(str(0.5))
+        self.theta_input.setEnabled(False)
+
+        self.grid_size_input = abstract_classes.HelpSpinBox(help_text='Число узлов сетки Particle-Mesh по каждой оси\n'
+                                                                      '(Минимум:  16\n'
+                                                                      ' Максимум: 256)')
+        self.grid_size_input.setRange(16, 256)
+        self.grid_size_input.setValue(64)
+        self.grid_size_input.setEnabled(False)
+
+        self.method_input = abstract_classes.HelpComboBox(help_text='Выберите метод интегрирования:\n'
+                                                                    'Рунге–Кутта 4 - постоянный шаг\n'
+                                                                    'Leapfrog, Йошида 4 - симплектические,\n'
+                                                                    'ограниченная ошибка энергии на долгих прогонах\n'
+                                                                    'Эрмит 4 - одно вычисление сил и рывков за шаг\n'
+                                                                    '(только прямое суммирование)\n'
+                                                                    'Дорманд–Принс 5(4) - адаптивный шаг\n'
+                                                                    '(временной шаг задает начальный пробный шаг)\n'
+                                                                    'Блочные шаги - свой шаг dt / 2^k у каждого тела\n'
+                                                                    '(временной шаг задает наибольший шаг)')
+        self.method_input.addItems(['Рунге–Кутта 4', 'Leapfrog (KDK)', 'Йошида 4', 'Эрмит 4',
+                                    'Дорманд–Принс 5(4)', 'Блочные шаги'])
+        self.method_input.currentTextChanged.connect(self.changed_method)
+
+        self.rtol_input = abstract_classes.HelpLineEdit(help_text='Относительная точность адаптивного шага')
+        self.rtol_input.setText(str(1e-8))
+        self.rtol_input.setEnabled(False)
+
+        self.atol_input = abstract_classes.HelpLineEdit(help_text='Абсолютная точность адаптивного шага\n'
+                                                                  '(в единицах координат и скоростей)')
+        self.atol_input.setText(str(1e-6))
+        self.atol_input.setEnabled(False)
+
+        self.eta_input = abstract_classes.HelpLineEdit(help_text='Точность выбора блочного шага η:\n'
+                                                                 'шаг тела не больше η |a| / |da/dt|')
+        self.eta_input.setText(str(0.02))
+        self.eta_input.setEnabled(False)
+
+        self.max_level_input = abstract_classes.HelpSpinBox(help_text='Наибольший уровень блочного шага k:\n'
+                                                                      'наименьший шаг равен dt / 2^k\n'
+                                                                      '(Минимум:  1\n'
+                                                                      ' Максимум: 30)')
+        self.max_level_input.setRange(1, 30)
+        self.max_level_input.setValue(10)
+        self.max_level_input.setEnabled(False)
+
+        self.collision_input = abstract_classes.HelpComboBox(help_text='Выберите реакцию на столкновение тел:\n'
+                                                                       'остановить моделирование\n'
+                                                                       'слияние - с сохранением массы, импульса\n'
+                                                                       'и объема, моделирование продолжается\n'
+                                                                       'отскок - упругий или неупругий,\n'
+                                                                       'моделирование продолжается')
+        self.collision_input.addItems(list(COLLISION_RESPONSES))
+        self.collision_input.currentTextChanged.connect(self.changed_collision)
+
+        self.restitution_input = abstract_classes.HelpLineEdit(help_text='Коэффициент восстановления при отскоке\n'
+                                                                         '(1 - упругий, 0 - абсолютно неупругий)')
+        self.restitution_input.setText(str(1.))
+        self.restitution_input.setEnabled(False)
+
+        self.ensemble_size_input = abstract_classes.HelpSpinBox(help_text='Число членов ансамбля начальных условий:\n'
+                                                                          'первый член невозмущенный, остальные\n'
+                                                                          'интегрируются параллельно с возмущением\n'
+                                                                          '(прямое суммирование, Рунге–Кутта 4,\n'
+                                                                          'Leapfrog или Йошида 4, остановка при\n'
+                                                                          'столкновении; 1 - обычный запуск)')
+        self.ensemble_size_input.setRange(1, 1000)
+        self.ensemble_size_input.setValue(1)
+        self.ensemble_size_input.valueChanged.connect(self.changed_ensemble)
+
+        self.perturbation_input = abstract_classes.HelpLineEdit(help_text='Возмущение координат и скоростей\n'
+                                                                          'членов ансамбля (σ): добавляется σ·ξ,\n'
+                                                                          'умноженное на среднеквадратичное\n'
+                                                                          'значение координат (скоростей)')
+        self.perturbation_input.setText(str(1e-6))
+        self.perturbation_input.setEnabled(False)
+
+        self.run_mode_input = abstract_classes.HelpComboBox(help_text='Выберите режим моделирования:\n'
+                                                                      'заданное число итераций - все фреймы\n'
+                                                                      'сохраняются и доступны в анимации\n'
+                                                                      'до остановки - живой режим: выводится\n'
+                                                                      'след из последних (число фреймов для вывода)\n'
+                                                                      'положений через каждые\n'
+                                                                      '(число итераций / число фреймов) шагов')
+        self.run_mode_input.addItems(['Заданное число итераций', 'До остановки'])
+
+        self.live_timer = QTimer(self)
+        self.live_timer.setInterval(LIVE_FRAME_INTERVAL)
+        self.live_timer.timeout.connect(self.show_live_frame)
+        self.live_frames = None
+        self.live_available = 0
+        self.live_shown = 0
+
+        # Файл траектории последнего запуска во временной папке: пишется во время расчета, удаляется при закрытии
+        self.trajectory_path = None
+
         tableSubheader = QLabel("Параметры тел")
 
         _data = math_helpers.create_dataframe_Nbody(self.num_body_input.value(), self.colors_body)
@@ -53,6 +198,19 @@ class NBody(abstract_classes.MainWidget):
         self.add_parameter_row("Временной шаг, с:", self.time_step_input)
         self.add_parameter_row("Число итераций:", self.num_iter_input)
         self.add_parameter_row("Число фреймов для вывода:", self.num_view_input)
+        self.add_parameter_row("Режим моделирования:", self.run_mode_input)
+        self.add_parameter_row("Расчет сил:", self.solver_input)
+        self.add_parameter_row("Угол раскрытия θ:", self.theta_input)
+        self.add_parameter_row("Размер сетки PM:", self.grid_size_input)
+        self.add_parameter_row("Метод интегрирования:", self.method_input)
+        self.add_parameter_row("Относительная точность:", self.rtol_input)
+        self.add_parameter_row("Абсолютная точность:", self.atol_input)
+        self.add_parameter_row("Точность блочного шага η:", self.eta_input)
+        self.add_parameter_row("Уровней блочного шага:", self.max_level_input)
+        self.add_parameter_row("При столкновении:", self.collision_input)
+        self.add_parameter_row("Коэффициент восстановления:", self.restitution_input)
+        self.add_parameter_row("Членов ансамбля:", self.ensemble_size_input)
+        self.add_parameter_row("Возмущение ансамбля:", self.perturbation_input)
 
         self.inputs_widgets.addWidget(tableSubheader)
         self.inputs_widgets.addWidget(self.tableNbody)
@@ -60,6 +218,25 @@ class NBody(abstract_classes.MainWidget):
     def change_view(self):
         self.num_view_input.setRange(2, min(self.num_iter_input.value(), 500))
 
+    def changed_solver(self):
+        self.theta_input.setEnabled(self.solver_input.currentText() == 'Barnes–Hut')
+        self.grid_size_input.setEnabled(self.solver_input.currentText() == 'Particle-Mesh (FFT)')
+
+    def changed_method(self):
+        adaptive = self.method_input.currentText() == 'Дорманд–Принс 5(4)'
+        self.rtol_input.setEnabled(adaptive)
+        self.atol_input.setEnabled(adaptive)
+
+        block = self.method_input.currentText() == 'Блочные шаги'
+        self.eta_input.setEnabled(block)
+        self.max_level_input.setEnabled(block)
+
+    def changed_collision(self):
+        self.restitution_input.setEnabled(self.collision_input.currentText() == 'Отскок')
+
+    def changed_ensemble(self):
+        self.perturbation_input.setEnabled(self.ensemble_size_input.value() > 1)
+
     def changed_model(self):
         self.tableNbody.model = qt_helpers.update_row_count(self.num_body_input.value(), self.colors_body,
                                                             self.tableNbody.model)
@@ -80,51 +257,289 @@ class NBody(abstract_classes.MainWidget):
         mass_body = np.array(_data['Масса, кг'].to_numpy(), dtype=float)
         radius_body = np.array(_data['Радиус, м'].to_numpy(), dtype=float)
 
+        # Пробные частицы не притягивают: для решателей это тела нулевой массы
+        test_body = np.array(_data['Пробная частица'].to_numpy(), dtype=float) != 0
+        mass_body[test_body] = 0.
+
         num_iter = self.num_iter_input.value()
         num_view = self.num_view_input.value()
         num_body = self.num_body_input.value()
         time_step = float(self.time_step_input.text().replace(',', '.'))
 
-        frames_array = np.arange(num_iter + 1)[::num_iter // (num_view - 1)]
-
-        data = np.zeros((num_iter + 1, 2, 3, num_body))
-        data[:] = np.nan
-
-        data[0] = np.array([
+        state = np.array([
             [coord_x, coord_y, coord_z],
             [speed_x, speed_y, speed_z]
         ])
 
-        self.init_fig(data[0, 0])
-
-        self.create_frame(data, 0)
-
-        ct = 0
-        for i in range(1, num_iter + 1):
-            collisions = math_helpers.collision_check(num_body=num_body,
-                                                      body_radius=radius_body,
-                                                      coordinate=data[i - 1, 0, :, :])
-            if collisions:
-                text = 'Моделирование завершено досрочно.'
-                for collision in collisions:
-                    text += f'\nСтолкнулись {collision[0]} и {collision[1]} тела'
-                self.logger.log(text, abstract_classes.LogLevel.WARNING)
-                self.progressBar.setValue(1000)
-                break
-            ct += time_step
-
-            data[i] = methods.rk4(ct, time_step, data[i - 1],
-                                  solve=solvers.n_body_solve,
-                                  func=mass_body)
-            if i in frames_array:
-                self.create_frame(data, i)
-
-            self.progressBar.setFormat(f"Моделирование завершено на: {i/num_iter * 100:.2f}%")
-            self.progressBar.setValue(int(i / num_iter * 1000))
+        self.init_fig(state[0], radius=radius_body)
+
+        method = METHODS[self.method_input.currentText()]
+        collision = COLLISION_RESPONSES[self.collision_input.currentText()]
+        # Фреймы, кратные frame_stride шагам, выводятся в график по мере готовности;
+        # для графика хранятся только координаты в float32
+        self.frame_stride = simulation.frame_stride(num_iter, num_view)
+        self.emitted = 1
+        self.method = method
+        # Траектория прежнего запуска не сохраняется вместе с новым
+        self.trajectory_path = None
+
+        if self.run_mode_input.currentText() == 'До остановки':
+            if self.ensemble_size_input.value() > 1:
+                self.logger.log('Живой режим недоступен для ансамбля', abstract_classes.LogLevel.ERROR)
+                return
+            task = functools.partial(simulation.simulate_live, state[0], state[1], mass_body, radius_body, time_step,
+                                     num_view, self.frame_stride,
+                                     method=method,
+                                     solver=SOLVERS[self.solver_input.currentText()],
+                                     collision=collision,
+                                     restitution=float(self.restitution_input.text().replace(',', '.')),
+                                     theta=float(self.theta_input.text().replace(',', '.')),
+                                     grid_size=self.grid_size_input.value())
+            self.time_step = time_step
+            self.live_available = 1
+            self.live_shown = 1
+            # Буфер перезаписывается по кругу: интерфейс получает упорядоченную копию, снятую в фоновом потоке
+            self.start_worker(task, self.store_live_frames, None, self.live_finished,
+                              snapshot=simulation.ring_history)
+            self.live_timer.start()
+            return
+
+        if self.ensemble_size_input.value() > 1:
+            if (self.solver_input.currentText() != 'Прямое суммирование' or collision != 'stop' or
+                    method not in simulation.ENSEMBLE_METHODS):
+                self.logger.log('Ансамбль доступен только для прямого суммирования, методов Рунге–Кутта 4, '
+                                'Leapfrog и Йошида 4 и остановки при столкновении',
+                                abstract_classes.LogLevel.ERROR)
+                return
+            task = functools.partial(simulation.simulate_ensemble, state[0], state[1], mass_body, radius_body,
+                                     time_step, num_iter,
+                                     method=method,
+                                     num_members=self.ensemble_size_input.value(),
+                                     perturbation=float(self.perturbation_input.text().replace(',', '.')),
+                                     num_frames=num_view,
+                                     store_speed=False,
+                                     dtype=np.float32)
+            self.start_worker(task, self.show_frames, self.update_progress, self.ensemble_finished)
+            return
+
+        # Совпадающий запуск загружается из кэша, более длинный продолжает сохраненный
+        settings = dict(time_step=time_step,
+                        method=method,
+                        solver=SOLVERS[self.solver_input.currentText()],
+                        collision=collision,
+                        restitution=float(self.restitution_input.text().replace(',', '.')),
+                        theta=float(self.theta_input.text().replace(',', '.')),
+                        grid_size=self.grid_size_input.value(),
+                        rtol=float(self.rtol_input.text().replace(',', '.')),
+                        atol=float(self.atol_input.text().replace(',', '.')),
+                        eta=float(self.eta_input.text().replace(',', '.')),
+                        max_level=self.max_level_input.value(),
+                        store_speed=False,
+                        dtype=np.float32)
+        _, entry, self.frame_stride, _ = self.cache.plan(state[0], state[1], mass_body, radius_body, num_iter,
+                                                         num_view, **settings)
+        if entry is not None:
+            self.logger.log(f'Найден сохраненный запуск в кэше: {os.path.basename(entry)}',
+                            abstract_classes.LogLevel.INFO)
+        task = functools.partial(self.cache.simulate, state[0], state[1], mass_body, radius_body, num_iter,
+                                 num_frames=num_view,
+                                 trajectory=os.path.join(self.temppath[0], 'trajectory.nbt'),
+                                 checkpoint=CHECKPOINT_PATH,
+                                 metadata={'colors': self.colors_body},
+                                 **settings)
+        self.start_worker(task, self.show_frames, self.update_progress, self.run_finished)
+
+    def show_frames(self, frames, available):
+        self.emitted = self.emit_frames(frames, self.emitted, available, self.frame_stride)
+
+    def run_finished(self, result):
+        # Загруженный из кэша результат приходит без чанков: фреймы выводятся здесь
+        self.show_frames(result['frames'], result['frame_count'])
+        if result.get('cached') == 'hit':
+            self.update_progress(1.)
+            self.logger.log('Результат загружен из кэша', abstract_classes.LogLevel.INFO)
+        self.trajectory_path = os.path.join(self.temppath[0], 'trajectory.nbt')
+        self.model_finished(result)
+
+    def model_finished(self, result):
+        if result['collided']:
+            self.report_collision(result['state'], result['contact'])
+        if self.method == 'dopri5':
+            self.logger.log(f"Принято шагов: {result['accepted']}, отклонено шагов: {result['rejected']}",
+                            abstract_classes.LogLevel.INFO)
+        elif self.method == 'block':
+            self.logger.log(f"Вычислений ускорений тел: {result['evaluations']} "
+                            f"(при общем наименьшем шаге: {result['minimal_evaluations']})",
+                            abstract_classes.LogLevel.INFO)
+        self.report_contacts(result['contact'])
+        self.report_finish(result)
+
+    def store_live_frames(self, frames, available):
+        self.live_frames = frames
+        self.live_available = available
+
+    def show_live_frame(self):
+        """Вывод последнего положения и следа из копии кольцевого буфера вместо текущих данных графика"""
+        if self.live_available == self.live_shown:
+            return
+        self.live_shown = self.live_available
+
+        history = self.live_frames[:, 0]
+        if history.shape[0] == 1:
+            history = np.concatenate((history, history), axis=0)
+        self.webEngine.bridge.show_history(history, self.webEngine.webView)
+
+        model_time = (self.live_available - 1) * self.frame_stride * self.time_step
+        self.progressBar.setFormat(f"Время моделирования: {model_time:.3e} с")
+
+    def live_finished(self, result):
+        self.live_timer.stop()
+        self.show_live_frame()
+        self.model_finished(result)
+
+    def worker_stopped(self):
+        self.live_timer.stop()
+        super().worker_stopped()
+
+    def ensemble_finished(self, result):
+        """В график выведен невозмущенный член, в журнал - число столкновений и разброс конечных координат"""
+        states = result['states']
+        survived = result['collided_at'] < 0
+        text = f'Членов ансамбля: {states.shape[0]}, столкнулись: {states.shape[0] - survived.sum()}'
+        if not survived[0]:
+            text += f"\nНевозмущенный член столкнулся на шаге {result['collided_at'][0]}"
+        elif survived.sum() > 1:
+            spread = np.sqrt(np.mean(np.sum((states[survived, 0] - states[0, 0]) ** 2, axis=(1, 2))))
+            text += f'\nСреднеквадратичное отклонение конечных координат от невозмущенных: {spread:.3e} м'
+        self.logger.log(text, abstract_classes.LogLevel.INFO)
+        self.report_finish(result)
+
+    def report_finish(self, result):
+        if result['cancelled']:
+            self.logger.log(f"Моделирование остановлено после {result['steps']} шагов",
+                            abstract_classes.LogLevel.WARNING)
+        else:
+            self.logger.log('Success', abstract_classes.LogLevel.SUCCESS)
+
+    def export_results(self):
+        """Сохранение файла траектории последнего запуска (см. utils.trajectory_file)"""
+        if self.trajectory_path is None:
+            self.logger.log('Нет завершенного запуска для экспорта', abstract_classes.LogLevel.WARNING)
+            return
+        path, _ = QFileDialog.getSaveFileName(self, 'Экспорт результатов', 'trajectory.nbt',
+                                              'Траектория N тел (*.nbt)')
+        if not path:
+            return
+        shutil.copyfile(self.trajectory_path, path)
+        self.logger.log(f'Траектория сохранена: {path}', abstract_classes.LogLevel.SUCCESS)
+
+    def open_results(self):
+        """Просмотр сохраненной траектории без расчета: не больше REPLAY_FRAMES фреймов через равные промежутки"""
+        if self.worker is not None:
+            self.logger.log('Дождитесь окончания моделирования', abstract_classes.LogLevel.WARNING)
+            return
+        path, _ = QFileDialog.getOpenFileName(self, 'Открыть сохраненный запуск', '', 'Траектория N тел (*.nbt)')
+        if not path:
+            return
+        try:
+            reader = trajectory_file.TrajectoryReader(path)
+        except (OSError, ValueError) as error:
+            self.logger.log(str(error), abstract_classes.LogLevel.ERROR)
+            return
+        if reader.num_frames == 0:
+            self.logger.log(f'{path}: нет фреймов', abstract_classes.LogLevel.WARNING)
+            return
+
+        step = -(-reader.num_frames // REPLAY_FRAMES)
+        frames = reader.read(step=step)
+        reader.close()
+
+        self.progressBar.setFormat("Просмотр сохраненного запуска")
+        self.init_fig(frames[0, 0], frames[:, 0], reader.radius)
+        self.emit_frames(frames, 1, frames.shape[0], reader.frame_stride * step)
+        metadata = ', '.join(f'{key}: {value}' for key, value in reader.header['metadata'].items())
+        self.logger.log(f'Открыт запуск {path} ({reader.num_frames} фреймов; {metadata})',
+                        abstract_classes.LogLevel.SUCCESS)
+
+    def resume_results(self):
+        """Продолжение прерванного запуска с контрольной точки: параметры и цвета тел - из нее"""
+        if self.worker is not None:
+            self.logger.log('Дождитесь окончания моделирования', abstract_classes.LogLevel.WARNING)
+            return
+        path, _ = QFileDialog.getOpenFileName(self, 'Продолжить с контрольной точки',
+                                              os.path.dirname(CHECKPOINT_PATH), 'Контрольная точка (*.npz)')
+        if not path:
+            return
+        try:
+            saved = simulation.read_checkpoint(path)
+        except (OSError, ValueError, KeyError) as error:
+            self.logger.log(f'{path}: не контрольная точка ({error})', abstract_classes.LogLevel.ERROR)
+            return
+
+        settings = saved['settings']
+        self.colors_body = settings['metadata'].get('colors', self.colors_body)
+        frames = saved['frames']
+        available = int(np.count_nonzero(~np.isnan(frames).all(axis=(1, 2, 3))))
 
-        self.logger.log('Success', abstract_classes.LogLevel.SUCCESS)
+        self.progressBar.setFormat("Моделирование завершено на: 0.00%")
+        self.init_fig(frames[0, 0], frames[:available, 0], saved['radius'])
+        self.frame_stride = settings['frame_stride']
+        self.emitted = self.emit_frames(frames, 1, available, self.frame_stride)
+        self.method = settings['method']
+
+        task = functools.partial(simulation.resume, path,
+                                 trajectory=os.path.join(self.temppath[0], 'trajectory.nbt'),
+                                 checkpoint=path)
+        self.trajectory_path = None
+        self.logger.log(f'Продолжение запуска с контрольной точки {path}', abstract_classes.LogLevel.INFO)
+        self.start_worker(task, self.show_frames, self.update_progress, self.run_finished)
+
+    def emit_frames(self, frames, emitted, available, frame_stride):
+        """
+        Отправка в график фреймов [emitted, available): только новые положения тел и ранги точек в пирамиде
+        детализации, следы достраиваются на странице. Возвращает число отправленных
+        """
+        if emitted < available:
+            points = frames[emitted:available, 0]
+            self.webEngine.bridge.append_frames(points,
+                                                np.arange(emitted, available) * frame_stride,
+                                                self.pyramid.append(points),
+                                                self.webEngine.webView)
+        return max(emitted, available)
+
+    def report_collision(self, state, contact):
+        pairs = math_helpers.collision_check(num_body=state.shape[2],
+                                             body_radius=contact[1],
+                                             coordinate=state[0])
+        bodies = contact[2]
+        text = 'Моделирование завершено досрочно.'
+        for collision in pairs:
+            text += f'\nСтолкнулись {bodies[collision[0] - 1] + 1} и {bodies[collision[1] - 1] + 1} тела'
+        self.logger.log(text, abstract_classes.LogLevel.WARNING)
+        self.progressBar.setValue(1000)
+
+    def report_contacts(self, contact):
+        if contact[4] != collisions.COLLISION_STOP and contact[3][0] > 0:
+            self.logger.log(f'Обработано столкновений: {contact[3][0]}, осталось тел: {contact[0].shape[0]}',
+                            abstract_classes.LogLevel.INFO)
+
+    def update_progress(self, fraction):
+        self.progressBar.setFormat(f"Моделирование завершено на: {fraction * 100:.2f}%")
+        self.progressBar.setValue(int(fraction * 1000))
+
+    def init_fig(self, data, extent=None, radius=None):
+        """
+        Новый график с телами в положениях data (3, N) и начальным фреймом анимации.
+        Пределы осей - по extent (положения тел, форма (..., 3, N)), по умолчанию по data;
+        при выходе тел за пределы страница расширяет их сама.
+        Начиная с plot_generators.CLOUD_BODIES тел - облако точек с размерами маркеров по радиусам radius
+        """
+        num_body = data.shape[1]
+        if len(self.colors_body) < num_body:
+            self.colors_body = self.colors_body + ['#%06X' % np.random.randint(0, 0xFFFFFF)
+                                                   for _ in range(num_body - len(self.colors_body))]
+        cloud = plot_generators.cloud_mode(num_body)
 
-    def init_fig(self, data):
         # Создаем subplot
         fig = make_subplots(
             rows=1, cols=1,
@@ -135,46 +550,29 @@ class NBody(abstract_classes.MainWidget):
                                # Настройки отображения маркеров
                                scattermode='overlay',
                                scattergap=0,
+                               scene=plot_generators.scene_ranges(data if extent is None else extent),
+                               meta=dict(cloud=cloud),
                                )
         fig.frames = []
 
-        markers = plot_generators.generate_markers_nbody(data, self.colors_body)
+        if cloud:
+            markers = plot_generators.generate_markers_cloud(data, self.colors_body, radius)
+        else:
+            markers = plot_generators.generate_markers_nbody(data, self.colors_body)
 
         for i in range(len(markers)):
             fig.add_trace(
                 markers[i],1, 1
             )
 
-        tempdata = np.concatenate(([data], [data]), axis=0)
-        lines = plot_generators.generate_lines_nbody(tempdata, self.colors_body)
+        if cloud:
+            lines = plot_generators.generate_lines_cloud(data[None], self.colors_body)
+        else:
+            lines = plot_generators.generate_lines_nbody(data[None], self.colors_body)
+        self.pyramid = trajectory_pyramid.TrajectoryPyramid(data)
 
         for i in range(len(lines)):
             fig.add_trace(lines[i], 1, 1)
 
         # Инициализируем график
         self.webEngine.bridge.init_plot(fig, self.webEngine.webView)
-
-
-    def create_frame(self, data, index):
-        slider = dict(
-            label=str(index),
-            method="animate",
-            args=[[str(index)]]
-        )
-        markers = plot_generators.generate_markers_nbody(data[index, 0], self.colors_body)
-
-        if index == 0:
-            tempdata = np.concatenate(([data[index, 0]], [data[index, 0]]), axis=0)
-            lines = plot_generators.generate_lines_nbody(tempdata, self.colors_body)
-        else:
-            lines = plot_generators.generate_lines_nbody(data[:index + 1, 0], self.colors_body)
-
-        figure_list = markers + lines
-
-        frame = go.Frame(
-            name=str(index),
-            data=figure_list,
-            traces=list(range(len(figure_list)))
-        )
-
-        self.webEngine.bridge.add_frame(frame, slider, self.webEngine.webView)
\ No newline at end of file
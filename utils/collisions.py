@@ -0,0 +1,219 @@
+import numpy as np
+from numba import njit
+
+
+# Запас зазора при проверке: следующая проверка нужна не раньше, чем через столько шагов
+SKIN_STEPS = 16
+
+# Реакция на столкновение тел
+COLLISION_STOP = 0
+COLLISION_MERGE = 1
+COLLISION_BOUNCE = 2
+
+# Поглощенные при слиянии тела помечаются радиусом -inf: sort-and-sweep не включает их ни в одну пару
+DEAD_RADIUS = -np.inf
+
+
+@njit(cache=True)
+def candidate_pairs(coordinate, body_radius, skin):
+    """
+    Широкая фаза sort-and-sweep по оси x с интервалами [x - r - skin / 2, x + r + skin / 2]
+    и узкая фаза по расстоянию
+
+    Args:
+        coordinate (np.ndarray): координаты тел, форма (3, N)
+        body_radius (np.ndarray): радиусы тел, форма (N, )
+        skin (float): запас зазора
+
+    Returns:
+        tuple: (пары тел с зазором не больше skin, форма (K, 2), индексы с 0; зазоры пар, форма (K, ))
+    """
+    num_body = coordinate.shape[1]
+    low = coordinate[0] - body_radius - skin / 2
+    high = coordinate[0] + body_radius + skin / 2
+    order = np.argsort(low)
+
+    pairs = np.empty((max(num_body, 1), 2), dtype=np.int64)
+    gaps = np.empty(max(num_body, 1))
+    count = 0
+    for index_a in range(num_body):
+        i_body = order[index_a]
+        for index_b in range(index_a + 1, num_body):
+            j_body = order[index_b]
+            if low[j_body] > high[i_body]:
+                break
+            radius_2 = 0.
+            for axis in range(3):
+                delta = coordinate[axis, i_body] - coordinate[axis, j_body]
+                radius_2 += delta * delta
+            gap = np.sqrt(radius_2) - body_radius[i_body] - body_radius[j_body]
+            if gap > skin:
+                continue
+            if count == pairs.shape[0]:
+                pairs = np.concatenate((pairs, np.empty_like(pairs)))
+                gaps = np.concatenate((gaps, np.empty_like(gaps)))
+            pairs[count, 0] = min(i_body, j_body)
+            pairs[count, 1] = max(i_body, j_body)
+            gaps[count] = gap
+            count += 1
+    return pairs[:count], gaps[:count]
+
+
+@njit(cache=True)
+def collision_pairs(coordinate, body_radius):
+    """Пары соприкоснувшихся тел, форма (K, 2), индексы с 0"""
+    pairs, gaps = candidate_pairs(coordinate, body_radius, 0.)
+    return pairs[gaps <= 0]
+
+
+@njit(cache=True)
+def max_speed(speed):
+    """Наибольший модуль скорости, скорости формы (3, N)"""
+    result = 0.
+    for body in range(speed.shape[1]):
+        result = max(result, speed[0, body] ** 2 + speed[1, body] ** 2 + speed[2, body] ** 2)
+    return np.sqrt(result)
+
+
+@njit(cache=True)
+def max_displacement(old, new):
+    """Наибольшее смещение тела между положениями old и new, форма (3, N)"""
+    result = 0.
+    for body in range(old.shape[1]):
+        result = max(result, (new[0, body] - old[0, body]) ** 2 + (new[1, body] - old[1, body]) ** 2 +
+                     (new[2, body] - old[2, body]) ** 2)
+    return np.sqrt(result)
+
+
+@njit(cache=True)
+def contact_gap(coordinate, speed, body_radius, ts):
+    """
+    Нижняя граница зазоров всех пар тел: пары вне запаса skin (оценка пути за SKIN_STEPS шагов ts
+    по текущим скоростям) разделены больше чем на skin.
+    Зазор пары уменьшается за шаг не больше, чем на сумму смещений двух тел, поэтому пока граница,
+    уменьшаемая на 2 * max_displacement после каждого шага, положительна, проверку столкновений можно пропускать
+
+    Returns:
+        tuple: (min(запас, наименьший зазор пар в запасе), есть ли соприкоснувшиеся тела)
+    """
+    skin = SKIN_STEPS * 2 * max_speed(speed) * ts
+    _, gaps = candidate_pairs(coordinate, body_radius, skin)
+    if gaps.shape[0] == 0:
+        return skin, False
+    return min(skin, gaps.min()), gaps.min() <= 0
+
+
+@njit(cache=True)
+def contact_workspace(masses, body_radius, mode, restitution):
+    """
+    Рабочие массивы реакции на столкновения. Создаются один раз на запуск модели
+
+    Args:
+        masses (np.ndarray): массы тел, форма (N, )
+        body_radius (np.ndarray): радиусы тел, форма (N, )
+        mode (int): реакция на столкновение, COLLISION_STOP, COLLISION_MERGE или COLLISION_BOUNCE
+        restitution (float): коэффициент восстановления при отскоке (1 - упругий, 0 - абсолютно неупругий)
+
+    Returns:
+        tuple: (массы (N, ), радиусы (N, ), исходные номера тел (N, ), счетчик обработанных столкновений (1, ),
+                реакция, коэффициент восстановления)
+    """
+    num_body = masses.shape[0]
+    return (masses.astype(np.float64),
+            body_radius.astype(np.float64),
+            np.arange(num_body),
+            np.zeros(1, dtype=np.int64),
+            mode,
+            float(restitution))
+
+
+@njit(cache=True)
+def _merge(coordinate, speed, gravity_masses, masses, body_radius, keep, drop):
+    """Слияние тела drop в keep с сохранением массы, импульса и объема"""
+    total = masses[keep] + masses[drop]
+    weight = masses[keep] / total if total > 0 else 0.5
+    for axis in range(3):
+        coordinate[axis, keep] = weight * coordinate[axis, keep] + (1 - weight) * coordinate[axis, drop]
+        speed[axis, keep] = weight * speed[axis, keep] + (1 - weight) * speed[axis, drop]
+        speed[axis, drop] = 0.
+    body_radius[keep] = np.cbrt(body_radius[keep] ** 3 + body_radius[drop] ** 3)
+    masses[keep] = total
+    gravity_masses[keep] += gravity_masses[drop]
+
+    masses[drop] = 0.
+    gravity_masses[drop] = 0.
+    body_radius[drop] = DEAD_RADIUS
+
+
+@njit(cache=True)
+def _bounce(coordinate, speed, masses, restitution, i_body, j_body):
+    """Отскок сближающейся пары вдоль линии центров, возвращает, изменились ли скорости"""
+    normal = coordinate[:, j_body] - coordinate[:, i_body]
+    distance = np.sqrt(np.sum(normal ** 2))
+    if distance == 0:
+        return False
+    normal /= distance
+    approach = np.sum((speed[:, j_body] - speed[:, i_body]) * normal)
+    if approach >= 0:
+        return False
+
+    # Доли изменения скорости обратно пропорциональны массам: импульс пары сохраняется
+    total = masses[i_body] + masses[j_body]
+    weight_i = masses[j_body] / total if total > 0 else 0.5
+    delta = (1 + restitution) * approach
+    for axis in range(3):
+        speed[axis, i_body] += weight_i * delta * normal[axis]
+        speed[axis, j_body] -= (1 - weight_i) * delta * normal[axis]
+    return True
+
+
+@njit(cache=True)
+def resolve_contacts(coordinate, speed, gravity_masses, contact):
+    """
+    Слияние или отскок соприкоснувшихся тел на месте.
+    При слиянии остается более тяжелое тело, поглощенное помечается DEAD_RADIUS и нулевой массой
+    до уплотнения массивов (compact_contact); слияния повторяются, пока есть касания
+
+    Args:
+        coordinate (np.ndarray): координаты тел, форма (3, N)
+        speed (np.ndarray): скорости тел, форма (3, N)
+        gravity_masses (np.ndarray): G * m рабочих массивов правой части
+        contact (tuple): результат contact_workspace
+
+    Returns:
+        int: число обработанных столкновений
+    """
+    masses, body_radius, _, events, mode, restitution = contact
+    resolved = 0
+    while True:
+        pairs = collision_pairs(coordinate, body_radius)
+        merged = False
+        for pair in range(pairs.shape[0]):
+            i_body, j_body = pairs[pair, 0], pairs[pair, 1]
+            if body_radius[i_body] == DEAD_RADIUS or body_radius[j_body] == DEAD_RADIUS:
+                continue
+            if mode == COLLISION_MERGE:
+                if masses[j_body] > masses[i_body]:
+                    i_body, j_body = j_body, i_body
+                _merge(coordinate, speed, gravity_masses, masses, body_radius, i_body, j_body)
+                merged = True
+                resolved += 1
+            elif _bounce(coordinate, speed, masses, restitution, i_body, j_body):
+                resolved += 1
+        # Отскок не сближает тела, после него повторная проверка не нужна
+        if not merged:
+            break
+    events[0] += resolved
+    return resolved
+
+
+def compact_contact(contact):
+    """
+    Удаление поглощенных тел из рабочих массивов столкновений
+
+    Returns:
+        tuple: (уплотненный contact, маска оставшихся тел формы (N, ))
+    """
+    masses, body_radius, bodies, events, mode, restitution = contact
+    keep = body_radius != DEAD_RADIUS
+    return (masses[keep], body_radius[keep], bodies[keep], events, mode, restitution), keep
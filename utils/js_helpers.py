@@ -2,17 +2,23 @@ import json
 import os.path
 from pathlib import Path
 
+import numpy as np
 import plotly
-from PySide6.QtCore import QObject, Signal, Slot
+from PySide6.QtCore import QObject, QTimer, Signal, Slot
 
 from constants import ui_constants as ui_constants
 from core import abstract_classes as abstract_classes
+from utils import plot_generators, trajectory_pyramid
+
+# Период отправки накопленных фреймов в страницу, мс: число сообщений не зависит от частоты фреймов
+FLUSH_INTERVAL = 50
 
 
 class PythonJsBridge(QObject):
     """Мост для коммуникации между Python и JavaScript"""
     initFigJson = Signal(str)
-    pushFrameJson = Signal(str, str)
+    appendFramesData = Signal(str)
+    showHistoryData = Signal(str)
 
 
     def __init__(self, logger, parent=None):
@@ -20,6 +26,13 @@ class PythonJsBridge(QObject):
         self._ready = False
         self.logger = logger
 
+        # Очередь новых фреймов: (положения, номера шагов), отправляется одним сообщением раз в FLUSH_INTERVAL
+        self._queue = []
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(FLUSH_INTERVAL)
+        self._flush_timer.timeout.connect(self.flush)
+
     @Slot()
     def bridgeReady(self):
         """Вызывается когда JS мост готов"""
@@ -52,22 +65,48 @@ class PythonJsBridge(QObject):
             'layout': fig.layout
         }, cls=plotly.utils.PlotlyJSONEncoder)
         # webview.page().runJavaScript(f"initializePlot('{fig_json}')")
+        # Не отправленные фреймы относятся к прежнему графику
+        self._queue.clear()
+        self._flush_timer.stop()
         self.initFigJson.emit(fig_json)
 
-    def add_frame(self, frame, slider, webview):
+    def append_frames(self, points, iterations, ranks, webview):
         """
-        Добавление фрейма
+        Добавление фреймов в очередь: передаются только новые положения тел, следы и фреймы анимации
+        достраиваются на странице из накопленных положений. Очередь отправляется одним сообщением
+        не позже чем через FLUSH_INTERVAL мс
 
         Args:
-            frame (plotly.graph_objects.Frame): объект фрейма
-            slider (list)
+            points (np.ndarray): положения тел в новых фреймах, форма (n, 3, N); NaN - тело выбыло
+            iterations (list): номера шагов новых фреймов (подписи шкалы анимации)
+            ranks (np.ndarray): ранги точек фреймов, предшествующих новым (см. trajectory_pyramid), форма (n, N)
             webview (): объект webviewwrapper
         """
 
-        frame_json = json.dumps(frame, cls=plotly.utils.PlotlyJSONEncoder)
-        slider_json = json.dumps(slider, cls=plotly.utils.PlotlyJSONEncoder)
-        # webview.page().runJavaScript(f"addFrame('{frame_json}', '{slider_json}')")
-        self.pushFrameJson.emit(frame_json, slider_json)
+        self._queue.append((np.array(points), np.asarray(iterations), np.array(ranks)))
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def flush(self):
+        """Отправка всех фреймов очереди одним сообщением"""
+        if not self._queue:
+            return
+        points = np.concatenate([points for points, _, _ in self._queue])
+        iterations = np.concatenate([iterations for _, iterations, _ in self._queue])
+        ranks = np.concatenate([ranks for _, _, ranks in self._queue])
+        self._queue.clear()
+        self.appendFramesData.emit(plot_generators.frames_payload(points, iterations, ranks))
+
+    def show_history(self, history, webview):
+        """
+        Вывод положений тел и следов вместо текущих данных графика без сохранения в анимации (живой режим)
+
+        Args:
+            history (np.ndarray): положения тел от старых к новым, форма (H, 3, N); последние - маркеры
+            webview (): объект webviewwrapper
+        """
+
+        self.showHistoryData.emit(plot_generators.history_payload(history))
 
 def generate_html_code():
     main_path = os.path.join(Path(os.path.abspath(__file__)).parent.parent)
@@ -89,13 +128,45 @@ def generate_html_code():
     <div id="graph"></div>
 
     <script>
-        // Глобальное состояние
+        // Глобальное состояние: положения тел во всех полученных фреймах (trails) и уровни пирамиды
+        // детализации (levels: точки с рангом не меньше уровня) - источник следов на графике и фреймов анимации
         window.plotState = {{
-            figure: null,
             bridge: null,
-            frames: [],
+            numBodies: 0,
+            count: 0,
+            trails: [],
+            steps: [],
+            box: null,
+            sliderTimer: null,
+            initialized: false,
+            pending: [],
+            drawRequested: false,
+            history: null,
+            levels: [],
+            levelMax: [],
+            display: null,
+            frameIndex: new Map(),
+            refineTimer: null,
+            cloud: false,
         }};
-        
+
+        // Запас масштаба осей при выходе тела за их пределы: оси меняются редко
+        const RANGE_MARGIN = 1.5;
+        // Шкала анимации обновляется не чаще, чем раз в SLIDER_INTERVAL мс
+        const SLIDER_INTERVAL = 500;
+        // Уровни пирамиды детализации следов (trajectory_pyramid.LEVELS), уровень 0 - все фреймы
+        const LEVELS = {trajectory_pyramid.LEVELS};
+        // Наибольшее число точек следа тела: на графике при исходном масштабе и во фреймах анимации
+        const TRAIL_POINTS = 2000;
+        const SCRUB_POINTS = 200;
+        // В облаке точек (plot_generators.CLOUD_BODIES тел и больше) - наибольшее число точек всех следов
+        const CLOUD_TRAIL_POINTS = 100000;
+        const CLOUD_SCRUB_POINTS = 5000;
+        // Подробный след выбранного на шкале фрейма выводится через REFINE_DELAY мс после остановки шкалы
+        const REFINE_DELAY = 150;
+        // Расстояние камеры Plotly по умолчанию: при приближении след выводится подробнее
+        const DEFAULT_EYE = Math.hypot(1.25, 1.25, 1.25);
+
         const config = {{
             responsive: true,
             displayModeBar: true,
@@ -110,43 +181,432 @@ def generate_html_code():
             // Сообщаем Python, что мост готов
             if (window.plotState.bridge) {{
                 window.plotState.bridge.initFigJson.connect(initializePlot);
-                window.plotState.bridge.pushFrameJson.connect(addFrame);
+                window.plotState.bridge.appendFramesData.connect(appendFrames);
+                window.plotState.bridge.showHistoryData.connect(showHistory);
                 window.plotState.bridge.bridgeReady();
             }}
         }});
 
-        window.plotState.bridge.logMessage('Ага');
-
         function initializePlot(plotJSON) {{
             const figure = JSON.parse(plotJSON);
+            const state = window.plotState;
+            figure.layout.sliders = [{{steps: []}}];
+            // Фреймы, пришедшие до готовности нового графика, ждут в pending
+            state.initialized = false;
+            state.pending = [];
+            state.history = null;
+
+            // newPlot, а не react: фреймы анимации прошлого запуска удаляются
+            Plotly.newPlot('graph', figure.data, figure.layout, config).then(() => {{
+                // Облако точек: трасса 0 - маркеры всех тел, трасса 1 - следы всех тел
+                state.cloud = Boolean(figure.layout.meta && figure.layout.meta.cloud);
+                state.numBodies = state.cloud ? figure.data[0].x.length : figure.data.length / 2;
+                state.count = 0;
+                state.trails = [];
+                state.levels = [];
+                for (let body = 0; body < state.numBodies; body++) {{
+                    state.trails.push({{x: new Float64Array(64), y: new Float64Array(64), z: new Float64Array(64)}});
+                    state.levels.push([...Array(LEVELS).keys()].map(() => ({{
+                        x: new Float64Array(64), y: new Float64Array(64), z: new Float64Array(64),
+                        frame: new Int32Array(64), count: 0,
+                    }})));
+                }}
+                state.levelMax = new Array(LEVELS).fill(0);
+                state.display = {{index: 0, level: 0}};
+                state.frameIndex = new Map([['0', 0]]);
+                state.steps = [{{label: '0', method: 'animate', args: [['0']]}}];
+                const scene = figure.layout.scene;
+                state.box = ['xaxis', 'yaxis', 'zaxis'].map(axis => scene[axis].range.slice());
 
-            Plotly.react('graph', figure.data, figure.layout, config).then(() => {{
-                window.plotState.figure = figure;
-                window.plotState.figure.layout.sliders = [];
-                window.plotState.figure.layout.sliders.push({{
-                    steps: [],
+                // Начальный фрейм - положения маркеров
+                pushPoint(state.cloud ? [figure.data[0].x, figure.data[0].y, figure.data[0].z] :
+                    [0, 1, 2].map(axis => figure.data.slice(0, state.numBodies).map(
+                        trace => [trace.x, trace.y, trace.z][axis][0])));
+                Plotly.addFrames('graph', [makeFrame(0, '0')]);
+                updateSlider();
+
+                // Фрейм на шкале или при воспроизведении выводится с грубым следом, подробный - после остановки
+                const graph = document.getElementById('graph');
+                graph.on('plotly_animatingframe', event => {{
+                    state.display = null;
+                    scheduleRefine(state.frameIndex.get(event.name));
+                }});
+                graph.on('plotly_relayout', update => {{
+                    if (!Object.keys(update).some(key => key.startsWith('scene.camera')) || state.display === null) return;
+                    const level = chooseLevel(state.display.index, displayBudget());
+                    if (level !== state.display.level) showTrail(state.display.index, level);
                 }});
-                window.plotState.figure.frames = [];
-                window.plotState.bridge.plotInitialized(true);
+                state.initialized = true;
+                requestDraw();
+                if (state.history !== null) showHistory(state.history);
+                state.bridge.plotInitialized(true);
             }}).catch(error => {{
                 console.error("Plot initialization error:", error);
                 window.plotState.bridge.plotInitialized(false);
             }});
         }}
 
-        function addFrame(frameJSON, sliderJSON) {{
-            const frame = JSON.parse(frameJSON);
-            const slider = JSON.parse(sliderJSON);
-            
-            window.plotState.figure.frames.push(frame);
-            window.plotState.figure.layout.sliders[0].steps.push(slider);
-            
-            // Добавляем фреймы к текущему графику
-            Plotly.react('graph', window.plotState.figure).then(() => {{
-                window.plotState.bridge.logMessage('Фрейма добавлен успешно')
-            }}).catch(error => {{
-                window.plotState.bridge.logMessage('Фрейм не добавлен')
+        function pushPoint(point) {{
+            // point: [x, y, z] по телам, null - тело выбыло
+            const state = window.plotState;
+            state.trails.forEach((trail, body) => {{
+                if (state.count === trail.x.length) {{
+                    // Прежние массивы не меняются: на них ссылаются уже созданные фреймы анимации
+                    for (const axis of ['x', 'y', 'z']) {{
+                        const grown = new Float64Array(trail[axis].length * 2);
+                        grown.set(trail[axis]);
+                        trail[axis] = grown;
+                    }}
+                }}
+                trail.x[state.count] = point[0][body] === null ? NaN : point[0][body];
+                trail.y[state.count] = point[1][body] === null ? NaN : point[1][body];
+                trail.z[state.count] = point[2][body] === null ? NaN : point[2][body];
             }});
+            state.count += 1;
+        }}
+
+        function pushRanks(frame, ranks) {{
+            // ranks: ранги точек фрейма frame по телам; точка попадает в уровни 1...ранг
+            const state = window.plotState;
+            state.levels.forEach((levels, body) => {{
+                for (let level = 1; level <= ranks[body]; level++) {{
+                    const points = levels[level];
+                    if (points.count === points.frame.length) {{
+                        for (const axis of ['x', 'y', 'z', 'frame']) {{
+                            const grown = new points[axis].constructor(points[axis].length * 2);
+                            grown.set(points[axis]);
+                            points[axis] = grown;
+                        }}
+                    }}
+                    points.x[points.count] = state.trails[body].x[frame];
+                    points.y[points.count] = state.trails[body].y[frame];
+                    points.z[points.count] = state.trails[body].z[frame];
+                    points.frame[points.count] = frame;
+                    points.count += 1;
+                    state.levelMax[level] = Math.max(state.levelMax[level], points.count);
+                }}
+            }});
+        }}
+
+        function levelCount(points, index) {{
+            // Число точек уровня с номерами фреймов не больше index
+            let low = 0;
+            let high = points.count;
+            while (low < high) {{
+                const middle = (low + high) >> 1;
+                if (points.frame[middle] <= index) low = middle + 1;
+                else high = middle;
+            }}
+            return low;
+        }}
+
+        function chooseLevel(index, budget) {{
+            // Самый подробный уровень, на котором в следе до фрейма index у каждого тела не больше budget точек
+            const state = window.plotState;
+            if (index + 1 <= budget) return 0;
+            for (let level = 1; level < LEVELS - 1; level++) {{
+                // Для последнего фрейма ранги известны до предыдущего: число точек - размер уровня
+                const count = index === state.count - 1 ? state.levelMax[level] :
+                    Math.max(...state.levels.map(levels => levelCount(levels[level], index)));
+                if (count + 1 <= budget) return level;
+            }}
+            return LEVELS - 1;
+        }}
+
+        function displayBudget() {{
+            const scene = document.getElementById('graph').layout.scene;
+            const eye = scene && scene.camera && scene.camera.eye;
+            const zoom = eye ? DEFAULT_EYE / Math.hypot(eye.x, eye.y, eye.z) : 1;
+            return trailBudget(TRAIL_POINTS, CLOUD_TRAIL_POINTS) * Math.min(Math.max(zoom, 0.25), 16);
+        }}
+
+        function trailBudget(points, cloudPoints) {{
+            // Точек на след тела: в облаке общее число точек делится между телами
+            const state = window.plotState;
+            return state.cloud ? cloudPoints / state.numBodies : points;
+        }}
+
+        function trailParts(body, level, index) {{
+            // След тела до фрейма index на уровне level: первые count точек массивов points
+            // и, если tail, положение во фрейме index
+            const state = window.plotState;
+            if (level === 0) return {{points: state.trails[body], count: index + 1, tail: 0}};
+            const points = state.levels[body][level];
+            const count = levelCount(points, index);
+            return {{points: points, count: count, tail: count === 0 || points.frame[count - 1] !== index ? 1 : 0}};
+        }}
+
+        function levelTrail(body, level, index) {{
+            // След тела до фрейма index на уровне level, заканчивается положением во фрейме index
+            const trail = window.plotState.trails[body];
+            const part = trailParts(body, level, index);
+            return ['x', 'y', 'z'].map(axis => {{
+                const values = Array.from(part.points[axis].subarray(0, part.count));
+                if (part.tail) values.push(trail[axis][index]);
+                return values;
+            }});
+        }}
+
+        function mergedTrail(level, index) {{
+            // Следы всех тел облака одной линией: участки тел разделены NaN, цвет вершины - номер тела
+            const state = window.plotState;
+            const parts = state.trails.map((_, body) => trailParts(body, level, index));
+            const total = parts.reduce((sum, part) => sum + part.count + part.tail + 1, 0);
+            const merged = {{
+                x: new Float32Array(total), y: new Float32Array(total), z: new Float32Array(total),
+                color: new Float32Array(total),
+            }};
+            let offset = 0;
+            parts.forEach((part, body) => {{
+                const end = offset + part.count + part.tail;
+                for (const axis of ['x', 'y', 'z']) {{
+                    merged[axis].set(part.points[axis].subarray(0, part.count), offset);
+                    if (part.tail) merged[axis][end - 1] = state.trails[body][axis][index];
+                    merged[axis][end] = NaN;
+                }}
+                merged.color.fill(body, offset, end + 1);
+                offset = end + 1;
+            }});
+            return merged;
+        }}
+
+        function framePoint(index) {{
+            // Положения всех тел во фрейме index для маркеров облака
+            const trails = window.plotState.trails;
+            return ['x', 'y', 'z'].map(axis => Float32Array.from(trails, trail => trail[axis][index]));
+        }}
+
+        function showTrail(index, level) {{
+            // Следы до фрейма index на уровне level вместо текущих данных следов графика
+            const state = window.plotState;
+            state.display = {{index: index, level: level}};
+            if (state.cloud) {{
+                const merged = mergedTrail(level, index);
+                Plotly.restyle('graph', {{
+                    x: [merged.x], y: [merged.y], z: [merged.z], 'line.color': [merged.color],
+                }}, [1]);
+                return;
+            }}
+            const trails = state.trails.map((_, body) => levelTrail(body, level, index));
+            Plotly.restyle('graph', {{
+                x: trails.map(trail => trail[0]), y: trails.map(trail => trail[1]), z: trails.map(trail => trail[2]),
+            }}, trails.map((_, body) => state.numBodies + body));
+        }}
+
+        function scheduleRefine(index) {{
+            const state = window.plotState;
+            clearTimeout(state.refineTimer);
+            if (index === undefined) return;
+            state.refineTimer = setTimeout(() => {{
+                if (state.display === null) showTrail(index, chooseLevel(index, displayBudget()));
+            }}, REFINE_DELAY);
+        }}
+
+        function makeFrame(index, name) {{
+            // Следы фрейма на уровне 0 - представления накопленных массивов без копирования, на грубом уровне
+            // (для длинных следов) - копия точек с известным рангом до фрейма index и положения во фрейме index
+            const state = window.plotState;
+            const level = chooseLevel(index, trailBudget(SCRUB_POINTS, CLOUD_SCRUB_POINTS));
+            if (state.cloud) {{
+                // Общий след облака собирается копированием, его размер ограничен CLOUD_SCRUB_POINTS
+                const point = framePoint(index);
+                const merged = mergedTrail(level, index);
+                return {{name: name, data: [
+                    {{x: point[0], y: point[1], z: point[2]}},
+                    {{x: merged.x, y: merged.y, z: merged.z, line: {{color: merged.color}}}},
+                ], traces: [0, 1]}};
+            }}
+            const trails = state.trails;
+            const markers = trails.map(trail => ({{
+                x: [trail.x[index]], y: [trail.y[index]], z: [trail.z[index]],
+            }}));
+            const lines = trails.map((trail, body) => {{
+                if (level === 0) {{
+                    return {{x: trail.x.subarray(0, index + 1), y: trail.y.subarray(0, index + 1),
+                             z: trail.z.subarray(0, index + 1)}};
+                }}
+                const coarse = levelTrail(body, level, index);
+                return {{x: coarse[0], y: coarse[1], z: coarse[2]}};
+            }});
+            return {{name: name, data: markers.concat(lines), traces: [...Array(2 * trails.length).keys()]}};
+        }}
+
+        function decodeArray(text, type) {{
+            // base64 байтов little-endian (см. plot_generators.encode_array) в типизированный массив
+            const binary = atob(text);
+            const bytes = new Uint8Array(binary.length);
+            for (let index = 0; index < binary.length; index++) {{
+                bytes[index] = binary.charCodeAt(index);
+            }}
+            return new type(bytes.buffer);
+        }}
+
+        function appendFrames(framesData) {{
+            // Положения (n, 3, N) в Float32Array; фрейм - [x, y, z] по телам, представления без копирования
+            // Число тел - из самого сообщения: фреймы могут прийти до готовности графика
+            const message = JSON.parse(framesData);
+            const iterations = Array.from(decodeArray(message.iterations, Float64Array));
+            const values = decodeArray(message.points, Float32Array);
+            const numBodies = values.length / (3 * iterations.length);
+            const points = iterations.map((_, frame) => [0, 1, 2].map(
+                axis => values.subarray((3 * frame + axis) * numBodies, (3 * frame + axis + 1) * numBodies)));
+            // Ранги (n, N) - фреймов, предшествующих новым: ранг известен, когда получен следующий фрейм
+            const ranks = decodeArray(message.ranks, Uint8Array);
+            window.plotState.pending.push({{
+                iterations: iterations, points: points,
+                ranks: iterations.map((_, frame) => ranks.subarray(frame * numBodies, (frame + 1) * numBodies)),
+            }});
+            requestDraw();
+        }}
+
+        function requestDraw() {{
+            const state = window.plotState;
+            if (state.initialized && state.pending.length && !state.drawRequested) {{
+                state.drawRequested = true;
+                requestAnimationFrame(drawPending);
+            }}
+        }}
+
+        function drawPending() {{
+            // Все пришедшие с прошлой отрисовки фреймы - одним вызовом каждой функции Plotly
+            const state = window.plotState;
+            state.drawRequested = false;
+            if (!state.initialized || !state.pending.length) return;
+            const iterations = [].concat(...state.pending.map(batch => batch.iterations));
+            const points = [].concat(...state.pending.map(batch => batch.points));
+            const ranks = [].concat(...state.pending.map(batch => batch.ranks));
+            state.pending = [];
+
+            const graph = document.getElementById('graph');
+            const start = state.count;
+            // Фрейм создается сразу после добавления его точки: уровни содержат ровно предшествующие фреймы
+            const frames = iterations.map((iteration, offset) => {{
+                pushPoint(points[offset]);
+                pushRanks(start + offset - 1, ranks[offset]);
+                state.frameIndex.set(String(iteration), start + offset);
+                return makeFrame(start + offset, String(iteration));
+            }});
+            Plotly.addFrames(graph, frames);
+            iterations.forEach(iteration => state.steps.push({{
+                label: String(iteration), method: 'animate', args: [[String(iteration)]],
+            }}));
+
+            const markers = [...Array(state.numBodies).keys()];
+            const lines = markers.map(body => state.numBodies + body);
+            const last = state.count - 1;
+            const level = chooseLevel(last, displayBudget());
+            const display = state.display;
+            if (!state.cloud && display !== null && display.level === 0 && level === 0 &&
+                    display.index === start - 1) {{
+                // В следы дописываются только новые точки
+                Plotly.extendTraces(graph, {{
+                    x: state.trails.map(trail => Array.from(trail.x.subarray(start, state.count))),
+                    y: state.trails.map(trail => Array.from(trail.y.subarray(start, state.count))),
+                    z: state.trails.map(trail => Array.from(trail.z.subarray(start, state.count))),
+                }}, lines);
+                state.display = {{index: last, level: 0}};
+            }} else {{
+                // Длинный след - с уровня пирамиды, облако или показан фрейм, выбранный на шкале:
+                // следы выводятся заново
+                showTrail(last, level);
+            }}
+            if (state.cloud) {{
+                const point = framePoint(last);
+                Plotly.restyle(graph, {{x: [point[0]], y: [point[1]], z: [point[2]]}}, [0]);
+            }} else {{
+                Plotly.restyle(graph, {{
+                    x: state.trails.map(trail => [trail.x[last]]),
+                    y: state.trails.map(trail => [trail.y[last]]),
+                    z: state.trails.map(trail => [trail.z[last]]),
+                }}, markers);
+            }}
+
+            fitRange(points);
+            // Шаги шкалы добавлены выше, шкала перерисовывается одним relayout не чаще SLIDER_INTERVAL
+            if (state.sliderTimer === null) {{
+                state.sliderTimer = setTimeout(updateSlider, SLIDER_INTERVAL);
+            }}
+        }}
+
+        function updateSlider() {{
+            const state = window.plotState;
+            state.sliderTimer = null;
+            Plotly.relayout('graph', {{'sliders[0].steps': state.steps.slice()}});
+        }}
+
+        function fitRange(points) {{
+            // Оси заданы явно и меняются, только когда тело выходит за их пределы: без автомасштаба
+            // график не перестраивает оси на каждом фрейме
+            const box = window.plotState.box;
+            let outside = false;
+            const bounds = box.map(range => range.slice());
+            points.forEach(point => point.forEach((values, axis) => values.forEach(value => {{
+                if (value === null || !isFinite(value)) return;
+                bounds[axis][0] = Math.min(bounds[axis][0], value);
+                bounds[axis][1] = Math.max(bounds[axis][1], value);
+                outside = outside || value < box[axis][0] || value > box[axis][1];
+            }})));
+            if (!outside) return;
+
+            // Куб с общим размахом по осям: пропорции системы не искажаются
+            const half = Math.max(...bounds.map(range => range[1] - range[0])) / 2 * RANGE_MARGIN;
+            const update = {{}};
+            ['xaxis', 'yaxis', 'zaxis'].forEach((axis, index) => {{
+                const center = (bounds[index][0] + bounds[index][1]) / 2;
+                box[index] = [center - half, center + half];
+                update[`scene.${{axis}}.range`] = box[index].slice();
+            }});
+            Plotly.relayout('graph', update);
+        }}
+
+        function showHistory(historyData) {{
+            // Положения (N, 3, H): след тела по оси - непрерывный участок, последний элемент - маркер.
+            // До готовности графика хранится только последнее сообщение
+            const state = window.plotState;
+            state.history = historyData;
+            if (!state.initialized) return;
+            state.history = null;
+            const message = JSON.parse(historyData);
+            const values = decodeArray(message.points, Float32Array);
+            const length = message.length;
+            const numBodies = values.length / (3 * length);
+            const trails = [...Array(numBodies).keys()].map(body => [0, 1, 2].map(
+                axis => values.subarray((3 * body + axis) * length, (3 * body + axis + 1) * length)));
+            const markers = [...Array(numBodies).keys()];
+            const failed = error => {{
+                window.plotState.bridge.logMessage('Фрейм не выведен')
+            }};
+
+            if (state.cloud) {{
+                // Следы тел подряд, после каждого - NaN: одна линия с цветом вершин по номеру тела
+                const merged = [0, 1, 2].map(() => new Float32Array(numBodies * (length + 1)));
+                const color = new Float32Array(numBodies * (length + 1));
+                trails.forEach((trail, body) => {{
+                    trail.forEach((values, axis) => {{
+                        merged[axis].set(values, body * (length + 1));
+                        merged[axis][(body + 1) * (length + 1) - 1] = NaN;
+                    }});
+                    color.fill(body, body * (length + 1), (body + 1) * (length + 1));
+                }});
+                Plotly.restyle('graph', {{
+                    x: [Float32Array.from(trails, trail => trail[0][length - 1])],
+                    y: [Float32Array.from(trails, trail => trail[1][length - 1])],
+                    z: [Float32Array.from(trails, trail => trail[2][length - 1])],
+                }}, [0]).catch(failed);
+                Plotly.restyle('graph', {{
+                    x: [merged[0]], y: [merged[1]], z: [merged[2]], 'line.color': [color],
+                }}, [1]).catch(failed);
+                fitRange(trails);
+                return;
+            }}
+
+            // restyle меняет только данные следов: камера и масштаб, выбранные пользователем, сохраняются
+            Plotly.restyle('graph', {{
+                x: trails.map(trail => [trail[0][length - 1]]).concat(trails.map(trail => Array.from(trail[0]))),
+                y: trails.map(trail => [trail[1][length - 1]]).concat(trails.map(trail => Array.from(trail[1]))),
+                z: trails.map(trail => [trail[2][length - 1]]).concat(trails.map(trail => Array.from(trail[2]))),
+            }}, markers.concat(markers.map(body => numBodies + body))).catch(failed);
+            fitRange(trails);
         }}
 
     </script>
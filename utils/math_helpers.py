@@ -1,6 +1,8 @@
 import numpy as np
 import pandas as pd
 
+from utils import collisions
+
 def create_dataframe_Nbody(num_body: int, color_body: list):
 
     return pd.DataFrame({
@@ -8,6 +10,7 @@ def create_dataframe_Nbody(num_body: int, color_body: list):
         'Цвет тела': color_body[:num_body],
         'Масса, кг': ['1e13'] * num_body,
         'Радиус, м': ['1'] * num_body,
+        'Пробная частица': ['0'] * num_body,
         # 'Начальная скорость x, м/c': ['0'] * num_body,
         # 'Начальная скорость y, м/c': ['0'] * num_body,
         # 'Начальная скорость z, м/c': ['0'] * num_body,
@@ -24,11 +27,7 @@ def create_dataframe_Nbody(num_body: int, color_body: list):
 
 
 def collision_check(num_body, body_radius, coordinate):
-    collision = []
-    for i_body in range(num_body - 1):
-        for j_body in range(i_body + 1, num_body):
-            delta_rad = coordinate[:, i_body] - coordinate[:, j_body]
-            radius = np.sqrt(np.sum(delta_rad ** 2))
-            if body_radius[i_body] + body_radius[j_body] >= radius:
-                collision.append([i_body + 1, j_body + 1])
-    return collision if collision != [] else False
\ No newline at end of file
+    pairs = collisions.collision_pairs(np.ascontiguousarray(coordinate[:, :num_body]), body_radius[:num_body])
+    collision = sorted([[i_body + 1, j_body + 1] for i_body, j_body in pairs])
+    return collision if collision != [] else False
+
@@ -1,25 +1,78 @@
-from typing import Callable
-
 import numpy as np
-from numba import njit, prange
+from numba import literally, njit, prange
+from numba.core import errors, types
+from numba.extending import overload, typeof_impl
+
+from utils import collisions, particle_mesh, solvers
+
+
+# Правая часть и метод передаются в скомпилированные функции номерами, а не функциями: тип функции-аргумента
+# различается между процессами, и ядро с ним не находится в кэше на диске - каждый процесс компилирует заново.
+# Номер - литерал (numba.literally), функция по нему выбирается при компиляции
+class FunctionNumber(int):
+    """Номер функции, который numba типизирует литералом: вызов из Python сразу находит готовую специализацию"""
+
+
+@typeof_impl.register(FunctionNumber)
+def _typeof_function_number(val, c):
+    return types.literal(int(val))
+
+
+SOLVE_DIRECT, SOLVE_BARNES_HUT, SOLVE_PARTICLE_MESH, SOLVE_HERMITE, SOLVE_DIRECT_SERIAL = map(FunctionNumber, range(5))
+SOLVE_FUNCTIONS = (solvers.direct_solve, solvers.barnes_hut_solve, particle_mesh.particle_mesh_solve,
+                   solvers.hermite_solve, solvers.direct_solve_serial)
+
+# Ускорения выбранных тел для блочных шагов
+SOLVE_TARGETS_DIRECT, SOLVE_TARGETS_BARNES_HUT = map(FunctionNumber, range(2))
+SOLVE_TARGETS_FUNCTIONS = (solvers.direct_solve_targets, solvers.barnes_hut_solve_targets)
+
+
+def _literal_value(number):
+    """Значение номера-литерала при компиляции"""
+    if not isinstance(number, types.IntegerLiteral):
+        raise errors.TypingError('номер функции должен быть литералом: вызывающая функция - numba.literally')
+    return number.literal_value
+
+
+def call_solve(solve, coordinate, speed, ct, func):
+    """Правая часть номер solve из SOLVE_FUNCTIONS"""
+    return SOLVE_FUNCTIONS[solve](coordinate, speed, ct, func)
+
+
+@overload(call_solve)
+def _call_solve(solve, coordinate, speed, ct, func):
+    function = SOLVE_FUNCTIONS[_literal_value(solve)]
+    return lambda solve, coordinate, speed, ct, func: function(coordinate, speed, ct, func)
 
 
-@njit(parallel=True, cache=True)
+def call_solve_targets(solve_targets, positions, targets, func):
+    """Ускорения выбранных тел функцией номер solve_targets из SOLVE_TARGETS_FUNCTIONS"""
+    return SOLVE_TARGETS_FUNCTIONS[solve_targets](positions, targets, func)
+
+
+@overload(call_solve_targets)
+def _call_solve_targets(solve_targets, positions, targets, func):
+    function = SOLVE_TARGETS_FUNCTIONS[_literal_value(solve_targets)]
+    return lambda solve_targets, positions, targets, func: function(positions, targets, func)
+
+
+@njit(cache=True)
 def rk4(ct: float,
         ts: float,
         data: np.ndarray,
-        solve: Callable,
+        solve: int,
         func = None) -> np.ndarray:
+    literally(solve)
 
     coordinate = data[0]
     speed = data[1]
 
-    k1, l1 = ts * speed, ts * solve(coordinate, speed, ct, func)
-    k2, l2 = ts * (speed + l1 / 2), ts * solve(coordinate + k1 / 2, speed + l1 / 2, ct + ts / 2, func)
+    k1, l1 = ts * speed, ts * call_solve(solve, coordinate, speed, ct, func)
+    k2, l2 = ts * (speed + l1 / 2), ts * call_solve(solve, coordinate + k1 / 2, speed + l1 / 2, ct + ts / 2, func)
 
-    k3, l3 = ts * (speed + l2 / 2), ts * solve(coordinate + k2 / 2, speed + l2 / 2, ct + ts / 2, func)
+    k3, l3 = ts * (speed + l2 / 2), ts * call_solve(solve, coordinate + k2 / 2, speed + l2 / 2, ct + ts / 2, func)
 
-    k4, l4 = ts * (speed + l3), ts * solve(coordinate + k3, speed + l3, ct + ts, func)
+    k4, l4 = ts * (speed + l3), ts * call_solve(solve, coordinate + k3, speed + l3, ct + ts, func)
 
     data = np.zeros_like(data)
 
@@ -29,6 +82,629 @@ def rk4(ct: float,
     return data
 
 
+# Коэффициенты композиции Йошиды 4-го порядка из трех шагов leapfrog
+YOSHIDA_W1 = 1 / (2 - 2 ** (1 / 3))
+YOSHIDA_W0 = -2 ** (1 / 3) / (2 - 2 ** (1 / 3))
+
+
+@njit(cache=True)
+def acceleration_state(ct: float,
+                       data: np.ndarray,
+                       solve: int,
+                       func = None) -> np.ndarray:
+    """
+    Состояние для симплектических методов: координаты, скорости и ускорения, форма (3, 3, N).
+    Ускорение конца шага переиспользуется в начале следующего
+    """
+    literally(solve)
+    state = np.empty((3, ) + data.shape[1:])
+    state[:2] = data[:2]
+    state[2] = call_solve(solve, data[0], data[1], ct, func)
+    return state
+
+
+@njit(cache=True)
+def leapfrog(ct: float,
+             ts: float,
+             data: np.ndarray,
+             solve: int,
+             func = None) -> np.ndarray:
+    """
+    Leapfrog kick-drift-kick (скоростной Верле): одно вычисление сил за шаг, ошибка энергии ограничена
+
+    Args:
+        data (np.ndarray): состояние из acceleration_state, форма (3, 3, N)
+    """
+    literally(solve)
+    new_data = np.empty_like(data)
+    half_speed = data[1] + ts / 2 * data[2]
+    new_data[0] = data[0] + ts * half_speed
+    new_data[2] = call_solve(solve, new_data[0], half_speed, ct + ts, func)
+    new_data[1] = half_speed + ts / 2 * new_data[2]
+    return new_data
+
+
+@njit(cache=True)
+def yoshida4(ct: float,
+             ts: float,
+             data: np.ndarray,
+             solve: int,
+             func = None) -> np.ndarray:
+    """
+    Симплектический метод Йошиды 4-го порядка: три шага leapfrog, три вычисления сил за шаг
+
+    Args:
+        data (np.ndarray): состояние из acceleration_state, форма (3, 3, N)
+    """
+    literally(solve)
+    data = leapfrog(ct, YOSHIDA_W1 * ts, data, solve, func)
+    data = leapfrog(ct + YOSHIDA_W1 * ts, YOSHIDA_W0 * ts, data, solve, func)
+    return leapfrog(ct + (YOSHIDA_W1 + YOSHIDA_W0) * ts, YOSHIDA_W1 * ts, data, solve, func)
+
+
+@njit(cache=True)
+def hermite_state(ct: float,
+                  data: np.ndarray,
+                  solve: int,
+                  func = None) -> np.ndarray:
+    """
+    Состояние для метода Эрмита: координаты, скорости, ускорения и рывки, форма (4, 3, N)
+
+    Args:
+        solve (int): правая часть, возвращающая ускорения и рывки (2, 3, N): SOLVE_HERMITE
+    """
+    literally(solve)
+    state = np.empty((4, ) + data.shape[1:])
+    state[:2] = data[:2]
+    state[2:] = call_solve(solve, data[0], data[1], ct, func)
+    return state
+
+
+@njit(cache=True)
+def hermite(ct: float,
+            ts: float,
+            data: np.ndarray,
+            solve: int,
+            func = None) -> np.ndarray:
+    """
+    Предиктор-корректор Эрмита 4-го порядка: одно вычисление ускорений и рывков за шаг
+
+    Args:
+        data (np.ndarray): состояние из hermite_state, форма (4, 3, N)
+        solve (int): правая часть, возвращающая ускорения и рывки (2, 3, N): SOLVE_HERMITE
+    """
+    literally(solve)
+    coordinate, speed, acceleration, jerk = data[0], data[1], data[2], data[3]
+
+    predicted_coordinate = coordinate + ts * speed + ts ** 2 / 2 * acceleration + ts ** 3 / 6 * jerk
+    predicted_speed = speed + ts * acceleration + ts ** 2 / 2 * jerk
+    new_acceleration_jerk = call_solve(solve, predicted_coordinate, predicted_speed, ct + ts, func)
+
+    new_data = np.empty_like(data)
+    new_data[2:] = new_acceleration_jerk
+    new_data[1] = speed + ts / 2 * (acceleration + new_data[2]) + ts ** 2 / 12 * (jerk - new_data[3])
+    new_data[0] = coordinate + ts / 2 * (speed + new_data[1]) + ts ** 2 / 12 * (acceleration - new_data[2])
+    return new_data
+
+
+# Методы с постоянным шагом по номеру, сигнатура rk4
+RK4, LEAPFROG, YOSHIDA4, HERMITE = map(FunctionNumber, range(4))
+METHOD_FUNCTIONS = (rk4, leapfrog, yoshida4, hermite)
+
+
+def call_method(method, ct, ts, data, solve, func):
+    """Шаг метода номер method из METHOD_FUNCTIONS с правой частью номер solve"""
+    return METHOD_FUNCTIONS[method](ct, ts, data, solve, func)
+
+
+@overload(call_method)
+def _call_method(method, ct, ts, data, solve, func):
+    function = METHOD_FUNCTIONS[_literal_value(method)]
+    return lambda method, ct, ts, data, solve, func: function(ct, ts, data, solve, func)
+
+
+@njit(cache=True)
+def store_frame(frames: np.ndarray,
+                index: int,
+                coordinate: np.ndarray,
+                speed: np.ndarray,
+                bodies: np.ndarray):
+    """
+    Запись координат и скоростей (3, N) в фрейм index по исходным номерам тел bodies.
+    Фреймы формы (F, 1, 3, N) хранят только координаты.
+    Номер берется по модулю F (кольцевой буфер): переиспользуемый фрейм очищается, чтобы в нем не оставались
+    тела, выбывшие после слияния
+    """
+    if index >= frames.shape[0]:
+        index %= frames.shape[0]
+        frames[index] = np.nan
+    store_speed = frames.shape[1] > 1
+    for body in range(bodies.shape[0]):
+        for axis in range(3):
+            frames[index, 0, axis, bodies[body]] = coordinate[axis, body]
+            if store_speed:
+                frames[index, 1, axis, bodies[body]] = speed[axis, body]
+
+
+@njit(cache=True)
+def _contact(coordinate, speed, gravity_masses, contact, gap, ts):
+    """
+    Проверка столкновений при исчерпанном зазоре и реакция на них по contact
+
+    Returns:
+        tuple: (новый зазор, нужно ли вернуть управление: остановка или изменившиеся тела)
+    """
+    if gap > 0:
+        return gap, False
+    gap, collided = collisions.contact_gap(coordinate, speed, contact[1], ts)
+    if not collided:
+        return gap, False
+    if contact[4] == collisions.COLLISION_STOP:
+        return gap, True
+    # Отскок уже расходящихся тел ничего не меняет - интегрирование продолжается без выхода
+    return gap, collisions.resolve_contacts(coordinate, speed, gravity_masses, contact) > 0
+
+
+@njit(cache=True, nogil=True)
+def integrate_chunk(method: int,
+                    ct: float,
+                    ts: float,
+                    state: np.ndarray,
+                    solve: int,
+                    func,
+                    contact,
+                    first_step: int,
+                    num_steps: int,
+                    frame_stride: int,
+                    frames: np.ndarray,
+                    gap: float = 0.):
+    """
+    Скомпилированный цикл интегрирования на num_steps шагов подряд.
+    Столкновения проверяются перед шагом, когда исчерпана нижняя граница зазоров между телами,
+    в frames пишутся только выводимые состояния.
+    Слияния и отскоки выполняются на месте, после них управление возвращается для уплотнения массивов
+    и пересчета производных состояния
+
+    Args:
+        method (int): метод интегрирования, номер в METHOD_FUNCTIONS
+        ct (float): текущее время
+        ts (float): шаг по времени
+        state (np.ndarray): текущее состояние (координаты, скорости, ...), форма (S, 3, N)
+        solve (int): правая часть, номер в SOLVE_FUNCTIONS
+        func: рабочие массивы правой части, первым элементом G * m
+        contact (tuple): результат collisions.contact_workspace
+        first_step (int): номер первого шага чанка (с 1)
+        num_steps (int): число шагов в чанке
+        frame_stride (int): шаги с номером, кратным frame_stride, сохраняются в frames
+        frames (np.ndarray): выходные фреймы, форма (число фреймов, 2, 3, число тел в начале модели);
+            (число фреймов, 1, 3, ...) - только координаты
+        gap (float): оставшаяся нижняя граница зазоров между телами (0 - проверить сразу)
+
+    Returns:
+        tuple: (состояние, время, число выполненных шагов, было ли столкновение, оставшийся зазор)
+    """
+    literally(method)
+    literally(solve)
+    for step in range(first_step, first_step + num_steps):
+        gap, collided = _contact(state[0], state[1], func[0], contact, gap, ts)
+        if collided:
+            return state, ct, step - first_step, True, gap
+
+        ct += ts
+        # Метод может изменить состояние на месте
+        previous = state[0].copy()
+        state = call_method(method, ct, ts, state, solve, func)
+
+        # Два тела сближаются за шаг не больше, чем на сумму своих смещений
+        gap -= 2 * collisions.max_displacement(previous, state[0])
+
+        if step % frame_stride == 0:
+            store_frame(frames, step // frame_stride, state[0], state[1], contact[2])
+
+    return state, ct, num_steps, False, gap
+
+
+@njit(cache=True, parallel=True)
+def _integrate_members(method, ts, states, solve, gravity_masses, positions, acceleration, targets, sources,
+                       source_positions, source_velocities, source_masses, body_radius, first_step, num_steps,
+                       frame_stride, frames, gaps, collided_at):
+    """Параллельный цикл integrate_ensemble: parfor не принимает кортежи массивов, рабочие массивы - по одному"""
+    literally(method)
+    literally(solve)
+    for member in prange(states.shape[0]):
+        if collided_at[member] >= 0:
+            continue
+        member_func = (gravity_masses, positions[member], acceleration[member], targets,
+                       (sources, source_positions[member], source_velocities[member], source_masses[member]))
+        state = states[member].copy()
+        gap = gaps[member]
+        for step in range(first_step, first_step + num_steps):
+            if gap <= 0:
+                gap, collided = collisions.contact_gap(state[0], state[1], body_radius, ts)
+                if collided:
+                    collided_at[member] = step
+                    break
+
+            previous = state[0].copy()
+            state = call_method(method, step * ts, ts, state, solve, member_func)
+
+            gap -= 2 * collisions.max_displacement(previous, state[0])
+
+            if member < frames.shape[0] and step % frame_stride == 0:
+                frames[member, step // frame_stride] = state[:frames.shape[2]]
+        states[member] = state
+        gaps[member] = gap
+
+
+@njit(cache=True, nogil=True)
+def integrate_ensemble(method: int,
+                       ts: float,
+                       states: np.ndarray,
+                       solve: int,
+                       func,
+                       body_radius: np.ndarray,
+                       first_step: int,
+                       num_steps: int,
+                       frame_stride: int,
+                       frames: np.ndarray,
+                       gaps: np.ndarray,
+                       collided_at: np.ndarray):
+    """
+    Интегрирование ансамбля начальных условий на num_steps шагов, параллельно по членам ансамбля.
+    Каждый член шагает независимо: столкнувшийся член выбывает, не задерживая остальных
+
+    Args:
+        method (int): метод интегрирования, номер в METHOD_FUNCTIONS
+        ts (float): шаг по времени
+        states (np.ndarray): состояния членов ансамбля, форма (B, S, 3, N); обновляются на месте
+        solve (int): правая часть без внутреннего распараллеливания (SOLVE_DIRECT_SERIAL)
+        func: результат solvers.ensemble_workspace
+        body_radius (np.ndarray): радиусы тел
+        first_step (int): номер первого шага чанка (с 1)
+        num_steps (int): число шагов в чанке
+        frame_stride (int): шаги с номером, кратным frame_stride, сохраняются в frames
+        frames (np.ndarray): выходные фреймы первых frames.shape[0] членов, форма (B_f, число фреймов, 2, 3, N)
+        gaps (np.ndarray): оставшиеся нижние границы зазоров членов, форма (B, ); обновляются на месте
+        collided_at (np.ndarray): номер шага столкновения члена или -1, форма (B, ); обновляется на месте
+    """
+    literally(method)
+    literally(solve)
+    gravity_masses, positions, acceleration, targets, source = func
+    sources, source_positions, source_velocities, source_masses = source
+    _integrate_members(method, ts, states, solve, gravity_masses, positions, acceleration, targets, sources,
+                       source_positions, source_velocities, source_masses, body_radius, first_step, num_steps,
+                       frame_stride, frames, gaps, collided_at)
+
+
+@njit(cache=True)
+def _block_level(acceleration, jerk, dt_max, max_level, eta):
+    """Уровень k блочного шага dt_max / 2^k по критерию dt = eta * |a| / |j|"""
+    acc_norm = np.sqrt(np.sum(acceleration ** 2))
+    jerk_norm = np.sqrt(np.sum(jerk ** 2))
+    if jerk_norm == 0 or acc_norm == 0:
+        return 0
+    criterion = eta * acc_norm / jerk_norm
+    if criterion >= dt_max:
+        return 0
+    return min(max_level, int(np.ceil(np.log2(dt_max / criterion))))
+
+
+@njit(cache=True)
+def block_state(data: np.ndarray,
+                solve_targets: int,
+                func,
+                dt_max: float,
+                max_level: int,
+                eta: float):
+    """
+    Начальное состояние блочных шагов по времени.
+    Рывок оценивается пробным сдвигом на наименьший шаг
+
+    Args:
+        data (np.ndarray): координаты и скорости, форма (2, 3, N)
+        solve_targets (int): ускорения выбранных тел, номер в SOLVE_TARGETS_FUNCTIONS
+        func: рабочие массивы solve_targets
+        dt_max (float): наибольший шаг (временной шаг модели)
+        max_level (int): наибольший уровень: наименьший шаг dt_max / 2^max_level
+        eta (float): точность критерия шага
+
+    Returns:
+        tuple: (координаты (N, 3), скорости (N, 3), ускорения (N, 3), рывки (N, 3), уровни шагов (N, ))
+    """
+    literally(solve_targets)
+    num_body = data.shape[2]
+    everyone = np.arange(num_body)
+    positions = np.ascontiguousarray(data[0].T)
+    speeds = np.ascontiguousarray(data[1].T)
+    acceleration = call_solve_targets(solve_targets, positions, everyone, func).copy()
+
+    probe_step = dt_max / 2 ** max_level
+    probe = call_solve_targets(solve_targets, positions + probe_step * speeds, everyone, func)
+    jerk = (probe - acceleration) / probe_step
+
+    level = np.empty(num_body, dtype=np.int64)
+    for body in range(num_body):
+        level[body] = _block_level(acceleration[body], jerk[body], dt_max, max_level, eta)
+    return positions, speeds, acceleration, jerk, level
+
+
+@njit(cache=True)
+def block_advance(dt_max: float,
+                  block,
+                  solve_targets: int,
+                  func,
+                  max_level: int,
+                  eta: float) -> int:
+    """
+    Иерархические блочные шаги на интервале dt_max: каждое тело шагает своим dt_max / 2^k.
+    Силы пересчитываются только для активных тел, остальные тела экстраполируются предиктором.
+    В начале и в конце интервала все тела синхронизированы
+
+    Returns:
+        int: число вычислений ускорения отдельных тел
+    """
+    literally(solve_targets)
+    positions, speeds, acceleration, jerk, level = block
+    num_body = positions.shape[0]
+
+    # Время внутри интервала - в целых тиках наименьшего шага, без накопления ошибок округления
+    total_ticks = 1 << max_level
+    tick = dt_max / total_ticks
+    body_tick = np.zeros(num_body, dtype=np.int64)
+    predicted = np.empty((num_body, 3))
+    evaluations = 0
+
+    while True:
+        next_tick = total_ticks + 1
+        for body in range(num_body):
+            next_tick = min(next_tick, body_tick[body] + (1 << (max_level - level[body])))
+        if next_tick > total_ticks:
+            break
+
+        num_active = 0
+        for body in range(num_body):
+            if body_tick[body] + (1 << (max_level - level[body])) == next_tick:
+                num_active += 1
+        active = np.empty(num_active, dtype=np.int64)
+        num_active = 0
+        for body in range(num_body):
+            if body_tick[body] + (1 << (max_level - level[body])) == next_tick:
+                active[num_active] = body
+                num_active += 1
+
+        # Предиктор 3-го порядка для всех тел на момент next_tick
+        for body in range(num_body):
+            delta = (next_tick - body_tick[body]) * tick
+            predicted[body] = (positions[body] + delta * speeds[body] + delta ** 2 / 2 * acceleration[body] +
+                               delta ** 3 / 6 * jerk[body])
+
+        new_acceleration = call_solve_targets(solve_targets, predicted, active, func)
+        evaluations += num_active
+
+        # Корректор по ускорениям на обоих концах шага
+        for body in active:
+            step = (next_tick - body_tick[body]) * tick
+            acc_start = acceleration[body].copy()
+            acc_end = new_acceleration[body]
+            positions[body] += step * speeds[body] + step ** 2 / 6 * (2 * acc_start + acc_end)
+            speeds[body] += step / 2 * (acc_start + acc_end)
+            acceleration[body] = acc_end
+            jerk[body] = (acc_end - acc_start) / step
+            body_tick[body] = next_tick
+
+            # Шаг уменьшается сразу, увеличивается вдвое только на границе кратного блока
+            new_level = _block_level(acceleration[body], jerk[body], dt_max, max_level, eta)
+            if new_level > level[body]:
+                level[body] = new_level
+            elif new_level < level[body] and next_tick % (2 << (max_level - level[body])) == 0:
+                level[body] -= 1
+
+    return evaluations
+
+
+@njit(cache=True, nogil=True)
+def integrate_block_chunk(ct: float,
+                          dt_max: float,
+                          block,
+                          solve_targets: int,
+                          func,
+                          contact,
+                          first_step: int,
+                          num_steps: int,
+                          frame_stride: int,
+                          frames: np.ndarray,
+                          max_level: int,
+                          eta: float,
+                          gap: float = 0.):
+    """
+    Аналог integrate_chunk для блочных шагов: один шаг - интервал dt_max, после которого тела синхронизированы.
+    После столкновения с реакцией состояние блоков нужно построить заново (block_state)
+
+    Returns:
+        tuple: (время, число выполненных шагов, было ли столкновение, число вычислений ускорения тел,
+                оставшийся зазор)
+    """
+    literally(solve_targets)
+    positions, speeds = block[0], block[1]
+    evaluations = 0
+    for step in range(first_step, first_step + num_steps):
+        gap, collided = _contact(positions.T, speeds.T, func[0], contact, gap, dt_max)
+        if collided:
+            return ct, step - first_step, True, evaluations, gap
+
+        previous = positions.T.copy()
+        evaluations += block_advance(dt_max, block, solve_targets, func, max_level, eta)
+        ct += dt_max
+
+        gap -= 2 * collisions.max_displacement(previous, positions.T)
+
+        if step % frame_stride == 0:
+            store_frame(frames, step // frame_stride, positions.T, speeds.T, contact[2])
+
+    return ct, num_steps, False, evaluations, gap
+
+
+# Таблица Бутчера Дорманда–Принса 5(4)
+DP_C = (0., 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1., 1.)
+DP_A2 = (1 / 5, )
+DP_A3 = (3 / 40, 9 / 40)
+DP_A4 = (44 / 45, -56 / 15, 32 / 9)
+DP_A5 = (19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729)
+DP_A6 = (9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656)
+DP_A7 = (35 / 384, 0., 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84)
+# Разность весов решений 5-го и 4-го порядков - оценка локальной ошибки
+DP_E = (71 / 57600, 0., -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40)
+# Коэффициенты плотной выдачи 4-го порядка (Hairer, Nørsett, Wanner)
+DP_D = (-12715105075 / 11282082432, 0., 87487479700 / 32700410799, -10690763975 / 1880347072,
+        701980252875 / 199316789632, -1453857185 / 822651844, 69997945 / 29380423)
+
+
+@njit(cache=True)
+def state_derivative(ct: float,
+                     state: np.ndarray,
+                     solve: int,
+                     func = None) -> np.ndarray:
+    """Производная состояния (координаты, скорости) по времени: (скорости, ускорения)"""
+    literally(solve)
+    derivative = np.empty_like(state)
+    derivative[0] = state[1]
+    derivative[1] = call_solve(solve, state[0], state[1], ct, func)
+    return derivative
+
+
+@njit(cache=True)
+def dopri5_step(ct: float,
+                ts: float,
+                data: np.ndarray,
+                k1: np.ndarray,
+                solve: int,
+                func = None):
+    """
+    Один шаг Дорманда–Принса 5(4)
+
+    Args:
+        ct (float): время начала шага
+        ts (float): пробный шаг
+        data (np.ndarray): состояние в начале шага
+        k1 (np.ndarray): производная в начале шага (FSAL - k7 предыдущего принятого шага)
+
+    Returns:
+        tuple: (состояние в конце шага, k7, оценка ошибки, коэффициент плотной выдачи rcont5)
+    """
+    literally(solve)
+    k2 = state_derivative(ct + DP_C[1] * ts, data + ts * DP_A2[0] * k1, solve, func)
+    k3 = state_derivative(ct + DP_C[2] * ts, data + ts * (DP_A3[0] * k1 + DP_A3[1] * k2), solve, func)
+    k4 = state_derivative(ct + DP_C[3] * ts, data + ts * (DP_A4[0] * k1 + DP_A4[1] * k2 + DP_A4[2] * k3),
+                          solve, func)
+    k5 = state_derivative(ct + DP_C[4] * ts, data + ts * (DP_A5[0] * k1 + DP_A5[1] * k2 + DP_A5[2] * k3 +
+                                                          DP_A5[3] * k4), solve, func)
+    k6 = state_derivative(ct + DP_C[5] * ts, data + ts * (DP_A6[0] * k1 + DP_A6[1] * k2 + DP_A6[2] * k3 +
+                                                          DP_A6[3] * k4 + DP_A6[4] * k5), solve, func)
+    new_data = data + ts * (DP_A7[0] * k1 + DP_A7[2] * k3 + DP_A7[3] * k4 + DP_A7[4] * k5 + DP_A7[5] * k6)
+    k7 = state_derivative(ct + ts, new_data, solve, func)
+
+    error = ts * (DP_E[0] * k1 + DP_E[2] * k3 + DP_E[3] * k4 + DP_E[4] * k5 + DP_E[5] * k6 + DP_E[6] * k7)
+    dense = ts * (DP_D[0] * k1 + DP_D[2] * k3 + DP_D[3] * k4 + DP_D[4] * k5 + DP_D[5] * k6 + DP_D[6] * k7)
+    return new_data, k7, error, dense
+
+
+@njit(cache=True)
+def dopri5_dense(theta: float,
+                 ts: float,
+                 data: np.ndarray,
+                 new_data: np.ndarray,
+                 k1: np.ndarray,
+                 k7: np.ndarray,
+                 dense: np.ndarray) -> np.ndarray:
+    """Плотная выдача 4-го порядка внутри принятого шага, theta in [0, 1]"""
+    rcont2 = new_data - data
+    rcont3 = ts * k1 - rcont2
+    rcont4 = rcont2 - ts * k7 - rcont3
+    return data + theta * (rcont2 + (1 - theta) * (rcont3 + theta * (rcont4 + (1 - theta) * dense)))
+
+
+@njit(cache=True, nogil=True)
+def integrate_adaptive(ct: float,
+                       t_end: float,
+                       ts: float,
+                       state: np.ndarray,
+                       k1: np.ndarray,
+                       solve: int,
+                       func,
+                       contact,
+                       rtol: float,
+                       atol: float,
+                       frame_times: np.ndarray,
+                       frames: np.ndarray,
+                       frame_index: int,
+                       max_steps: int,
+                       gap: float = 0.):
+    """
+    Адаптивное интегрирование Дорманда–Принса 5(4) с контролем ошибки до t_end или max_steps попыток.
+    Фреймы записываются плотной выдачей точно в моменты frame_times
+
+    Args:
+        ct (float): текущее время
+        t_end (float): время окончания моделирования
+        ts (float): пробный шаг
+        state (np.ndarray): текущее состояние, форма (2, 3, N)
+        k1 (np.ndarray): производная состояния в ct (FSAL)
+        solve (int): правая часть, номер в SOLVE_FUNCTIONS
+        func: рабочие массивы правой части, первым элементом G * m
+        contact (tuple): результат collisions.contact_workspace
+        rtol (float): относительная точность
+        atol (float): абсолютная точность
+        frame_times (np.ndarray): моменты выводимых фреймов
+        frames (np.ndarray): выходные фреймы, форма (число фреймов, 2, 3, N)
+        frame_index (int): номер следующего незаписанного фрейма
+        max_steps (int): предельное число попыток шага за вызов
+        gap (float): оставшаяся нижняя граница зазоров между телами (0 - проверить сразу)
+
+    Returns:
+        tuple: (состояние, k1, время, следующий пробный шаг, номер следующего фрейма,
+                принято шагов, отклонено шагов, было ли столкновение, оставшийся зазор)
+    """
+    literally(solve)
+    accepted = 0
+    rejected = 0
+    for _ in range(max_steps):
+        if ct >= t_end:
+            break
+        gap, collided = _contact(state[0], state[1], func[0], contact, gap, ts)
+        if collided:
+            return state, k1, ct, ts, frame_index, accepted, rejected, True, gap
+
+        last_step = ct + ts >= t_end
+        step = t_end - ct if last_step else ts
+        new_state, k7, error, dense = dopri5_step(ct, step, state, k1, solve, func)
+
+        scale = atol + rtol * np.maximum(np.abs(state), np.abs(new_state))
+        error_norm = np.sqrt(np.mean((error / scale) ** 2))
+        factor = 10. if error_norm == 0 else min(10., max(0.2, 0.9 * error_norm ** -0.2))
+
+        if error_norm > 1:
+            rejected += 1
+            ts = step * min(1., factor)
+            continue
+
+        accepted += 1
+        new_time = t_end if last_step else ct + step
+        while frame_index < frame_times.shape[0] and frame_times[frame_index] <= new_time:
+            theta = (frame_times[frame_index] - ct) / step
+            dense_state = dopri5_dense(theta, step, state, new_state, k1, k7, dense)
+            store_frame(frames, frame_index, dense_state[0], dense_state[1], contact[2])
+            frame_index += 1
+
+        gap -= 2 * collisions.max_displacement(state[0], new_state[0])
+
+        ct = new_time
+        state = new_state
+        k1 = k7
+        ts = step * factor
+
+    return state, k1, ct, ts, frame_index, accepted, rejected, False, gap
+
+
 @njit(cache=True, parallel=True)
 def euler_Method(temperature, time_step, alpha, hx, hy):
     new_data = temperature.copy()
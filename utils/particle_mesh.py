@@ -0,0 +1,168 @@
+import numpy as np
+import scipy.fft
+from numba import njit, objmode
+
+from constants import physics_constants
+
+
+# Сетка всегда оставляет по 2 ячейки с каждой стороны под шаблоны CIC и центральной разности
+MESH_MARGIN = 2
+
+
+def particle_mesh_workspace(masses, grid_size):
+    """
+    Рабочие массивы particle-mesh решателя. Создаются один раз на запуск модели
+
+    Args:
+        masses (np.ndarray): массы тел, форма (N, )
+        grid_size (int): число узлов сетки по каждой оси
+
+    Returns:
+        tuple: (G * m, буфер координат (N, 3), буфер ускорений (N, 3),
+                образ Фурье функции Грина на удвоенной сетке)
+    """
+    num_body = masses.shape[0]
+    return (physics_constants.GRAVITATION_CONSTANT * np.asarray(masses, dtype=float),
+            np.empty((num_body, 3)),
+            np.empty((num_body, 3)),
+            green_function_fft(grid_size))
+
+
+def green_function_fft(grid_size):
+    """
+    Фурье-образ ядра -1/|n| на сетке (2G)^3 с шагом 1.
+    Удвоение сетки с нулевым дополнением дает изолированные (непериодические) граничные условия
+    """
+    padded_size = 2 * grid_size
+    index = np.arange(padded_size)
+    index = np.where(index <= grid_size, index, index - padded_size).astype(float)
+    distance = np.sqrt(index[:, None, None] ** 2 + index[None, :, None] ** 2 + index[None, None, :] ** 2)
+    # Собственный потенциал ячейки конечен, порядка -1 / h
+    distance[0, 0, 0] = 1.
+    return scipy.fft.rfftn(-1 / distance, workers=-1)
+
+
+@njit(cache=True)
+def _mesh_geometry(positions, grid_size):
+    """Начало сетки и шаг так, чтобы все тела лежали внутри с запасом MESH_MARGIN ячеек"""
+    low = np.empty(3)
+    high = np.empty(3)
+    for axis in range(3):
+        low[axis] = positions[0, axis]
+        high[axis] = positions[0, axis]
+    for body in range(1, positions.shape[0]):
+        for axis in range(3):
+            low[axis] = min(low[axis], positions[body, axis])
+            high[axis] = max(high[axis], positions[body, axis])
+
+    extent = 0.
+    for axis in range(3):
+        extent = max(extent, high[axis] - low[axis])
+    step = max(extent, 1e-300) / (grid_size - 2 * MESH_MARGIN)
+
+    origin = np.empty(3)
+    for axis in range(3):
+        origin[axis] = (low[axis] + high[axis]) / 2 - step * (grid_size - 1) / 2
+    return origin, step
+
+
+@njit(cache=True)
+def _cic_weights(position, origin, step):
+    """Индексы нижнего узла и доли облака (cloud-in-cell) для одной частицы"""
+    cell = np.empty(3, dtype=np.int64)
+    fraction = np.empty(3)
+    for axis in range(3):
+        coordinate = (position[axis] - origin[axis]) / step
+        cell[axis] = int(np.floor(coordinate))
+        fraction[axis] = coordinate - cell[axis]
+    return cell, fraction
+
+
+@njit(cache=True)
+def deposit_cic(positions, gravity_masses, origin, step, grid_size):
+    """Распределение G * m частиц по узлам сетки методом cloud-in-cell"""
+    density = np.zeros((grid_size, grid_size, grid_size))
+    for body in range(positions.shape[0]):
+        # Пробные частицы (масса 0) не дают вклада в плотность
+        if gravity_masses[body] == 0:
+            continue
+        cell, fraction = _cic_weights(positions[body], origin, step)
+        for corner in range(8):
+            weight = gravity_masses[body]
+            index = np.empty(3, dtype=np.int64)
+            for axis in range(3):
+                if corner & (1 << axis):
+                    weight *= fraction[axis]
+                    index[axis] = cell[axis] + 1
+                else:
+                    weight *= 1 - fraction[axis]
+                    index[axis] = cell[axis]
+            density[index[0], index[1], index[2]] += weight
+    return density
+
+
+@njit(cache=True)
+def mesh_acceleration(potential, step):
+    """Ускорение -grad(phi) центральными разностями во внутренних узлах сетки"""
+    grid_size = potential.shape[0]
+    field = np.zeros((3, grid_size, grid_size, grid_size))
+    for i in range(1, grid_size - 1):
+        for j in range(1, grid_size - 1):
+            for k in range(1, grid_size - 1):
+                field[0, i, j, k] = (potential[i - 1, j, k] - potential[i + 1, j, k]) / (2 * step)
+                field[1, i, j, k] = (potential[i, j - 1, k] - potential[i, j + 1, k]) / (2 * step)
+                field[2, i, j, k] = (potential[i, j, k - 1] - potential[i, j, k + 1]) / (2 * step)
+    return field
+
+
+@njit(cache=True)
+def interpolate_cic(field, positions, origin, step, acceleration):
+    """Обратная интерполяция поля ускорений с сетки на частицы теми же весами CIC"""
+    for body in range(positions.shape[0]):
+        cell, fraction = _cic_weights(positions[body], origin, step)
+        acceleration[body, :] = 0.
+        for corner in range(8):
+            weight = 1.
+            index = np.empty(3, dtype=np.int64)
+            for axis in range(3):
+                if corner & (1 << axis):
+                    weight *= fraction[axis]
+                    index[axis] = cell[axis] + 1
+                else:
+                    weight *= 1 - fraction[axis]
+                    index[axis] = cell[axis]
+            for axis in range(3):
+                acceleration[body, axis] += weight * field[axis, index[0], index[1], index[2]]
+
+
+@njit(cache=True)
+def particle_mesh_solve(coordinate, speed, ct, workspace):
+    """
+    Правая часть для методов интегрирования: ускорения тел методом particle-mesh (FFT).
+    Время O(N + G^3 log G), сила сглажена на масштабе шага сетки
+
+    Args:
+        coordinate (np.ndarray): координаты тел, форма (3, N)
+        speed (np.ndarray): скорости тел, форма (3, N)
+        ct (float): текущее время
+        workspace (tuple): результат particle_mesh_workspace
+
+    Returns:
+        np.ndarray: ускорения, форма (3, N) (представление буфера workspace)
+    """
+    gravity_masses, positions, acceleration, green_hat = workspace
+    grid_size = green_hat.shape[0] // 2
+    positions[:, :] = coordinate.T
+
+    origin, step = _mesh_geometry(positions, grid_size)
+    density = deposit_cic(positions, gravity_masses, origin, step, grid_size)
+
+    # Свертка с функцией Грина на удвоенной сетке: phi = -sum(G * m / |r|)
+    with objmode(potential='float64[:, :, ::1]'):
+        padded_hat = scipy.fft.rfftn(density, s=(2 * grid_size,) * 3, workers=-1)
+        potential = scipy.fft.irfftn(padded_hat * green_hat, s=(2 * grid_size,) * 3, workers=-1)
+        potential = np.ascontiguousarray(potential[:grid_size, :grid_size, :grid_size])
+
+    field = mesh_acceleration(potential / step, step)
+    interpolate_cic(field, positions, origin, step, acceleration)
+    return acceleration.T
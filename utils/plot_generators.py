@@ -1,3 +1,5 @@
+import base64
+import json
 import time
 
 import numpy as np
@@ -5,6 +7,13 @@ import plotly.graph_objects as go
 
 from constants import ui_constants
 
+# Число тел, начиная с которого тела выводятся одним облаком точек, а следы - одной линией:
+# число трасс графика и вызовов отрисовки не растет с числом тел
+CLOUD_BODIES = 50
+# Размер маркера самого крупного тела и толщина следов в облаке
+CLOUD_MARKER_SIZE = 8
+CLOUD_LINE_WIDTH = 2
+
 
 def create_general_layout():
     return go.Layout(
@@ -83,3 +92,130 @@ def generate_lines_nbody(data: np.ndarray, colors: list):
     for body in range(data.shape[2])
 ]
 
+
+def cloud_mode(num_body: int) -> bool:
+    """Вывод тел облаком точек (generate_markers_cloud, generate_lines_cloud) вместо трасс по телам"""
+    return num_body >= CLOUD_BODIES
+
+
+def marker_sizes(radius):
+    """Размеры маркеров облака: растут как корень радиуса тела, самое крупное - CLOUD_MARKER_SIZE"""
+    if radius is None or not np.max(radius) > 0:
+        return CLOUD_MARKER_SIZE
+    return np.maximum(CLOUD_MARKER_SIZE * np.sqrt(np.maximum(radius, 0) / np.max(radius)), 2)
+
+
+def generate_markers_cloud(data: np.ndarray, colors: list, radius=None):
+    """
+    Все тела одной трассой с цветом и размером по точкам
+
+    Args:
+        data (np.ndarray): положения тел, форма (3, N)
+        colors (list): цвета тел
+        radius (np.ndarray): радиусы тел для размеров маркеров, по умолчанию размеры одинаковые
+    """
+    num_body = data.shape[1]
+    # Списки, а не массивы: страница берет из них начальные положения тел
+    return [go.Scatter3d(
+        x=data[0].tolist(),
+        y=data[1].tolist(),
+        z=data[2].tolist(),
+        mode='markers',
+        marker=dict(
+            size=marker_sizes(radius),
+            symbol='circle',
+            color=colors[:num_body],
+        ),
+        text=[f'Тело {body + 1}' for body in range(num_body)],
+        hoverinfo='text+x+y+z',
+        showlegend=False
+    )]
+
+
+def generate_lines_cloud(data: np.ndarray, colors: list):
+    """
+    Следы всех тел одной трассой: участки тел разделены NaN, цвет вершины - номер тела в шкале из цветов тел
+
+    Args:
+        data (np.ndarray): положения тел, форма (n, 3, N)
+        colors (list): цвета тел
+    """
+    length, _, num_body = data.shape
+    merged = np.full((3, num_body, length + 1), np.nan)
+    merged[:, :, :length] = data.transpose(1, 2, 0)
+    merged = merged.reshape(3, -1)
+    return [go.Scatter3d(
+        x=merged[0],
+        y=merged[1],
+        z=merged[2],
+        mode='lines',
+        line=dict(
+            width=CLOUD_LINE_WIDTH,
+            color=np.repeat(np.arange(num_body), length + 1),
+            colorscale=[[body / (num_body - 1), colors[body]] for body in range(num_body)],
+            cmin=0,
+            cmax=num_body - 1,
+        ),
+        hoverinfo='skip',
+        showlegend=False
+    )]
+
+
+def scene_ranges(points: np.ndarray, margin: float = 1.5):
+    """
+    Пределы осей сцены: куб с общим размахом вокруг всех положений тел, с запасом margin.
+    Оси заданы явно, поэтому новые фреймы не перестраивают их
+
+    Args:
+        points (np.ndarray): положения тел, форма (..., 3, N); NaN пропускаются
+        margin (float): отношение размаха осей к размаху положений
+
+    Returns:
+        dict: scene для layout
+    """
+    points = np.moveaxis(np.asarray(points, dtype=float), -2, 0).reshape(3, -1)
+    lower, upper = np.nanmin(points, axis=1), np.nanmax(points, axis=1)
+    center = (lower + upper) / 2
+    half = np.max(upper - lower) / 2 * margin
+    if half == 0:
+        half = np.max(np.abs(center)) or 1.
+    return dict(
+        xaxis=dict(range=[center[0] - half, center[0] + half], autorange=False),
+        yaxis=dict(range=[center[1] - half, center[1] + half], autorange=False),
+        zaxis=dict(range=[center[2] - half, center[2] + half], autorange=False),
+        aspectmode='cube',
+    )
+
+
+def encode_array(array: np.ndarray, dtype: str) -> str:
+    """Массив в base64 байтов little-endian типа dtype ('<f4', '<f8'): на странице - типизированный массив"""
+    return base64.b64encode(np.ascontiguousarray(array, dtype=dtype).tobytes()).decode('ascii')
+
+
+def frames_payload(points: np.ndarray, iterations, ranks: np.ndarray) -> str:
+    """
+    Сообщение с новыми фреймами для страницы графика: только положения тел (следы страница достраивает сама),
+    двоичные массивы в base64 - на странице это Float32Array без разбора текста чисел
+
+    Args:
+        points (np.ndarray): положения тел в новых фреймах, форма (n, 3, N); NaN - тело выбыло
+        iterations: номера шагов новых фреймов
+        ranks (np.ndarray): ранги точек фреймов, предшествующих новым, в пирамиде детализации следов
+            (см. trajectory_pyramid), форма (n, N)
+    """
+    return json.dumps({
+        'iterations': encode_array(iterations, '<f8'),
+        'points': encode_array(points, '<f4'),
+        'ranks': encode_array(ranks, 'u1'),
+    })
+
+
+def history_payload(history: np.ndarray) -> str:
+    """
+    Сообщение со следами живого режима: положения тел (H, 3, N) переставлены в (N, 3, H),
+    чтобы след каждого тела по каждой оси был непрерывным участком массива
+    """
+    return json.dumps({
+        'length': int(history.shape[0]),
+        'points': encode_array(history.transpose(2, 1, 0), '<f4'),
+    })
@@ -0,0 +1,155 @@
+"""
+Дисковый кэш результатов моделирования N тел. Запись - конечная контрольная точка запуска (см. simulation.resume),
+ключ - хэш тел и параметров, от которых зависит траектория. Повторный запуск загружает результат без расчета,
+запуск на большее число шагов продолжается с конечного состояния сохраненного. Объем кэша ограничен:
+вытесняются давно не использованные записи
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+import numpy as np
+
+from utils import simulation
+
+logger = logging.getLogger(__name__)
+
+# Наибольший объем кэша по умолчанию, байт
+MAX_BYTES = 1 << 30
+
+# Параметры, от которых зависят траектория и хранимые фреймы; число шагов и фреймов в ключ не входят
+KEY_SETTINGS = ('time_step', 'method', 'solver', 'collision', 'restitution', 'theta', 'grid_size', 'rtol', 'atol',
+                'eta', 'max_level', 'store_speed', 'dtype')
+
+# Версия содержимого записей: меняется, когда старые записи становятся непригодными
+VERSION = 1
+
+
+def run_key(coordinate, speed, masses, radius, settings):
+    """Ключ запуска: sha256 начального состояния тел и параметров KEY_SETTINGS"""
+    digest = hashlib.sha256(f'nbody-cache-{VERSION}'.encode())
+    for array in (coordinate, speed, masses, radius):
+        array = np.ascontiguousarray(array, dtype=np.float64)
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    parameters = {name: settings[name] for name in KEY_SETTINGS}
+    parameters['dtype'] = np.dtype(parameters['dtype']).str
+    digest.update(json.dumps(parameters, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Кэш в каталоге directory: файл записи <ключ>-<число шагов>-<шаг сохранения фреймов>.npz.
+    Время изменения файла - время последнего использования записи
+
+    Args:
+        directory (str): каталог кэша, создается при необходимости
+        max_bytes (int): наибольший суммарный объем записей
+    """
+
+    def __init__(self, directory, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def lookup(self, key, num_iter, num_frames):
+        """
+        Запись, с которой продолжать запуск на num_iter шагов с num_frames фреймами, и шаг сохранения фреймов.
+        Подходит запись не длиннее запуска, шаг фреймов которой делит нужный; из подходящих - самая длинная.
+        Ее фреймы переносятся прореживанием, а шаг сохранения остается тем же, что у нового запуска,
+        поэтому фреймов не меньше num_frames
+
+        Returns:
+            tuple: путь к записи или None, шаг сохранения фреймов
+        """
+        stride = simulation.frame_stride(num_iter, num_frames)
+        best = None
+        for name in os.listdir(self.directory):
+            parts = name[:-len('.npz')].split('-')
+            if not name.endswith('.npz') or len(parts) != 3 or parts[0] != key:
+                continue
+            cached_iter, cached_stride = int(parts[1]), int(parts[2])
+            if cached_iter <= num_iter and stride % cached_stride == 0 and (best is None or cached_iter > best[0]):
+                best = (cached_iter, os.path.join(self.directory, name))
+        return (None if best is None else best[1]), stride
+
+    def plan(self, coordinate, speed, masses, radius, num_iter, num_frames=2, **settings):
+        """
+        Как будет выполнен запуск simulate с теми же аргументами
+
+        Returns:
+            tuple: ключ, путь к записи или None, шаг сохранения фреймов, параметры simulation.simulate с
+                   заполненными значениями по умолчанию
+        """
+        settings = dict(simulation.DEFAULT_SETTINGS, store_speed=True, dtype=np.float64) | settings
+        del settings['num_iter'], settings['num_frames']
+        key = run_key(coordinate, speed, masses, radius, settings)
+        return (key, ) + self.lookup(key, num_iter, num_frames) + (settings, )
+
+    def simulate(self, coordinate, speed, masses, radius, num_iter, num_frames=2, trajectory=None, checkpoint=None,
+                 checkpoint_interval=simulation.CHECKPOINT_INTERVAL, metadata=None, on_chunk=None, **settings):
+        """
+        simulation.simulate через кэш; завершенный запуск (в том числе остановленный столкновением) сохраняется
+
+        Args:
+            checkpoint (str): контрольная точка прерванного запуска, см. simulation.simulate; без нее прерванный
+                запуск не сохраняется
+            settings: параметры simulation.simulate, в том числе store_speed и dtype
+            остальные - как у simulation.simulate
+
+        Returns:
+            dict: как у simulation.simulate; cached - 'hit' (результат загружен), 'extended' (продолжен
+                  сохраненный запуск) или 'miss'
+        """
+        key, entry, stride, settings = self.plan(coordinate, speed, masses, radius, num_iter, num_frames, **settings)
+        final = checkpoint or os.path.join(self.directory, f'{key}.partial')
+
+        if entry is None:
+            cached = 'miss'
+            result = simulation.simulate(coordinate, speed, masses, radius, num_iter=num_iter, store_every=stride,
+                                         trajectory=trajectory, checkpoint=final,
+                                         checkpoint_interval=checkpoint_interval, metadata=metadata,
+                                         on_chunk=on_chunk, **settings)
+        else:
+            os.utime(entry)
+            cached = 'hit' if entry.endswith(f'-{num_iter}-{stride}.npz') else 'extended'
+            result = simulation.resume(entry, trajectory=trajectory, checkpoint=final,
+                                       checkpoint_interval=checkpoint_interval, num_iter=num_iter,
+                                       store_every=stride, metadata=metadata, on_chunk=on_chunk)
+
+        if not result['cancelled'] and cached != 'hit':
+            target = os.path.join(self.directory, f'{key}-{num_iter}-{stride}.npz')
+            if checkpoint is None:
+                os.replace(final, target)
+            else:
+                shutil.copyfile(final, target)
+            self.evict()
+        elif checkpoint is None and os.path.exists(final):
+            os.remove(final)
+        if result['frames'].shape[0] < num_frames:
+            logger.warning('%s: сохранено %d фреймов вместо %d (шаг сохранения %d)', key, result['frames'].shape[0],
+                           num_frames, stride)
+        result['cached'] = cached
+        return result
+
+    def evict(self):
+        """Удаление давно не использованных записей сверх max_bytes"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                path = os.path.join(self.directory, name)
+                entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(('.npz', '.partial')):
+                os.remove(os.path.join(self.directory, name))
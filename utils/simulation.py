@@ -0,0 +1,653 @@
+"""
+Моделирование N тел без интерфейса: те же решатели, методы и реакция на столкновения, что в NBody.
+Модуль не импортирует PySide6 и plotly
+"""
+import functools
+import json
+import os
+import time
+
+import numpy as np
+
+from utils import collisions, methods, particle_mesh, solvers, trajectory_file
+
+# Целевая длительность одного вызова скомпилированного цикла между обратными вызовами
+CHUNK_SECONDS = 0.05
+# Период записи контрольных точек по умолчанию, с
+CHECKPOINT_INTERVAL = 60.
+
+# Методы с постоянным шагом: (шаг, подготовка дополнительных строк состояния или None)
+FIXED_METHODS = {
+    'rk4': (methods.RK4, None),
+    'leapfrog': (methods.LEAPFROG, methods.acceleration_state),
+    'yoshida4': (methods.YOSHIDA4, methods.acceleration_state),
+    'hermite': (methods.HERMITE, methods.hermite_state),
+}
+METHODS = (*FIXED_METHODS, 'dopri5', 'block')
+# Методы, которыми интегрируется ансамбль
+ENSEMBLE_METHODS = ('rk4', 'leapfrog', 'yoshida4')
+SOLVERS = ('direct', 'barnes-hut', 'particle-mesh')
+
+COLLISION_RESPONSES = {
+    'stop': collisions.COLLISION_STOP,
+    'merge': collisions.COLLISION_MERGE,
+    'bounce': collisions.COLLISION_BOUNCE,
+}
+
+# Число шагов живого режима: моделирование идет до остановки через on_chunk
+ENDLESS = 2 ** 62
+
+# Ускорения только активных тел для блочных шагов по времени
+BLOCK_SOLVERS = {
+    'direct': (methods.SOLVE_TARGETS_DIRECT, solvers.direct_workspace),
+    'barnes-hut': (methods.SOLVE_TARGETS_BARNES_HUT, solvers.barnes_hut_workspace),
+}
+
+# Параметры запуска по умолчанию; ключи совпадают с аргументами simulate
+DEFAULT_SETTINGS = {
+    'time_step': None,
+    'num_iter': 1000,
+    'method': 'rk4',
+    'solver': 'direct',
+    'collision': 'stop',
+    'restitution': 1.,
+    'theta': 0.5,
+    'grid_size': 64,
+    'rtol': 1e-8,
+    'atol': 1e-6,
+    'eta': 0.02,
+    'max_level': 10,
+    'num_frames': 500,
+}
+# Названия параметров в файле: синонимы из data_n_body.txt
+SETTING_ALIASES = {
+    'timestep': 'time_step',
+    'frames': 'num_frames',
+}
+
+
+def read_parameters(path):
+    """
+    Параметры запуска из текстового файла в формате data_n_body.txt.
+    Строки с числами - тела: масса, радиус, скорость x, y, z, координата x, y, z и необязательный
+    признак пробной частицы (0/1) через табуляцию или пробелы. Строки 'ключ: значение' - параметры запуска
+    (ключи DEFAULT_SETTINGS, например 'timestep: 1e5', 'method: leapfrog'), остальные строки пропускаются
+
+    Returns:
+        dict: masses (N, ), radius (N, ), speed (3, N), coordinate (3, N) и параметры запуска DEFAULT_SETTINGS
+    """
+    rows = []
+    settings = dict(DEFAULT_SETTINGS)
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if ':' in line:
+                key, value = (part.strip() for part in line.split(':', 1))
+                key = SETTING_ALIASES.get(key.lower(), key.lower())
+                if key in settings:
+                    default = DEFAULT_SETTINGS[key]
+                    settings[key] = value if isinstance(default, str) else (
+                        int(float(value)) if isinstance(default, int) else float(value))
+                continue
+            try:
+                rows.append([float(field.replace(',', '.')) for field in line.split()])
+            except ValueError:
+                continue
+
+    table = np.array([row for row in rows if row], dtype=float)
+    if table.ndim != 2 or table.shape[1] not in (8, 9):
+        raise ValueError(f'{path}: ожидается 8 или 9 столбцов на тело (масса, радиус, скорость, координаты, '
+                         f'пробная частица)')
+    masses = table[:, 0].copy()
+    if table.shape[1] == 9:
+        masses[table[:, 8] != 0] = 0.
+    return dict(settings,
+                masses=masses,
+                radius=table[:, 1].copy(),
+                speed=np.ascontiguousarray(table[:, 2:5].T),
+                coordinate=np.ascontiguousarray(table[:, 5:8].T))
+
+
+def write_trajectory(path, result):
+    """
+    Сохранение фреймов в .npz: times (F, ), coordinate (F, 3, N), speed (F, 3, N, если хранились), masses, radius.
+    Тела, выбывшие после слияния, и фреймы после остановки - NaN
+    """
+    frames = result['frames']
+    if 'frame_times' in result:
+        times = result['frame_times']
+    else:
+        times = np.arange(frames.shape[0]) * result['frame_stride'] * result['time_step']
+    stored = {'speed': frames[:, 1]} if frames.shape[1] > 1 else {}
+    np.savez_compressed(path, times=times, coordinate=frames[:, 0], masses=result['masses'], radius=result['radius'],
+                        **stored)
+
+
+def frame_stride(num_iter, num_frames):
+    """Шаги с номером, кратным frame_stride, сохраняются: всего не больше num_frames фреймов"""
+    return max(num_iter // (num_frames - 1), 1)
+
+
+def allocate_frames(state, num_iter, stride, store_speed=True, dtype=np.float64):
+    """
+    Фреймы шагов, кратных stride, с начальным состоянием в нулевом.
+    Память - только под сохраняемое: (num_iter // stride + 1) фреймов координат и, при store_speed, скоростей
+
+    Args:
+        state (np.ndarray): начальные координаты и скорости, форма (2, 3, N)
+        num_iter (int): число шагов
+        stride (int): сохраняется каждый stride-й шаг
+        store_speed (bool): хранить скорости (иначе фреймы формы (F, 1, 3, N))
+        dtype: тип хранения, например np.float32 для вдвое меньшей памяти
+
+    Returns:
+        np.ndarray: фреймы, несохраненные - NaN
+    """
+    num_stored = 2 if store_speed else 1
+    frames = np.full((num_iter // stride + 1, num_stored, 3, state.shape[2]), np.nan, dtype=dtype)
+    frames[0] = state[:num_stored]
+    return frames
+
+
+def create_solver(solver, method, theta=0.5, grid_size=64):
+    """
+    Номер правой части (methods.SOLVE_*) и построитель ее рабочих массивов по массам тел.
+    Рабочие массивы строятся заново, когда слияния меняют число тел.
+    Для блочных шагов возвращается правая часть для выбранных тел (methods.SOLVE_TARGETS_*)
+    """
+    if solver not in SOLVERS:
+        raise ValueError(f'Неизвестный способ расчета сил: {solver}')
+    if method not in METHODS:
+        raise ValueError(f'Неизвестный метод интегрирования: {method}')
+    if method == 'block':
+        if solver not in BLOCK_SOLVERS:
+            raise ValueError('Блочные шаги доступны только для прямого суммирования и Barnes–Hut')
+        solve_targets, make_workspace = BLOCK_SOLVERS[solver]
+        if solver == 'barnes-hut':
+            make_workspace = functools.partial(make_workspace, theta=theta)
+        return solve_targets, make_workspace
+    if method == 'hermite':
+        if solver != 'direct':
+            raise ValueError('Метод Эрмита доступен только для прямого суммирования')
+        return methods.SOLVE_HERMITE, solvers.hermite_workspace
+    if solver == 'barnes-hut':
+        return methods.SOLVE_BARNES_HUT, functools.partial(solvers.barnes_hut_workspace, theta=theta)
+    if solver == 'particle-mesh':
+        return methods.SOLVE_PARTICLE_MESH, functools.partial(particle_mesh.particle_mesh_workspace,
+                                                              grid_size=grid_size)
+    return methods.SOLVE_DIRECT, solvers.direct_workspace
+
+
+def collision_response(collision):
+    """Код реакции на столкновение (collisions.COLLISION_*) по ключу COLLISION_RESPONSES"""
+    if collision not in COLLISION_RESPONSES:
+        raise ValueError(f'Неизвестная реакция на столкновение: {collision}')
+    return COLLISION_RESPONSES[collision]
+
+
+def compact(state, contact, workspace, make_workspace):
+    """Удаление поглощенных при слиянии тел: дальше силы считаются только по оставшимся"""
+    contact, keep = collisions.compact_contact(contact)
+    if keep.all():
+        return state, contact, workspace
+    return np.ascontiguousarray(state[..., keep]), contact, make_workspace(contact[0])
+
+
+def simulate(coordinate, speed, masses, radius, time_step, num_iter, method='rk4', solver='direct',
+             collision='stop', restitution=1., theta=0.5, grid_size=64, rtol=1e-8, atol=1e-6, eta=0.02,
+             max_level=10, num_frames=2, store_every=None, store_speed=True, dtype=np.float64, trajectory=None,
+             checkpoint=None, checkpoint_interval=CHECKPOINT_INTERVAL, metadata=None, on_chunk=None):
+    """
+    Моделирование N тел скомпилированными чанками
+
+    Args:
+        coordinate (np.ndarray): начальные координаты, форма (3, N)
+        speed (np.ndarray): начальные скорости, форма (3, N)
+        masses (np.ndarray): массы, форма (N, ); нулевая масса - пробная частица
+        radius (np.ndarray): радиусы, форма (N, )
+        time_step (float): шаг по времени (для 'dopri5' - начальный пробный, для 'block' - наибольший)
+        num_iter (int): число шагов (для 'dopri5' моделируется время num_iter * time_step)
+        method (str): ключ FIXED_METHODS, 'dopri5' или 'block'
+        solver (str): 'direct', 'barnes-hut' или 'particle-mesh'
+        collision (str): ключ COLLISION_RESPONSES
+        restitution (float): коэффициент восстановления при отскоке
+        theta (float): угол раскрытия Barnes–Hut
+        grid_size (int): размер сетки particle-mesh
+        rtol, atol (float): точность адаптивного шага 'dopri5'
+        eta (float), max_level (int): точность и число уровней блочного шага 'block'
+        num_frames (int): число сохраняемых фреймов (не меньше 2: начальное и конечное состояния)
+        store_every (int): сохранять каждый store_every-й шаг вместо num_frames фреймов
+        store_speed (bool): хранить во фреймах скорости (иначе только координаты)
+        dtype: тип хранения фреймов (np.float32 - вдвое меньше памяти; интегрирование всегда в float64)
+        trajectory (str): путь к файлу траектории (см. utils.trajectory_file), фреймы дописываются по мере расчета
+        checkpoint (str): путь к контрольной точке, см. Checkpoint; продолжение - resume
+        checkpoint_interval (float): период записи контрольной точки, с
+        metadata (dict): параметры вызывающего (JSON), сохраняются в контрольной точке и возвращаются в результате
+        on_chunk (Callable): вызывается после каждого чанка с (frames, число готовых фреймов, доля выполнения),
+            истинное возвращаемое значение прерывает моделирование; без него и checkpoint шаги выполняются
+            одним вызовом ядра
+
+    Returns:
+        dict: frames (число фреймов, 2 или 1, 3, N), frame_stride, state (координаты и скорости оставшихся тел),
+              frame_count (число записанных фреймов),
+              contact (рабочие массивы столкновений: массы, радиусы и исходные номера оставшихся тел),
+              time, steps (выполнено шагов), collided (остановлено столкновением), cancelled (прервано on_chunk),
+              time_step, masses и radius (как заданы), metadata и счетчики метода
+
+    Raises:
+        ValueError: недопустимое сочетание метода и способа расчета сил или неизвестная реакция на столкновение
+    """
+    create_solver(solver, method, theta, grid_size)
+    response = collision_response(collision)
+    stride = store_every or frame_stride(num_iter, num_frames)
+    settings = {'time_step': time_step, 'num_iter': num_iter, 'method': method, 'solver': solver,
+                'collision': collision, 'restitution': restitution, 'theta': theta, 'grid_size': grid_size,
+                'rtol': rtol, 'atol': atol, 'eta': eta, 'max_level': max_level, 'frame_stride': stride,
+                'metadata': metadata or {}}
+
+    state = np.array([coordinate, speed], dtype=float)
+    frames = allocate_frames(state, num_iter, stride, store_speed, dtype)
+    contact = collisions.contact_workspace(np.asarray(masses, dtype=float), np.asarray(radius, dtype=float),
+                                           response, restitution)
+    return _run(settings, masses, radius, state, frames, contact, None, trajectory, checkpoint, checkpoint_interval,
+                on_chunk)
+
+
+def resume(path, trajectory=None, checkpoint=None, checkpoint_interval=CHECKPOINT_INTERVAL, num_iter=None,
+           store_every=None, metadata=None, on_chunk=None):
+    """
+    Продолжение моделирования с контрольной точки path: результат совпадает побитово с непрерывным запуском.
+    С num_iter продлевается и завершенный запуск (для 'dopri5' - с шагом, подобранным к прежнему концу,
+    поэтому совпадение с непрерывным запуском - в пределах точности)
+
+    Args:
+        path (str): контрольная точка, записанная simulate или resume
+        trajectory (str): путь к файлу траектории: в него записываются и фреймы до контрольной точки
+        checkpoint (str): путь к следующим контрольным точкам (по умолчанию - path)
+        num_iter (int): число шагов вместо заданного при запуске, не меньше выполненных
+        store_every (int): шаг сохранения фреймов, кратный прежнему: сохраненные фреймы прореживаются
+        metadata (dict): параметры вызывающего вместо сохраненных
+        остальные - как у simulate
+
+    Returns:
+        dict: как у simulate
+    """
+    saved = read_checkpoint(path)
+    settings = saved.pop('settings')
+    if num_iter is not None or store_every is not None:
+        _extend(settings, saved, num_iter or settings['num_iter'], store_every or settings['frame_stride'])
+    if metadata is not None:
+        settings['metadata'] = metadata
+    contact = (saved.pop('contact_masses'), saved.pop('contact_radius'), saved.pop('contact_bodies'),
+               saved.pop('contact_events'), collision_response(settings['collision']), float(settings['restitution']))
+    return _run(settings, saved.pop('masses'), saved.pop('radius'), None, saved.pop('frames'), contact, saved,
+                trajectory, checkpoint or path, checkpoint_interval, on_chunk)
+
+
+def _extend(settings, saved, num_iter, stride):
+    """Контрольная точка запуска на num_iter шагов с шагом сохранения фреймов stride"""
+    thinning, remainder = divmod(stride, settings['frame_stride'])
+    if thinning < 1 or remainder:
+        raise ValueError(f"Шаг сохранения фреймов {stride} не кратен прежнему {settings['frame_stride']}")
+    if settings['method'] == 'dopri5':
+        passed = num_iter * settings['time_step'] < saved['ct']
+    else:
+        passed = num_iter < saved['step'] - 1
+    if passed:
+        raise ValueError(f'Выполнено больше {num_iter} шагов')
+
+    kept = saved['frames'][::thinning]
+    frames = np.full((num_iter // stride + 1, ) + kept.shape[1:], np.nan, dtype=kept.dtype)
+    count = min(kept.shape[0], frames.shape[0])
+    frames[:count] = kept[:count]
+    saved['frames'] = frames
+    if 'frame_index' in saved:
+        saved['frame_index'] = (saved['frame_index'] - 1) // thinning + 1
+    settings.update(num_iter=num_iter, frame_stride=stride)
+
+
+def read_checkpoint(path):
+    """Содержимое контрольной точки: settings - параметры запуска (dict), остальное - массивы"""
+    with np.load(path) as data:
+        saved = {key: data[key] for key in data.files}
+    saved['settings'] = json.loads(str(saved['settings']))
+    return saved
+
+
+class Checkpoint:
+    """
+    Периодическая атомарная запись полного состояния интегрирования в .npz: параметры запуска, фреймы,
+    рабочие массивы столкновений и переменные цикла метода. Файл пишется рядом и заменяет прежний одной
+    операцией: при сбое во время записи остается предыдущая контрольная точка
+    """
+
+    def __init__(self, path, interval, settings, masses, radius):
+        self.path = path
+        self.interval = interval
+        self.settings = json.dumps(settings)
+        self.masses = np.asarray(masses, dtype=float)
+        self.radius = np.asarray(radius, dtype=float)
+        self.last = time.perf_counter()
+
+    def due(self):
+        return time.perf_counter() - self.last >= self.interval
+
+    def save(self, frames, contact, **variables):
+        temporary = self.path + '.tmp'
+        with open(temporary, 'wb') as f:
+            np.savez(f, settings=self.settings, masses=self.masses, radius=self.radius, frames=frames,
+                     contact_masses=contact[0], contact_radius=contact[1], contact_bodies=contact[2],
+                     contact_events=contact[3], **variables)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+        self.last = time.perf_counter()
+
+
+def _continue(frames, available, fraction):
+    """on_chunk без действий: чанки нужны для контрольных точек"""
+    return False
+
+
+def _run(settings, masses, radius, state, frames, contact, restored, trajectory, checkpoint, checkpoint_interval,
+         on_chunk):
+    """Общая часть simulate и resume; restored - переменные цикла из контрольной точки или None"""
+    method = settings['method']
+    stride = settings['frame_stride']
+    time_step = settings['time_step']
+    num_iter = settings['num_iter']
+    solve, make_workspace = create_solver(settings['solver'], method, settings['theta'], settings['grid_size'])
+
+    writer = None
+    if trajectory is not None:
+        writer = trajectory_file.TrajectoryWriter(trajectory, frames, stride, time_step, masses, radius,
+                                                  metadata={'method': method, 'solver': settings['solver'],
+                                                            'collision': settings['collision'],
+                                                            'num_iter': num_iter})
+        on_chunk = writer.callback(on_chunk)
+    saver = None
+    if checkpoint is not None:
+        saver = Checkpoint(checkpoint, checkpoint_interval, settings, masses, radius)
+        on_chunk = on_chunk or _continue
+
+    if method == 'dopri5':
+        result = _integrate_adaptive(state, frames, stride, time_step, num_iter, solve, make_workspace, contact,
+                                     settings['rtol'], settings['atol'], on_chunk, saver, restored)
+    elif method == 'block':
+        result = _integrate_block(state, frames, stride, time_step, num_iter, solve, make_workspace, contact,
+                                  settings['max_level'], settings['eta'], on_chunk, saver, restored)
+    else:
+        step_method, prepare = FIXED_METHODS[method]
+        result = _integrate_fixed(step_method, prepare, state, frames, stride, time_step, num_iter, solve,
+                                  make_workspace, contact, on_chunk, saver, restored)
+    result.update(frames=frames, frame_stride=stride, time_step=time_step, masses=masses, radius=radius,
+                  metadata=settings['metadata'])
+    if writer is not None:
+        writer.close(frames, result['frame_count'])
+    return result
+
+
+def _integrate_fixed(method, prepare, state, frames, stride, time_step, num_iter, solve, make_workspace, contact,
+                     on_chunk, checkpoint=None, restored=None):
+    """
+    Интегрирование с постоянным шагом.
+    prepare дополняет координаты и скорости строками, которые хранит метод (ускорения, рывки), или None
+    """
+    workspace = make_workspace(contact[0])
+    if restored is None:
+        if prepare is not None:
+            state = prepare(0., state, solve, workspace)
+        ct = 0.
+        step = 1
+        gap = 0.
+    else:
+        state = restored['state']
+        ct = float(restored['ct'])
+        step = int(restored['step'])
+        gap = float(restored['gap'])
+
+    chunk = 1 if on_chunk is not None else num_iter
+    # Запуск, остановленный столкновением, не продолжается и с контрольной точки
+    collided = restored is not None and bool(restored.get('collided', False))
+    cancelled = False
+    while step <= num_iter and not collided:
+        chunk_start = time.perf_counter()
+        state, ct, done, collided, gap = methods.integrate_chunk(method, ct, time_step, state,
+                                                                 solve, workspace, contact,
+                                                                 step, min(chunk, num_iter - step + 1),
+                                                                 stride, frames, gap)
+        step += done
+        cancelled = on_chunk is not None and bool(on_chunk(frames, (step - 1) // stride + 1, (step - 1) / num_iter))
+
+        if collided and contact[4] != collisions.COLLISION_STOP:
+            state, contact, workspace = compact(state, contact, workspace, make_workspace)
+            if prepare is not None:
+                state = prepare(ct, state, solve, workspace)
+            collided = False
+        # Конечное состояние тоже сохраняется: с него запуск можно продлить
+        if checkpoint is not None and (cancelled or collided or step > num_iter or checkpoint.due()):
+            checkpoint.save(frames, contact, state=state, ct=ct, step=step, gap=gap, collided=collided)
+        if cancelled or collided:
+            break
+
+        # Чанк растет, пока один вызов ядра короче CHUNK_SECONDS
+        if on_chunk is not None and time.perf_counter() - chunk_start < CHUNK_SECONDS:
+            chunk *= 2
+
+    return {'state': state[:2], 'contact': contact, 'time': ct, 'steps': step - 1, 'collided': collided,
+            'cancelled': cancelled, 'frame_count': (step - 1) // stride + 1}
+
+
+def _integrate_adaptive(state, frames, stride, time_step, num_iter, solve, make_workspace, contact, rtol, atol,
+                        on_chunk, checkpoint=None, restored=None):
+    """Интегрирование Дорманда–Принса 5(4) с контролем ошибки, фреймы - плотной выдачей"""
+    workspace = make_workspace(contact[0])
+    t_end = num_iter * time_step
+    frame_times = np.arange(frames.shape[0]) * stride * time_step
+    if restored is None:
+        k1 = methods.state_derivative(0., state, solve, workspace)
+        ct = 0.
+        ts = time_step
+        frame_index = 1
+        accepted = 0
+        rejected = 0
+        gap = 0.
+    else:
+        state = restored['state']
+        k1 = restored['k1']
+        ct = float(restored['ct'])
+        ts = float(restored['ts'])
+        frame_index = int(restored['frame_index'])
+        accepted = int(restored['accepted'])
+        rejected = int(restored['rejected'])
+        gap = float(restored['gap'])
+
+    chunk = 1 if on_chunk is not None else 2 ** 62
+    collided = restored is not None and bool(restored.get('collided', False))
+    cancelled = False
+    while ct < t_end and not collided:
+        chunk_start = time.perf_counter()
+        (state, k1, ct, ts, frame_index,
+         chunk_accepted, chunk_rejected, collided, gap) = methods.integrate_adaptive(ct, t_end, ts, state, k1,
+                                                                                     solve, workspace,
+                                                                                     contact, rtol, atol,
+                                                                                     frame_times, frames,
+                                                                                     frame_index, chunk, gap)
+        accepted += chunk_accepted
+        rejected += chunk_rejected
+        cancelled = on_chunk is not None and bool(on_chunk(frames, frame_index, ct / t_end))
+
+        if collided and contact[4] != collisions.COLLISION_STOP:
+            state, contact, workspace = compact(state, contact, workspace, make_workspace)
+            k1 = methods.state_derivative(ct, state, solve, workspace)
+            collided = False
+        if checkpoint is not None and (cancelled or collided or ct >= t_end or checkpoint.due()):
+            checkpoint.save(frames, contact, state=state, k1=k1, ct=ct, ts=ts, frame_index=frame_index,
+                            accepted=accepted, rejected=rejected, gap=gap, collided=collided)
+        if cancelled or collided:
+            break
+
+        if on_chunk is not None and time.perf_counter() - chunk_start < CHUNK_SECONDS:
+            chunk *= 2
+
+    return {'state': state, 'contact': contact, 'time': ct, 'steps': accepted, 'collided': collided,
+            'cancelled': cancelled, 'frame_count': frame_index, 'frame_times': frame_times,
+            'accepted': accepted, 'rejected': rejected}
+
+
+def _integrate_block(state, frames, stride, time_step, num_iter, solve_targets, make_workspace, contact, max_level,
+                     eta, on_chunk, checkpoint=None, restored=None):
+    """Иерархические блочные шаги: каждое тело шагает своим шагом time_step / 2^k"""
+    num_body = frames.shape[3]
+    workspace = make_workspace(contact[0])
+    if restored is None:
+        block = methods.block_state(state, solve_targets, workspace, time_step, max_level, eta)
+        ct = 0.
+        step = 1
+        evaluations = 0
+        gap = 0.
+    else:
+        block = tuple(restored[f'block_{index}'] for index in range(5))
+        ct = float(restored['ct'])
+        step = int(restored['step'])
+        evaluations = int(restored['evaluations'])
+        gap = float(restored['gap'])
+
+    chunk = 1 if on_chunk is not None else num_iter
+    collided = restored is not None and bool(restored.get('collided', False))
+    cancelled = False
+    while step <= num_iter and not collided:
+        chunk_start = time.perf_counter()
+        ct, done, collided, chunk_evaluations, gap = methods.integrate_block_chunk(ct, time_step, block,
+                                                                                   solve_targets, workspace,
+                                                                                   contact, step,
+                                                                                   min(chunk, num_iter - step + 1),
+                                                                                   stride, frames,
+                                                                                   max_level, eta, gap)
+        step += done
+        evaluations += chunk_evaluations
+        cancelled = on_chunk is not None and bool(on_chunk(frames, (step - 1) // stride + 1, (step - 1) / num_iter))
+
+        if collided and contact[4] != collisions.COLLISION_STOP:
+            state = np.array([block[0].T, block[1].T])
+            state, contact, workspace = compact(state, contact, workspace, make_workspace)
+            block = methods.block_state(state, solve_targets, workspace, time_step, max_level, eta)
+            collided = False
+        if checkpoint is not None and (cancelled or collided or step > num_iter or checkpoint.due()):
+            checkpoint.save(frames, contact, ct=ct, step=step, evaluations=evaluations, gap=gap, collided=collided,
+                            **{f'block_{index}': array for index, array in enumerate(block)})
+        if cancelled or collided:
+            break
+
+        if on_chunk is not None and time.perf_counter() - chunk_start < CHUNK_SECONDS:
+            chunk *= 2
+
+    return {'state': np.array([block[0].T, block[1].T]), 'contact': contact, 'time': ct, 'steps': step - 1,
+            'collided': collided, 'cancelled': cancelled, 'frame_count': (step - 1) // stride + 1,
+            'evaluations': evaluations,
+            'minimal_evaluations': (step - 1) * num_body << max_level}
+
+
+def simulate_live(coordinate, speed, masses, radius, time_step, history, stride=1, method='rk4', solver='direct',
+                  collision='stop', restitution=1., theta=0.5, grid_size=64, on_chunk=None):
+    """
+    Моделирование до остановки (живой режим) методом с постоянным шагом.
+    Память постоянна: кольцевой буфер последних history сохраненных координат (каждый stride-й шаг) в float32
+
+    Args:
+        history (int): длина кольцевого буфера
+        stride (int): сохраняется каждый stride-й шаг
+        on_chunk (Callable): вызывается после каждого чанка с (буфер, всего сохранено фреймов, доля ≈ 0);
+            истинное возвращаемое значение останавливает моделирование
+        остальные - как у simulate
+
+    Returns:
+        dict: как у simulate, frames - кольцевой буфер (см. ring_history)
+    """
+    if method not in FIXED_METHODS:
+        raise ValueError('Живой режим доступен только для методов с постоянным шагом')
+    if on_chunk is None:
+        raise ValueError('Живой режим останавливается только через on_chunk')
+    solve, make_workspace = create_solver(solver, method, theta, grid_size)
+
+    state = np.array([coordinate, speed], dtype=float)
+    frames = np.full((history, 1, 3, state.shape[2]), np.nan, dtype=np.float32)
+    frames[0] = state[:1]
+
+    contact = collisions.contact_workspace(np.asarray(masses, dtype=float), np.asarray(radius, dtype=float),
+                                           collision_response(collision), restitution)
+    step_method, prepare = FIXED_METHODS[method]
+    result = _integrate_fixed(step_method, prepare, state, frames, stride, time_step, ENDLESS, solve,
+                              make_workspace, contact, on_chunk)
+    result.update(frames=frames, frame_stride=stride)
+    return result
+
+
+def ring_history(frames, available):
+    """Копия кольцевого буфера фреймов от старого к новому; available - всего записанных в буфер фреймов"""
+    if available <= frames.shape[0]:
+        return frames[:available].copy()
+    start = available % frames.shape[0]
+    return np.concatenate((frames[start:], frames[:start]))
+
+
+def simulate_ensemble(coordinate, speed, masses, radius, time_step, num_iter, method='rk4', num_members=2,
+                      perturbation=1e-6, num_frames=2, store_every=None, store_speed=True, dtype=np.float64,
+                      seed=None, on_chunk=None):
+    """
+    Ансамбль возмущенных начальных условий, параллельно по членам (прямое суммирование, остановка при столкновении).
+    Первый член невозмущенный, его фреймы сохраняются и передаются в on_chunk до его столкновения
+
+    Args:
+        method (str): 'rk4', 'leapfrog' или 'yoshida4'
+        num_members (int): число членов ансамбля
+        perturbation (float): возмущение координат и скоростей (σ) в долях их среднеквадратичных значений
+        seed (int): зерно генератора возмущений
+        остальные - как у simulate
+
+    Returns:
+        dict: frames и frame_stride невозмущенного члена, states (конечные состояния членов, форма (B, S, 3, N)),
+              collided_at (шаг столкновения члена или -1), steps, cancelled
+    """
+    if method not in ENSEMBLE_METHODS:
+        raise ValueError('Ансамбль доступен только для методов Рунге–Кутта 4, Leapfrog и Йошида 4')
+    step_method, prepare = FIXED_METHODS[method]
+
+    stride = store_every or frame_stride(num_iter, num_frames)
+    state = np.array([coordinate, speed], dtype=float)
+    frames = allocate_frames(state, num_iter, stride, store_speed, dtype)
+
+    rng = np.random.default_rng(seed)
+    # Возмущение аддитивное, σ·ξ в единицах среднеквадратичных координат или скоростей: нулевые компоненты
+    # тоже возмущаются
+    scale = np.sqrt(np.mean(state ** 2, axis=(1, 2)))[:, None, None]
+    states = state[None] + perturbation * scale * rng.standard_normal((num_members, ) + state.shape)
+    states[0] = state
+    if prepare is not None:
+        workspace = solvers.direct_workspace(masses)
+        states = np.array([prepare(0., member, methods.SOLVE_DIRECT, workspace) for member in states])
+
+    ensemble = solvers.ensemble_workspace(masses, num_members)
+    gaps = np.zeros(num_members)
+    collided_at = np.full(num_members, -1)
+
+    step = 1
+    chunk = 1 if on_chunk is not None else num_iter
+    cancelled = False
+    while step <= num_iter and (collided_at < 0).any():
+        chunk_start = time.perf_counter()
+        done = min(chunk, num_iter - step + 1)
+        methods.integrate_ensemble(step_method, time_step, states, methods.SOLVE_DIRECT_SERIAL, ensemble, radius,
+                                   step, done, stride, frames[None], gaps, collided_at)
+        step += done
+
+        # Фреймы невозмущенного члена готовы до его столкновения
+        last_step = step - 1 if collided_at[0] < 0 else collided_at[0] - 1
+        if on_chunk is not None and on_chunk(frames, last_step // stride + 1, (step - 1) / num_iter):
+            cancelled = True
+            break
+
+        if on_chunk is not None and time.perf_counter() - chunk_start < CHUNK_SECONDS:
+            chunk *= 2
+
+    return {'frames': frames, 'frame_stride': stride, 'states': states, 'collided_at': collided_at,
+            'steps': step - 1, 'cancelled': cancelled}
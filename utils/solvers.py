@@ -1,25 +1,681 @@
 import numpy as np
-from numba import njit, prange
+from numba import njit, prange, get_num_threads
 
 from constants import physics_constants
 
+# Кэшированные последовательные функции вызывают параллельные ядра напрямую: пул потоков numba
+# должен быть запущен до загрузки их из кэша, иначе вызов завершается аварийно
+get_num_threads()
+
+# Размер блока тел при тайлинге попарного цикла (64 тела * 3 координаты * 8 байт = 1.5 КБ)
+FORCE_BLOCK_SIZE = 64
+# Начиная с этого числа тел расчет ускорений распараллеливается по блокам
+PARALLEL_MIN_BODIES = 256
+
+# Предельная глубина октодерева Barnes–Hut: глубже совпадающие тела хранятся в одном листе
+MAX_TREE_DEPTH = 48
+_INTERNAL_NODE = -2
+
+
+@njit(cache=True)
+def source_workspace(gravity_masses):
+    """
+    Источники поля - тела с ненулевой массой. Пробные частицы (масса 0) только испытывают притяжение,
+    поэтому попарные циклы идут по источникам: O(N_массивных * N) вместо O(N^2)
+
+    Args:
+        gravity_masses (np.ndarray): G * m, форма (N, )
+
+    Returns:
+        tuple: (индексы источников (M, ), буфер их координат (M, 3), буфер скоростей (M, 3), буфер G * m (M, ))
+    """
+    sources = np.nonzero(gravity_masses)[0]
+    num_sources = sources.shape[0]
+    return sources, np.empty((num_sources, 3)), np.empty((num_sources, 3)), np.empty(num_sources)
+
+
+@njit(cache=True)
+def gather_sources(positions, gravity_masses, source):
+    """Копирование координат и G * m источников в непрерывные буферы source (G * m меняется при слияниях)"""
+    sources, source_positions, _, source_masses = source
+    for index_s in range(sources.shape[0]):
+        body = sources[index_s]
+        source_positions[index_s, 0] = positions[body, 0]
+        source_positions[index_s, 1] = positions[body, 1]
+        source_positions[index_s, 2] = positions[body, 2]
+        source_masses[index_s] = gravity_masses[body]
+
+
+@njit(cache=True)
+def direct_workspace(masses):
+    """
+    Рабочие массивы прямого суммирования. Создаются один раз на запуск модели
+
+    Args:
+        masses (np.ndarray): массы тел, форма (N, ); тела с нулевой массой - пробные частицы
+
+    Returns:
+        tuple: (G * m, буфер координат (N, 3), буфер ускорений (N, 3), индексы всех тел, источники)
+    """
+    num_body = masses.shape[0]
+    gravity_masses = physics_constants.GRAVITATION_CONSTANT * masses
+    return (gravity_masses,
+            np.empty((num_body, 3)),
+            np.empty((num_body, 3)),
+            np.arange(num_body),
+            source_workspace(gravity_masses))
+
+
+@njit(cache=True)
+def _accumulate_block(positions, source, targets, start, stop, acceleration):
+    """Ускорения тел targets[start:stop] от всех источников, тайлинг по блокам источников"""
+    sources, source_positions, _, source_masses = source
+    num_sources = sources.shape[0]
+    for index_t in range(start, stop):
+        acceleration[targets[index_t]] = 0.
+
+    for block_j in range(0, num_sources, FORCE_BLOCK_SIZE):
+        stop_j = min(block_j + FORCE_BLOCK_SIZE, num_sources)
+        for index_t in range(start, stop):
+            index_i = targets[index_t]
+            x_i = positions[index_i, 0]
+            y_i = positions[index_i, 1]
+            z_i = positions[index_i, 2]
+            acc_x = 0.
+            acc_y = 0.
+            acc_z = 0.
+            for index_j in range(block_j, stop_j):
+                if sources[index_j] == index_i:
+                    continue
+                delta_x = source_positions[index_j, 0] - x_i
+                delta_y = source_positions[index_j, 1] - y_i
+                delta_z = source_positions[index_j, 2] - z_i
+                radius_2 = delta_x * delta_x + delta_y * delta_y + delta_z * delta_z
+                factor = source_masses[index_j] / (radius_2 * np.sqrt(radius_2))
+                acc_x += factor * delta_x
+                acc_y += factor * delta_y
+                acc_z += factor * delta_z
+            acceleration[index_i, 0] += acc_x
+            acceleration[index_i, 1] += acc_y
+            acceleration[index_i, 2] += acc_z
+
 
 @njit(parallel=True, cache=True)
+def _direct_acceleration_parallel(positions, source, targets, acceleration):
+    num_targets = targets.shape[0]
+    num_blocks = (num_targets + FORCE_BLOCK_SIZE - 1) // FORCE_BLOCK_SIZE
+    for block_i in prange(num_blocks):
+        start = block_i * FORCE_BLOCK_SIZE
+        _accumulate_block(positions, source, targets, start, min(start + FORCE_BLOCK_SIZE, num_targets),
+                          acceleration)
+
+
+@njit(cache=True)
+def direct_acceleration(positions, gravity_masses, source, targets, acceleration):
+    """
+    Прямое суммирование ускорений в заранее выделенный буфер
+
+    Args:
+        positions (np.ndarray): координаты тел, форма (N, 3), C-порядок
+        gravity_masses (np.ndarray): G * m, форма (N, )
+        source (tuple): результат source_workspace
+        targets (np.ndarray): индексы тел, для которых считаются ускорения
+        acceleration (np.ndarray): выходной буфер ускорений, форма (N, 3); меняются только строки targets
+    """
+    gather_sources(positions, gravity_masses, source)
+    if targets.shape[0] >= PARALLEL_MIN_BODIES:
+        _direct_acceleration_parallel(positions, source, targets, acceleration)
+    else:
+        _accumulate_block(positions, source, targets, 0, targets.shape[0], acceleration)
+
+
+@njit(cache=True)
+def direct_solve(coordinate, speed, ct, workspace):
+    """
+    Правая часть для методов интегрирования: ускорения тел прямым суммированием
+
+    Args:
+        coordinate (np.ndarray): координаты тел, форма (3, N)
+        speed (np.ndarray): скорости тел, форма (3, N)
+        ct (float): текущее время
+        workspace (tuple): результат direct_workspace
+
+    Returns:
+        np.ndarray: ускорения, форма (3, N) (представление буфера workspace)
+    """
+    gravity_masses, positions, acceleration, targets, source = workspace
+    positions[:, :] = coordinate.T
+    direct_acceleration(positions, gravity_masses, source, targets, acceleration)
+    return acceleration.T
+
+
+@njit(cache=True)
+def direct_solve_targets(positions, targets, workspace):
+    """
+    Ускорения только тел targets от всех тел - для блочных шагов по времени
+
+    Args:
+        positions (np.ndarray): координаты (предсказанные) всех тел, форма (N, 3)
+        targets (np.ndarray): индексы активных тел
+        workspace (tuple): результат direct_workspace
+
+    Returns:
+        np.ndarray: буфер ускорений workspace, форма (N, 3); актуальны только строки targets
+    """
+    gravity_masses, _, acceleration, _, source = workspace
+    direct_acceleration(positions, gravity_masses, source, targets, acceleration)
+    return acceleration
+
+
+@njit(cache=True)
+def direct_solve_serial(coordinate, speed, ct, workspace):
+    """direct_solve без распараллеливания - для вызова из параллельного цикла по членам ансамбля"""
+    gravity_masses, positions, acceleration, targets, source = workspace
+    positions[:, :] = coordinate.T
+    gather_sources(positions, gravity_masses, source)
+    _accumulate_block(positions, source, targets, 0, targets.shape[0], acceleration)
+    return acceleration.T
+
+
+@njit(cache=True)
+def ensemble_workspace(masses, num_members):
+    """
+    Рабочие массивы прямого суммирования для ансамбля начальных условий:
+    массы общие, буферы свои у каждого члена ансамбля
+
+    Args:
+        masses (np.ndarray): массы тел, форма (N, )
+        num_members (int): число членов ансамбля B
+
+    Returns:
+        tuple: (G * m, буферы координат (B, N, 3), буферы ускорений (B, N, 3), индексы всех тел,
+                (индексы источников (M, ), буферы координат (B, M, 3), скоростей (B, M, 3) и G * m (B, M) источников))
+    """
+    num_body = masses.shape[0]
+    gravity_masses = physics_constants.GRAVITATION_CONSTANT * masses
+    sources = np.nonzero(gravity_masses)[0]
+    num_sources = sources.shape[0]
+    return (gravity_masses,
+            np.empty((num_members, num_body, 3)),
+            np.empty((num_members, num_body, 3)),
+            np.arange(num_body),
+            (sources,
+             np.empty((num_members, num_sources, 3)),
+             np.empty((num_members, num_sources, 3)),
+             np.empty((num_members, num_sources))))
+
+
+@njit(cache=True)
+def hermite_workspace(masses):
+    """
+    Рабочие массивы прямого суммирования ускорений и рывков для метода Эрмита
+
+    Args:
+        masses (np.ndarray): массы тел, форма (N, ); тела с нулевой массой - пробные частицы
+
+    Returns:
+        tuple: (G * m, буфер координат (N, 3), буфер скоростей (N, 3), буфер ускорений (N, 3),
+                буфер рывков (N, 3), выходной буфер (2, 3, N), индексы всех тел, источники)
+    """
+    num_body = masses.shape[0]
+    gravity_masses = physics_constants.GRAVITATION_CONSTANT * masses
+    return (gravity_masses,
+            np.empty((num_body, 3)),
+            np.empty((num_body, 3)),
+            np.empty((num_body, 3)),
+            np.empty((num_body, 3)),
+            np.empty((2, 3, num_body)),
+            np.arange(num_body),
+            source_workspace(gravity_masses))
+
+
+@njit(cache=True)
+def _accumulate_jerk_block(positions, velocities, source, targets, start, stop, acceleration, jerk):
+    """Ускорения и рывки тел targets[start:stop] за один проход по парам с источниками"""
+    sources, source_positions, source_velocities, source_masses = source
+    num_sources = sources.shape[0]
+    for index_t in range(start, stop):
+        acceleration[targets[index_t]] = 0.
+        jerk[targets[index_t]] = 0.
+
+    for block_j in range(0, num_sources, FORCE_BLOCK_SIZE):
+        stop_j = min(block_j + FORCE_BLOCK_SIZE, num_sources)
+        for index_t in range(start, stop):
+            index_i = targets[index_t]
+            acc_x = 0.
+            acc_y = 0.
+            acc_z = 0.
+            jerk_x = 0.
+            jerk_y = 0.
+            jerk_z = 0.
+            for index_j in range(block_j, stop_j):
+                if sources[index_j] == index_i:
+                    continue
+                delta_x = source_positions[index_j, 0] - positions[index_i, 0]
+                delta_y = source_positions[index_j, 1] - positions[index_i, 1]
+                delta_z = source_positions[index_j, 2] - positions[index_i, 2]
+                speed_x = source_velocities[index_j, 0] - velocities[index_i, 0]
+                speed_y = source_velocities[index_j, 1] - velocities[index_i, 1]
+                speed_z = source_velocities[index_j, 2] - velocities[index_i, 2]
+                radius_2 = delta_x * delta_x + delta_y * delta_y + delta_z * delta_z
+                factor = source_masses[index_j] / (radius_2 * np.sqrt(radius_2))
+                # j = G m (v / r^3 - 3 (r . v) r / r^5)
+                projection = 3 * (delta_x * speed_x + delta_y * speed_y + delta_z * speed_z) / radius_2
+                acc_x += factor * delta_x
+                acc_y += factor * delta_y
+                acc_z += factor * delta_z
+                jerk_x += factor * (speed_x - projection * delta_x)
+                jerk_y += factor * (speed_y - projection * delta_y)
+                jerk_z += factor * (speed_z - projection * delta_z)
+            acceleration[index_i, 0] += acc_x
+            acceleration[index_i, 1] += acc_y
+            acceleration[index_i, 2] += acc_z
+            jerk[index_i, 0] += jerk_x
+            jerk[index_i, 1] += jerk_y
+            jerk[index_i, 2] += jerk_z
+
+
+@njit(parallel=True, cache=True)
+def _direct_jerk_parallel(positions, velocities, source, targets, acceleration, jerk):
+    num_targets = targets.shape[0]
+    num_blocks = (num_targets + FORCE_BLOCK_SIZE - 1) // FORCE_BLOCK_SIZE
+    for block_i in prange(num_blocks):
+        start = block_i * FORCE_BLOCK_SIZE
+        _accumulate_jerk_block(positions, velocities, source, targets, start,
+                               min(start + FORCE_BLOCK_SIZE, num_targets), acceleration, jerk)
+
+
+@njit(cache=True)
+def direct_acceleration_jerk(positions, velocities, gravity_masses, source, targets, acceleration, jerk):
+    """
+    Прямое суммирование ускорений и их производных (рывков) в заранее выделенные буферы
+
+    Args:
+        positions (np.ndarray): координаты тел, форма (N, 3), C-порядок
+        velocities (np.ndarray): скорости тел, форма (N, 3), C-порядок
+        gravity_masses (np.ndarray): G * m, форма (N, )
+        source (tuple): результат source_workspace
+        targets (np.ndarray): индексы тел, для которых считаются ускорения
+        acceleration (np.ndarray): выходной буфер ускорений, форма (N, 3)
+        jerk (np.ndarray): выходной буфер рывков, форма (N, 3)
+    """
+    gather_sources(positions, gravity_masses, source)
+    sources, _, source_velocities, _ = source
+    for index_s in range(sources.shape[0]):
+        source_velocities[index_s] = velocities[sources[index_s]]
+
+    if targets.shape[0] >= PARALLEL_MIN_BODIES:
+        _direct_jerk_parallel(positions, velocities, source, targets, acceleration, jerk)
+    else:
+        _accumulate_jerk_block(positions, velocities, source, targets, 0, targets.shape[0], acceleration, jerk)
+
+
+@njit(cache=True)
+def hermite_solve(coordinate, speed, ct, workspace):
+    """
+    Правая часть для метода Эрмита: ускорения и рывки тел за одно прямое суммирование
+
+    Args:
+        coordinate (np.ndarray): координаты тел, форма (3, N)
+        speed (np.ndarray): скорости тел, форма (3, N)
+        ct (float): текущее время
+        workspace (tuple): результат hermite_workspace
+
+    Returns:
+        np.ndarray: ускорения и рывки, форма (2, 3, N) (буфер workspace)
+    """
+    gravity_masses, positions, velocities, acceleration, jerk, output, targets, source = workspace
+    positions[:, :] = coordinate.T
+    velocities[:, :] = speed.T
+    direct_acceleration_jerk(positions, velocities, gravity_masses, source, targets, acceleration, jerk)
+    output[0] = acceleration.T
+    output[1] = jerk.T
+    return output
+
+
+@njit(cache=True)
+def barnes_hut_workspace(masses, theta):
+    """
+    Рабочие массивы для Barnes–Hut. Создаются один раз на запуск модели
+
+    Args:
+        masses (np.ndarray): массы тел, форма (N, ); тела с нулевой массой - пробные частицы
+        theta (float): угол раскрытия (0 - точное прямое суммирование)
+
+    Returns:
+        tuple: (G * m, буфер координат (N, 3), буфер ускорений (N, 3), индексы всех тел, theta, источники)
+    """
+    num_body = masses.shape[0]
+    gravity_masses = physics_constants.GRAVITATION_CONSTANT * masses
+    return (gravity_masses,
+            np.empty((num_body, 3)),
+            np.empty((num_body, 3)),
+            np.arange(num_body),
+            float(theta),
+            source_workspace(gravity_masses))
+
+
+@njit(cache=True)
+def _build_octree(positions, gravity_masses, capacity):
+    """
+    Построение плоского октодерева на массивах.
+    Возвращает число узлов -1, если capacity не хватило
+    """
+    num_body = positions.shape[0]
+    child = np.full((capacity, 8), -1, dtype=np.int64)
+    first_body = np.full(capacity, -1, dtype=np.int64)
+    next_body = np.full(num_body, -1, dtype=np.int64)
+    center = np.empty((capacity, 3))
+    half = np.empty(capacity)
+    mass = np.zeros(capacity)
+    com = np.zeros((capacity, 3))
+
+    # Корневой узел - куб, охватывающий все тела
+    low = np.empty(3)
+    high = np.empty(3)
+    for axis in range(3):
+        low[axis] = positions[0, axis]
+        high[axis] = positions[0, axis]
+    for body in range(1, num_body):
+        for axis in range(3):
+            low[axis] = min(low[axis], positions[body, axis])
+            high[axis] = max(high[axis], positions[body, axis])
+    half[0] = 0.
+    for axis in range(3):
+        center[0, axis] = (low[axis] + high[axis]) / 2
+        half[0] = max(half[0], (high[axis] - low[axis]) / 2)
+    half[0] = half[0] * (1 + 1e-9) + 1e-300
+    count = 1
+
+    for body in range(num_body):
+        node = 0
+        depth = 0
+        while True:
+            occupant = first_body[node]
+            if occupant == _INTERNAL_NODE:
+                octant = _octant(positions[body], center[node])
+                node_child = child[node, octant]
+                if node_child == -1:
+                    if count == capacity:
+                        return -1, child, first_body, next_body, half, mass, com
+                    _init_child(center, half, node, octant, count)
+                    first_body[count] = body
+                    child[node, octant] = count
+                    count += 1
+                    break
+                node = node_child
+                depth += 1
+            elif occupant == -1:
+                first_body[node] = body
+                break
+            elif depth >= MAX_TREE_DEPTH:
+                # Совпадающие тела складываются в один лист списком
+                next_body[body] = occupant
+                first_body[node] = body
+                break
+            else:
+                # Разбиение листа: прежний обитатель уходит в дочерний узел
+                if count == capacity:
+                    return -1, child, first_body, next_body, half, mass, com
+                octant = _octant(positions[occupant], center[node])
+                _init_child(center, half, node, octant, count)
+                first_body[count] = occupant
+                child[node, octant] = count
+                first_body[node] = _INTERNAL_NODE
+                count += 1
+
+    # Дочерние узлы всегда создаются после родителя - моменты считаем в обратном порядке
+    for node in range(count - 1, -1, -1):
+        occupant = first_body[node]
+        if occupant == _INTERNAL_NODE:
+            for octant in range(8):
+                node_child = child[node, octant]
+                if node_child != -1:
+                    mass[node] += mass[node_child]
+                    for axis in range(3):
+                        com[node, axis] += mass[node_child] * com[node_child, axis]
+        else:
+            body = occupant
+            while body != -1:
+                mass[node] += gravity_masses[body]
+                for axis in range(3):
+                    com[node, axis] += gravity_masses[body] * positions[body, axis]
+                body = next_body[body]
+        if mass[node] != 0:
+            for axis in range(3):
+                com[node, axis] /= mass[node]
+
+    return count, child, first_body, next_body, half, mass, com
+
+
+@njit(cache=True)
+def _octant(position, node_center):
+    octant = 0
+    for axis in range(3):
+        if position[axis] >= node_center[axis]:
+            octant |= 1 << axis
+    return octant
+
+
+@njit(cache=True)
+def _init_child(center, half, parent, octant, node):
+    half[node] = half[parent] / 2
+    for axis in range(3):
+        sign = 1. if octant & (1 << axis) else -1.
+        center[node, axis] = center[parent, axis] + sign * half[node]
+
+
+@njit(cache=True)
+def build_octree(positions, gravity_masses):
+    """
+    Плоское октодерево по координатам (N, 3): дети, листовые списки тел,
+    полуразмеры узлов, суммарные G * m и центры масс узлов
+    """
+    capacity = 4 * positions.shape[0] + 64
+    while True:
+        tree = _build_octree(positions, gravity_masses, capacity)
+        if tree[0] >= 0:
+            return tree
+        capacity *= 2
+
+
+@njit(cache=True)
+def _walk_block(positions, source, tree, theta, targets, start, stop, acceleration):
+    """Обход дерева источников для тел targets[start:stop]"""
+    sources, source_positions, _, source_masses = source
+    _, child, first_body, next_body, half, mass, com = tree
+    stack = np.empty(8 * MAX_TREE_DEPTH + 8, dtype=np.int64)
+    theta_2 = theta * theta
+
+    for index_t in range(start, stop):
+        index_i = targets[index_t]
+        x_i = positions[index_i, 0]
+        y_i = positions[index_i, 1]
+        z_i = positions[index_i, 2]
+        acc_x = 0.
+        acc_y = 0.
+        acc_z = 0.
+
+        stack[0] = 0
+        top = 1
+        while top > 0:
+            top -= 1
+            node = stack[top]
+            if mass[node] == 0:
+                continue
+
+            occupant = first_body[node]
+            if occupant != _INTERNAL_NODE:
+                body = occupant
+                while body != -1:
+                    if sources[body] != index_i:
+                        delta_x = source_positions[body, 0] - x_i
+                        delta_y = source_positions[body, 1] - y_i
+                        delta_z = source_positions[body, 2] - z_i
+                        radius_2 = delta_x * delta_x + delta_y * delta_y + delta_z * delta_z
+                        factor = source_masses[body] / (radius_2 * np.sqrt(radius_2))
+                        acc_x += factor * delta_x
+                        acc_y += factor * delta_y
+                        acc_z += factor * delta_z
+                    body = next_body[body]
+                continue
+
+            delta_x = com[node, 0] - x_i
+            delta_y = com[node, 1] - y_i
+            delta_z = com[node, 2] - z_i
+            radius_2 = delta_x * delta_x + delta_y * delta_y + delta_z * delta_z
+            size = 2 * half[node]
+            if size * size < theta_2 * radius_2:
+                factor = mass[node] / (radius_2 * np.sqrt(radius_2))
+                acc_x += factor * delta_x
+                acc_y += factor * delta_y
+                acc_z += factor * delta_z
+            else:
+                for octant in range(8):
+                    node_child = child[node, octant]
+                    if node_child != -1:
+                        stack[top] = node_child
+                        top += 1
+
+        acceleration[index_i, 0] = acc_x
+        acceleration[index_i, 1] = acc_y
+        acceleration[index_i, 2] = acc_z
+
+
+@njit(parallel=True, cache=True)
+def _barnes_hut_acceleration_parallel(positions, source, tree, theta, targets, acceleration):
+    num_targets = targets.shape[0]
+    num_blocks = (num_targets + FORCE_BLOCK_SIZE - 1) // FORCE_BLOCK_SIZE
+    for block_i in prange(num_blocks):
+        start = block_i * FORCE_BLOCK_SIZE
+        _walk_block(positions, source, tree, theta, targets, start,
+                    min(start + FORCE_BLOCK_SIZE, num_targets), acceleration)
+
+
+@njit(cache=True)
+def barnes_hut_acceleration(positions, gravity_masses, source, theta, targets, acceleration):
+    """
+    Ускорения методом Barnes–Hut в заранее выделенный буфер.
+    Дерево строится по источникам при каждом вызове
+
+    Args:
+        positions (np.ndarray): координаты тел, форма (N, 3), C-порядок
+        gravity_masses (np.ndarray): G * m, форма (N, )
+        source (tuple): результат source_workspace
+        theta (float): угол раскрытия
+        targets (np.ndarray): индексы тел, для которых считаются ускорения
+        acceleration (np.ndarray): выходной буфер ускорений, форма (N, 3); меняются только строки targets
+    """
+    gather_sources(positions, gravity_masses, source)
+    if source[0].shape[0] == 0:
+        for index_t in range(targets.shape[0]):
+            acceleration[targets[index_t]] = 0.
+        return
+
+    tree = build_octree(source[1], source[3])
+    if targets.shape[0] >= PARALLEL_MIN_BODIES:
+        _barnes_hut_acceleration_parallel(positions, source, tree, theta, targets, acceleration)
+    else:
+        _walk_block(positions, source, tree, theta, targets, 0, targets.shape[0], acceleration)
+
+
+@njit(cache=True)
+def barnes_hut_solve(coordinate, speed, ct, workspace):
+    """
+    Правая часть для методов интегрирования: ускорения тел методом Barnes–Hut
+
+    Args:
+        coordinate (np.ndarray): координаты тел, форма (3, N)
+        speed (np.ndarray): скорости тел, форма (3, N)
+        ct (float): текущее время
+        workspace (tuple): результат barnes_hut_workspace
+
+    Returns:
+        np.ndarray: ускорения, форма (3, N) (представление буфера workspace)
+    """
+    gravity_masses, positions, acceleration, targets, theta, source = workspace
+    positions[:, :] = coordinate.T
+    barnes_hut_acceleration(positions, gravity_masses, source, theta, targets, acceleration)
+    return acceleration.T
+
+
+@njit(cache=True)
+def barnes_hut_solve_targets(positions, targets, workspace):
+    """
+    Ускорения только тел targets методом Barnes–Hut (дерево строится по всем телам) - для блочных шагов
+
+    Args:
+        positions (np.ndarray): координаты (предсказанные) всех тел, форма (N, 3)
+        targets (np.ndarray): индексы активных тел
+        workspace (tuple): результат barnes_hut_workspace
+
+    Returns:
+        np.ndarray: буфер ускорений workspace, форма (N, 3); актуальны только строки targets
+    """
+    gravity_masses, _, acceleration, _, theta, source = workspace
+    barnes_hut_acceleration(positions, gravity_masses, source, theta, targets, acceleration)
+    return acceleration
+
+
+@njit(cache=True)
+def total_energy(coordinate, speed, masses):
+    """
+    Полная энергия системы: кинетическая и потенциальная по всем парам массивных тел
+
+    Args:
+        coordinate (np.ndarray): координаты тел, форма (3, N)
+        speed (np.ndarray): скорости тел, форма (3, N)
+        masses (np.ndarray): массы тел, форма (N, )
+    """
+    num_body = masses.shape[0]
+    energy = 0.
+    for i_body in range(num_body):
+        energy += masses[i_body] * (speed[0, i_body] ** 2 + speed[1, i_body] ** 2 + speed[2, i_body] ** 2) / 2
+        if masses[i_body] == 0:
+            continue
+        for j_body in range(i_body + 1, num_body):
+            radius_2 = 0.
+            for axis in range(3):
+                radius_2 += (coordinate[axis, i_body] - coordinate[axis, j_body]) ** 2
+            energy -= physics_constants.GRAVITATION_CONSTANT * masses[i_body] * masses[j_body] / np.sqrt(radius_2)
+    return energy
+
+
+@njit(cache=True)
+def escaping_bodies(coordinate, speed, masses):
+    """
+    Тела, уходящие от системы: удельная энергия относительно центра масс остальных тел положительна
+    и тело удаляется от него
+
+    Returns:
+        np.ndarray: маска уходящих тел, форма (N, )
+    """
+    num_body = masses.shape[0]
+    total = masses.sum()
+    escaping = np.zeros(num_body, dtype=np.bool_)
+    for i_body in range(num_body):
+        rest = total - masses[i_body]
+        if rest <= 0:
+            continue
+        delta = np.zeros(3)
+        relative = np.zeros(3)
+        for axis in range(3):
+            for j_body in range(num_body):
+                if j_body != i_body:
+                    delta[axis] += masses[j_body] * coordinate[axis, j_body]
+                    relative[axis] += masses[j_body] * speed[axis, j_body]
+            delta[axis] = coordinate[axis, i_body] - delta[axis] / rest
+            relative[axis] = speed[axis, i_body] - relative[axis] / rest
+        distance = np.sqrt(np.sum(delta ** 2))
+        specific = (np.sum(relative ** 2) / 2 -
+                    physics_constants.GRAVITATION_CONSTANT * (rest + masses[i_body]) / distance)
+        escaping[i_body] = specific > 0 and np.sum(delta * relative) > 0
+    return escaping
+
+
+@njit(cache=True)
 def n_body_solve(coordinate, speed, ct, masses):
-    tensor_force = np.zeros((3, coordinate.shape[1], coordinate.shape[1]))
-
-    for index_i in prange(coordinate.shape[1] - 1):
-        for index_j in prange(index_i + 1, coordinate.shape[1]):
-            coord_i = coordinate[:, index_i]
-            coord_j = coordinate[:, index_j]
-
-            delta_radius = coord_i - coord_j
-            radius = np.sqrt(np.sum(delta_radius ** 2))
-            tensor_force[:, index_i, index_j] = - (physics_constants.GRAVITATION_CONSTANT * masses[index_i] * masses[index_j] /
-                                                   (radius ** 3)) * delta_radius
-            tensor_force[:, index_j, index_i] = -tensor_force[:, index_i, index_j]
-    force = np.sum(tensor_force, axis=2)
-    return force / masses
+    return direct_solve(coordinate, speed, ct, direct_workspace(masses)).copy()
 
 
 def pend_solve(angle, speed, ct, lenghtPend):
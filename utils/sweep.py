@@ -0,0 +1,117 @@
+"""
+Перебор параметров моделирования N тел по сетке в пуле процессов с потоковой записью итогов
+"""
+import csv
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numba
+import numpy as np
+
+from utils import simulation, solvers
+
+# Столбцы файла итогов: по строке на запуск в порядке завершения
+SWEEP_COLUMNS = ('run', 'time_step', 'mass_scale', 'velocity_scale', 'steps', 'collided', 'collision_time',
+                 'energy_error', 'escaped', 'wall_time')
+# Параметры, по которым запуск узнается в файле итогов
+SWEEP_PARAMETERS = ('time_step', 'mass_scale', 'velocity_scale')
+
+
+def sweep_grid(time_steps, mass_scales=(1., ), velocity_scales=(1., )):
+    """Декартово произведение значений параметров, у каждого запуска свой номер run"""
+    return [{'run': run, 'time_step': time_step, 'mass_scale': mass_scale, 'velocity_scale': velocity_scale}
+            for run, (time_step, mass_scale, velocity_scale)
+            in enumerate(itertools.product(time_steps, mass_scales, velocity_scales))]
+
+
+def point_key(point):
+    return tuple(float(point[name]) for name in SWEEP_PARAMETERS)
+
+
+def completed_runs(path):
+    """
+    Параметры запусков, уже записанных в файл итогов (для продолжения прерванного перебора).
+    Сравниваются значения параметров, а не номера: сетку можно расширять между запусками
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path, newline='', encoding='utf-8') as f:
+        return {point_key(row) for row in csv.DictReader(f) if all(row.get(name) for name in SWEEP_PARAMETERS)}
+
+
+def run_point(bodies, point, num_iter, method='rk4', solver='direct'):
+    """
+    Один запуск перебора: масштабирование масс и скоростей, моделирование до столкновения или num_iter шагов
+
+    Returns:
+        dict: строка файла итогов со столбцами SWEEP_COLUMNS
+    """
+    start = time.perf_counter()
+    masses = bodies['masses'] * point['mass_scale']
+    speed = bodies['speed'] * point['velocity_scale']
+    result = simulation.simulate(bodies['coordinate'], speed, masses, bodies['radius'], point['time_step'],
+                                 num_iter, method=method, solver=solver)
+
+    initial_energy = solvers.total_energy(bodies['coordinate'], speed, masses)
+    coordinate, final_speed = result['state'][0], result['state'][1]
+    final_energy = solvers.total_energy(coordinate, final_speed, masses)
+    # При нулевой начальной энергии относительная ошибка не определена
+    energy_error = abs(final_energy - initial_energy) / abs(initial_energy) if initial_energy != 0 else np.nan
+    return dict(point,
+                steps=result['steps'],
+                collided=int(result['collided']),
+                collision_time=result['time'] if result['collided'] else np.nan,
+                energy_error=energy_error,
+                escaped=int(solvers.escaping_bodies(coordinate, final_speed, masses).sum()),
+                wall_time=time.perf_counter() - start)
+
+
+def _init_worker(method, solver):
+    # Параллелизм - по процессам: внутри процесса numba работает в один поток
+    numba.set_num_threads(1)
+    # Ядра загружаются из кэша на диске (или компилируются при первом запуске) до первой точки,
+    # чтобы это не входило в wall_time
+    simulation.simulate(np.array([[0., 1.], [0., 0.], [0., 0.]]), np.zeros((3, 2)), np.ones(2), np.full(2, 0.1),
+                        1., 2, method=method, solver=solver)
+
+
+def run_sweep(bodies, grid, num_iter, output, method='rk4', solver='direct', workers=None, on_result=None):
+    """
+    Перебор grid в пуле процессов. Итоги дописываются в CSV output по мере завершения запусков
+
+    Args:
+        bodies (dict): параметры тел, см. simulation.read_parameters
+        grid (list): точки перебора, см. sweep_grid; точки с уже записанными в output параметрами пропускаются
+        num_iter (int): число шагов каждого запуска
+        output (str): путь к файлу итогов
+        workers (int): число процессов (по умолчанию - число ядер)
+        on_result (Callable): вызывается с каждой записанной строкой итогов
+
+    Returns:
+        int: число выполненных запусков
+    """
+    done = completed_runs(output)
+    pending = [point for point in grid if point_key(point) not in done]
+    if not pending:
+        return 0
+
+    write_header = not os.path.exists(output) or os.path.getsize(output) == 0
+    # spawn: дочерний процесс не наследует запущенный пул потоков numba родителя
+    context = multiprocessing.get_context('spawn')
+    with open(output, 'a', newline='', encoding='utf-8') as f, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                initargs=(method, solver)) as pool:
+        writer = csv.DictWriter(f, fieldnames=SWEEP_COLUMNS)
+        if write_header:
+            writer.writeheader()
+        futures = [pool.submit(run_point, bodies, point, num_iter, method, solver) for point in pending]
+        for future in as_completed(futures):
+            row = future.result()
+            writer.writerow(row)
+            f.flush()
+            if on_result is not None:
+                on_result(row)
+    return len(pending)
@@ -0,0 +1,202 @@
+"""
+Файл траектории N тел (.nbt): заголовок, фреймы чанками и индекс чанков в конце файла.
+
+    MAGIC, длина заголовка (uint32), заголовок (JSON)
+    чанк: CHUNK_MAGIC, номер первого фрейма, число фреймов, размер данных (int64), данные
+    ...
+    индекс: (номер первого фрейма, число фреймов, смещение данных, размер данных) на чанк (int64)
+    смещение индекса (int64), INDEX_MAGIC
+
+Данные чанка - фреймы (n, S, 3, N) в типе хранения. При сжатии из битового представления каждого фрейма
+вычитается предыдущий фрейм чанка (соседние фреймы близки, старшие биты разностей нулевые), байты разностей
+группируются по разрядам, затем zlib; преобразование точно обратимо, NaN сохраняются.
+Чанки пишутся по мере расчета; файл без индекса (прерванная запись) читается обходом чанков
+"""
+import json
+import struct
+import zlib
+
+import numpy as np
+
+MAGIC = b'NBTRJ\x00\x01\x00'
+INDEX_MAGIC = b'NBTRJIDX'
+CHUNK_MAGIC = b'CHNK'
+CHUNK_HEADER = struct.Struct('<4sqqq')
+FOOTER = struct.Struct('<q8s')
+
+# Целочисленный тип битового представления для разностного кодирования
+_BITS = {np.dtype(np.float32): np.int32, np.dtype(np.float64): np.int64}
+
+
+def encode_chunk(block, compression):
+    """Байты данных чанка из фреймов block (n, S, 3, N)"""
+    if not compression:
+        return np.ascontiguousarray(block).tobytes()
+    bits = np.ascontiguousarray(block).view(_BITS[block.dtype])
+    delta = bits.copy()
+    delta[1:] -= bits[:-1]
+    # Байты одного разряда подряд: нулевые старшие байты разностей сжимаются длинными сериями
+    return zlib.compress(delta.view(np.uint8).reshape(-1, delta.itemsize).T.tobytes(), 6)
+
+
+def decode_chunk(payload, shape, dtype, compression):
+    """Фреймы чанка формы shape из байтов payload"""
+    if not compression:
+        return np.frombuffer(payload, dtype=dtype).reshape(shape)
+    bits = _BITS[np.dtype(dtype)]
+    planes = np.frombuffer(zlib.decompress(payload), dtype=np.uint8).reshape(np.dtype(bits).itemsize, -1)
+    delta = np.ascontiguousarray(planes.T).view(bits).reshape(shape)
+    return np.cumsum(delta, axis=0, dtype=bits).view(dtype)
+
+
+class TrajectoryWriter:
+    """
+    Запись фреймов по мере расчета: полные чанки дописываются в файл сразу, остаток и индекс - в close
+
+    Args:
+        path (str): путь к файлу
+        frames (np.ndarray): буфер фреймов моделирования (F, S, 3, N): из него берутся форма и тип хранения
+        frame_stride (int): фрейм i - состояние на шаге i * frame_stride
+        time_step (float): шаг по времени
+        masses, radius (np.ndarray): массы и радиусы тел
+        compression (bool): разностное кодирование и zlib
+        frames_per_chunk (int): число фреймов в чанке
+        metadata (dict): дополнительные параметры запуска для заголовка
+    """
+
+    def __init__(self, path, frames, frame_stride, time_step, masses, radius, compression=True,
+                 frames_per_chunk=256, metadata=None):
+        self.path = path
+        self.frames_per_chunk = frames_per_chunk
+        self.compression = compression
+        self.written = 0
+        self.index = []
+
+        header = {
+            'frame_shape': list(frames.shape[1:]),
+            'dtype': frames.dtype.str,
+            'frame_stride': int(frame_stride),
+            'time_step': float(time_step),
+            'compression': 'zlib' if compression else 'none',
+            'masses': np.asarray(masses, dtype=float).tolist(),
+            'radius': np.asarray(radius, dtype=float).tolist(),
+            'metadata': metadata or {},
+        }
+        header = json.dumps(header).encode('utf-8')
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC + struct.pack('<I', len(header)) + header)
+
+    def write(self, frames, available):
+        """Запись полных чанков из готовых фреймов frames[:available]"""
+        while available - self.written >= self.frames_per_chunk:
+            self._write_chunk(frames[self.written:self.written + self.frames_per_chunk])
+        self.file.flush()
+
+    def close(self, frames, available):
+        """Запись оставшихся фреймов frames[:available] и индекса"""
+        while self.written < available:
+            self._write_chunk(frames[self.written:min(self.written + self.frames_per_chunk, available)])
+        index_offset = self.file.tell()
+        self.file.write(np.array(self.index, dtype=np.int64).reshape(-1, 4).tobytes())
+        self.file.write(FOOTER.pack(index_offset, INDEX_MAGIC))
+        self.file.close()
+
+    def callback(self, on_chunk=None):
+        """on_chunk для simulation.simulate, дописывающий готовые фреймы перед вызовом on_chunk"""
+        def write_chunk(frames, available, fraction):
+            self.write(frames, available)
+            return on_chunk is not None and on_chunk(frames, available, fraction)
+        return write_chunk
+
+    def _write_chunk(self, block):
+        payload = encode_chunk(block, self.compression)
+        self.file.write(CHUNK_HEADER.pack(CHUNK_MAGIC, self.written, block.shape[0], len(payload)))
+        self.index.append((self.written, block.shape[0], self.file.tell(), len(payload)))
+        self.file.write(payload)
+        self.written += block.shape[0]
+
+
+class TrajectoryReader:
+    """
+    Чтение файла траектории через отображение в память: читаются только чанки запрошенного диапазона,
+    несжатые фреймы возвращаются без копирования
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._data = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(self._data[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f'{path}: не файл траектории N тел')
+
+        (length, ) = struct.unpack_from('<I', self._data, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header = json.loads(bytes(self._data[start:start + length]).decode('utf-8'))
+        self.frame_shape = tuple(self.header['frame_shape'])
+        self.dtype = np.dtype(self.header['dtype'])
+        self.frame_stride = self.header['frame_stride']
+        self.time_step = self.header['time_step']
+        self.compression = self.header['compression'] == 'zlib'
+        self.masses = np.array(self.header['masses'])
+        self.radius = np.array(self.header['radius'])
+
+        self.index = self._read_index(start + length)
+        self.num_frames = int(self.index[-1, 0] + self.index[-1, 1]) if len(self.index) else 0
+
+    def _read_index(self, first_chunk):
+        if self._data.shape[0] >= first_chunk + FOOTER.size:
+            index_offset, magic = FOOTER.unpack_from(self._data, self._data.shape[0] - FOOTER.size)
+            if magic == INDEX_MAGIC:
+                count = (self._data.shape[0] - FOOTER.size - index_offset) // 32
+                return np.frombuffer(self._data, dtype=np.int64, count=count * 4, offset=index_offset).reshape(-1, 4)
+
+        # Запись прервана до индекса: обход чанков, неполный последний чанк отбрасывается
+        index = []
+        offset = first_chunk
+        while offset + CHUNK_HEADER.size <= self._data.shape[0]:
+            magic, first_frame, count, size = CHUNK_HEADER.unpack_from(self._data, offset)
+            offset += CHUNK_HEADER.size
+            if magic != CHUNK_MAGIC or offset + size > self._data.shape[0]:
+                break
+            index.append((first_frame, count, offset, size))
+            offset += size
+        return np.array(index, dtype=np.int64).reshape(-1, 4)
+
+    @property
+    def times(self):
+        """Моменты всех фреймов"""
+        return np.arange(self.num_frames) * self.frame_stride * self.time_step
+
+    def chunk(self, number):
+        """Фреймы чанка number"""
+        _, count, offset, size = self.index[number]
+        shape = (int(count), ) + self.frame_shape
+        if not self.compression:
+            return np.ndarray(shape, dtype=self.dtype, buffer=self._data, offset=int(offset))
+        return decode_chunk(self._data[offset:offset + size], shape, self.dtype, True)
+
+    def read(self, start=0, stop=None, step=1):
+        """
+        Фреймы start:stop:step, форма (n, S, 3, N); читаются только чанки, содержащие эти фреймы
+
+        Returns:
+            np.ndarray: копия фреймов
+        """
+        start, stop, step = slice(start, stop, step).indices(self.num_frames)
+        wanted = np.arange(start, stop, step)
+        result = np.empty((wanted.shape[0], ) + self.frame_shape, dtype=self.dtype)
+        chunks = np.searchsorted(self.index[:, 0], wanted, side='right') - 1
+        for number in np.unique(chunks):
+            selected = chunks == number
+            result[selected] = self.chunk(number)[wanted[selected] - self.index[number, 0]]
+        return result
+
+    def read_time(self, t_start, t_end, step=1):
+        """Фреймы с моментами в [t_start, t_end] и их моменты"""
+        frame_time = self.frame_stride * self.time_step
+        start = max(int(np.ceil(t_start / frame_time)), 0)
+        stop = min(int(np.floor(t_end / frame_time)) + 1, self.num_frames)
+        return self.times[start:stop:step], self.read(start, stop, step)
+
+    def close(self):
+        # Отображение закрывается, когда освобождены и возвращенные без копирования фреймы
+        self._data = None
@@ -0,0 +1,113 @@
+"""
+Пирамида детализации траекторий для следов на графике. Уровень 0 - все фреймы, уровень k - прореженный путь
+каждого тела: точка сохраняется, когда с предыдущей сохраненной путь повернул на угол ANGLE * 2 ** ((k - 1) / 2)
+или прошло 2 ** k фреймов. Уровни вложены: точка уровня k есть на всех более подробных уровнях, поэтому
+пирамида задается рангом точки - наибольшим уровнем, на котором она сохранена.
+Ранги вычисляются по мере расчета: ранг фрейма известен, когда получен следующий фрейм
+"""
+import numpy as np
+from numba import njit
+
+# Число уровней, включая уровень 0
+LEVELS = 12
+
+# Угол поворота пути между точками уровня 1, рад
+ANGLE = 0.1
+
+
+@njit(cache=True)
+def turning_angle(x0, y0, z0, x1, y1, z1, x2, y2, z2):
+    """Угол поворота пути в точке (x1, y1, z1) между отрезками от (x0, y0, z0) и до (x2, y2, z2)"""
+    ux, uy, uz = x1 - x0, y1 - y0, z1 - z0
+    vx, vy, vz = x2 - x1, y2 - y1, z2 - z1
+    cross_2 = (uy * vz - uz * vy) ** 2 + (uz * vx - ux * vz) ** 2 + (ux * vy - uy * vx) ** 2
+    return np.arctan2(np.sqrt(cross_2), ux * vx + uy * vy + uz * vz)
+
+
+@njit(cache=True)
+def rank_points(points, previous, seen, since, turned, due, angles, gaps):
+    """
+    Ранги фреймов, предшествующих новым: фрейм points[i] завершает ранг фрейма seen - 1 + i.
+    Состояние пирамиды (previous, since, turned, due) обновляется на месте
+
+    Args:
+        points (np.ndarray): новые положения тел, форма (n, 3, N); NaN - тело выбыло
+        previous (np.ndarray): два последних полученных фрейма, форма (2, 3, N)
+        seen (int): число полученных фреймов
+        since (np.ndarray): фреймов с последней сохраненной точки по уровням и телам, форма (L, N)
+        turned (np.ndarray): угол поворота с последней сохраненной точки, форма (L, N)
+        due (np.ndarray): точка уровня пропущена и сохраняется при первой возможности, форма (L, N)
+        angles (np.ndarray): угол поворота между точками уровня, форма (L, )
+        gaps (np.ndarray): наибольшее число фреймов между точками уровня, форма (L, )
+
+    Returns:
+        np.ndarray: ранги фреймов seen - 1 ... seen + n - 2, форма (n, N)
+    """
+    levels = angles.shape[0]
+    ranks = np.zeros((points.shape[0], points.shape[2]), dtype=np.uint8)
+    for body in range(points.shape[2]):
+        x0, y0, z0 = previous[0, 0, body], previous[0, 1, body], previous[0, 2, body]
+        x1, y1, z1 = previous[1, 0, body], previous[1, 1, body], previous[1, 2, body]
+        for index in range(points.shape[0]):
+            x2, y2, z2 = float(points[index, 0, body]), float(points[index, 1, body]), float(points[index, 2, body])
+            if np.isnan(x1):
+                rank = 0
+            elif seen + index == 1 or np.isnan(x0) or np.isnan(x2):
+                # Начало и конец пути (тело выбыло) сохраняются на всех уровнях
+                rank = levels - 1
+                since[:, body] = 0
+                turned[:, body] = 0.
+                due[:, body] = False
+            else:
+                angle = turning_angle(x0, y0, z0, x1, y1, z1, x2, y2, z2)
+                rank = 0
+                for level in range(1, levels):
+                    since[level, body] += 1
+                    turned[level, body] += angle
+                    if turned[level, body] >= angles[level] or since[level, body] >= gaps[level]:
+                        due[level, body] = True
+                    if due[level, body] and rank == level - 1:
+                        rank = level
+                        since[level, body] = 0
+                        turned[level, body] = 0.
+                        due[level, body] = False
+            ranks[index, body] = rank
+            x0, y0, z0 = x1, y1, z1
+            x1, y1, z1 = x2, y2, z2
+        previous[0, 0, body], previous[0, 1, body], previous[0, 2, body] = x0, y0, z0
+        previous[1, 0, body], previous[1, 1, body], previous[1, 2, body] = x1, y1, z1
+    return ranks
+
+
+class TrajectoryPyramid:
+    """
+    Ранги точек путей тел, вычисляемые по мере получения фреймов
+
+    Args:
+        first (np.ndarray): положения тел в начальном фрейме, форма (3, N)
+        levels (int): число уровней, включая уровень 0
+        angle (float): угол поворота пути между точками уровня 1, рад
+    """
+
+    def __init__(self, first, levels=LEVELS, angle=ANGLE):
+        num_body = first.shape[1]
+        self.previous = np.full((2, 3, num_body), np.nan)
+        self.previous[1] = first
+        self.seen = 1
+        self.since = np.zeros((levels, num_body), dtype=np.int64)
+        self.turned = np.zeros((levels, num_body))
+        self.due = np.zeros((levels, num_body), dtype=np.bool_)
+        self.angles = angle * 2 ** ((np.arange(levels) - 1) / 2)
+        self.gaps = 2 ** np.arange(levels, dtype=np.int64)
+
+    def append(self, points):
+        """
+        Новые фреймы points (n, 3, N)
+
+        Returns:
+            np.ndarray: ранги фреймов, предшествующих новым (seen - 1 ... seen + n - 2), форма (n, N)
+        """
+        ranks = rank_points(points, self.previous, self.seen, self.since, self.turned, self.due,
+                            self.angles, self.gaps)
+        self.seen += points.shape[0]
+        return ranks